@@ -0,0 +1,2 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
@@ -0,0 +1,46 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Measure how parse_many() and dump_many() scale with the number of threads
+(64 XML payloads of 1000 interfaces each).
+
+Run from the top of the repository: python -m benchmarks.bench_bulk
+"""
+
+import multiprocessing
+import time
+
+import libyang
+from libyang.bulk import dump_many
+from libyang.bulk import parse_many
+
+from .common import interfaces_dict
+from .common import new_context
+
+
+PAYLOADS = 64
+INTERFACES = 1000
+
+
+def main():
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(INTERFACES))
+    payloads = [tree.dumps(libyang.lib.LYD_XML)] * PAYLOADS
+    print('%d payloads of %d bytes, %d cpus' % (PAYLOADS, len(payloads[0]), multiprocessing.cpu_count()))
+    base = None
+    for workers in (1, 2, 4, 8, 16):
+        start = time.time()
+        trees = parse_many(ctx, payloads, libyang.lib.LYD_XML, workers=workers)
+        parse = time.time() - start
+        start = time.time()
+        dump_many(trees, libyang.lib.LYD_XML, workers=workers)
+        dump = time.time() - start
+        if base is None:
+            base = parse + dump
+        print('%2d threads: parse %8.1f ms  dump %8.1f ms  speedup x%.2f' % (
+            workers, parse * 1000, dump * 1000, base / (parse + dump)))
+
+
+if __name__ == '__main__':
+    main()
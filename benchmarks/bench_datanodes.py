@@ -0,0 +1,72 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Measure the time and python memory taken by DataNode objects and by the
+dumps of a large tree (50000 interfaces with counters, 1050000 leaves).
+
+Run from the top of the repository: python -m benchmarks.bench_datanodes
+"""
+
+import time
+import tracemalloc
+
+import libyang
+
+from .common import interfaces_dict
+from .common import new_context
+
+
+COUNTERS_XPATH = '/bench:interfaces/interface/counters/*'
+
+
+def measure(label, func, *args):
+    """
+    Run func twice: once for timing, once under tracemalloc (which slows
+    allocations down a lot) for the peak python memory.
+    """
+    start = time.time()
+    func(*args)
+    elapsed = time.time() - start
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('%-40s %10.3f ms %10.1f MiB peak' % (label, elapsed * 1000, peak / 1048576.0))
+
+
+def dump_datanodes(tree):
+    return list(tree.dump_datanodes())
+
+
+def dump_datanodes_sorted(tree):
+    return list(tree.dump_datanodes(sort=True))
+
+
+def dump_values(tree):
+    return tree.dump_values()
+
+
+def get_xpath(tree):
+    return list(tree.get_xpath(COUNTERS_XPATH))
+
+
+def get_xpath_values(tree):
+    return [node.value for node in tree.get_xpath(COUNTERS_XPATH)]
+
+
+def main():
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(50000, counters=True))
+    print('%d leaves' % (tree.count_xpath('/bench:interfaces/interface/*') +
+                         tree.count_xpath(COUNTERS_XPATH) -
+                         tree.count_xpath('/bench:interfaces/interface/counters')))
+    measure('dump_datanodes()', dump_datanodes, tree)
+    measure('dump_datanodes(sort=True)', dump_datanodes_sorted, tree)
+    measure('dump_values()', dump_values, tree)
+    measure('get_xpath() 800k counters', get_xpath, tree)
+    measure('get_xpath() 800k counters + .value', get_xpath_values, tree)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Measure the decoding of numeric leaf values on a state tree of 25000
+interfaces with 16 uint64 counters each: DataNode.value on already looked up
+nodes, and DataTree.get_values() (which includes the lookup).
+
+Run from the top of the repository: python -m benchmarks.bench_decode_values
+"""
+
+import libyang
+
+from .common import interfaces_dict
+from .common import new_context
+from .common import timed
+
+
+COUNTERS_XPATH = '/bench:interfaces/interface/counters/*'
+
+
+def decode(nodes):
+    return [node.value for node in nodes]
+
+
+def main():
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(25000, counters=True))
+    nodes = list(tree.get_xpath(COUNTERS_XPATH))
+    print('%d counters' % len(nodes))
+    timed('  DataNode.value', decode, nodes)
+    timed('  count_xpath() (lookup only)', tree.count_xpath, COUNTERS_XPATH)
+    timed('  get_values()', tree.get_values, COUNTERS_XPATH)
+
+
+if __name__ == '__main__':
+    main()
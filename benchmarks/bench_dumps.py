@@ -0,0 +1,58 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare the time and peak RSS of dumps() with and without as_bytes=True on a
+large tree (50000 interfaces with counters). Each measurement runs in its
+own process, the RSS high-water mark is reset (linux only) once the tree is
+built.
+
+Run from the top of the repository: python -m benchmarks.bench_dumps
+"""
+
+import subprocess
+import sys
+import time
+
+import libyang
+from _libyang import lib
+
+from .common import interfaces_dict
+from .common import new_context
+from .common import reset_peak_rss
+from .common import rss
+
+
+MODES = {
+    'XML': (lib.LYD_XML, False),
+    'XML as_bytes': (lib.LYD_XML, True),
+    'JSON': (lib.LYD_JSON, False),
+    'JSON as_bytes': (lib.LYD_JSON, True),
+    'LYB': (lib.LYD_LYB, False),
+    'LYB as_bytes': (lib.LYD_LYB, True),
+}
+
+
+def run(mode):
+    fmt, as_bytes = MODES[mode]
+    tree = libyang.DataTree.from_dict(new_context(), interfaces_dict(50000, counters=True))
+    reset_peak_rss()
+    before = rss()
+    start = time.time()
+    result = tree.dumps(fmt, as_bytes=as_bytes)
+    elapsed = time.time() - start
+    print('%-16s %10.3f ms %8.1f MiB output %8.1f MiB peak RSS increase' % (
+        mode, elapsed * 1000, len(result) / 1048576.0, rss('VmHWM') - before))
+    sys.stdout.flush()
+
+
+def main():
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+        return
+    for mode in sorted(MODES):
+        subprocess.check_call([sys.executable, '-m', 'benchmarks.bench_dumps', mode])
+
+
+if __name__ == '__main__':
+    main()
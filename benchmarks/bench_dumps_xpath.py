@@ -0,0 +1,33 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare dumping one object of a large tree (20000 interfaces with counters)
+with dumps(xpath=...) and DataNode.dumps() against dumping the whole tree.
+
+Run from the top of the repository: python -m benchmarks.bench_dumps_xpath
+"""
+
+import libyang
+from _libyang import lib
+
+from .common import IFACE_XPATH
+from .common import interfaces_dict
+from .common import new_context
+from .common import timed
+
+
+def main():
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(20000, counters=True))
+    xpath = IFACE_XPATH % 'eth12345'
+    node = next(tree.get_xpath(xpath))
+    timed('dumps() whole tree', tree.dumps, lib.LYD_JSON)
+    timed('dumps(xpath=<one interface>)', tree.dumps, lib.LYD_JSON, xpath=xpath)
+    timed('DataNode.dumps()', node.dumps, lib.LYD_JSON)
+    timed('dumps(xpath=<20000 mtu leaves>)', tree.dumps, lib.LYD_JSON,
+          xpath='/bench:interfaces/interface/mtu')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare the XML, JSON and LYB formats on a large tree (20000 interfaces with
+counters): time to print with dumps(), size, and time to parse with loads().
+
+Run from the top of the repository: python -m benchmarks.bench_formats
+"""
+
+import libyang
+from _libyang import lib
+
+from .common import interfaces_dict
+from .common import new_context
+from .common import timed
+
+
+FORMATS = (
+    ('XML', lib.LYD_XML),
+    ('JSON', lib.LYD_JSON),
+    ('LYB', lib.LYD_LYB),
+)
+
+
+def parse(ctx, payload, fmt):
+    libyang.DataTree(ctx).loads(payload, fmt, trusted=True)
+
+
+def main():
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(20000, counters=True))
+    for name, fmt in FORMATS:
+        print(name)
+        payload = timed('  dumps()', tree.dumps, fmt)
+        print('  %-38s %10.1f MiB' % ('size', len(payload) / 1048576.0))
+        timed('  loads()', parse, ctx, payload, fmt)
+
+
+if __name__ == '__main__':
+    main()
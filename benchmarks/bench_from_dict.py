@@ -0,0 +1,44 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare DataTree.from_dict() against serializing the same dict to JSON and
+calling DataTree.loads(), and against a loop of DataTree.set_xpath() calls.
+
+Run from the top of the repository: python -m benchmarks.bench_from_dict
+"""
+
+import json
+
+import libyang
+from _libyang import lib
+
+from .common import interface_items
+from .common import interfaces_dict
+from .common import new_context
+from .common import timed
+
+
+def set_loop(ctx, items):
+    tree = libyang.DataTree(ctx)
+    for xpath, value in items:
+        tree.set_xpath(xpath, value)
+
+
+def loads_json(ctx, obj):
+    libyang.DataTree(ctx).loads(json.dumps(obj), lib.LYD_JSON)
+
+
+def main():
+    ctx = new_context()
+    for count in (1000, 10000):
+        obj = interfaces_dict(count)
+        items = list(interface_items(count))
+        print('%d interfaces, %d leaves' % (count, len(items)))
+        timed('  set_xpath() loop', set_loop, ctx, items)
+        timed('  loads(json.dumps(obj))', loads_json, ctx, obj)
+        timed('  from_dict()', libyang.DataTree.from_dict, ctx, obj)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare DataTree.get_values() against reading DataNode.value from each node
+returned by DataTree.get_xpath().
+
+Run from the top of the repository: python -m benchmarks.bench_get_values
+"""
+
+import libyang
+
+from .common import interfaces_dict
+from .common import new_context
+from .common import timed
+
+
+COUNTERS_XPATH = '/bench:interfaces/interface/counters/*'
+TYPES_XPATH = '/bench:interfaces/interface/type'
+TYPES = ('ethernet', 'loopback', 'tunnel')
+
+
+def get_xpath_values(tree, xpath):
+    return [node.value for node in tree.get_xpath(xpath)]
+
+
+def main():
+    ctx = new_context()
+    count = 25000
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(count, counters=True))
+    tree.insert_list('/bench:interfaces/interface', {
+        'name': ['eth%d' % i for i in range(count)],
+        'type': [TYPES[i % len(TYPES)] for i in range(count)],
+    })
+    for label, xpath in (('%d counters' % (count * 16), COUNTERS_XPATH),
+                         ('%d enums' % count, TYPES_XPATH)):
+        print(label)
+        timed('  count_xpath() (lookup only)', tree.count_xpath, xpath)
+        a = timed('  get_xpath() + .value', get_xpath_values, tree, xpath)
+        b = timed('  get_values()', tree.get_values, xpath)
+        assert a == b
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Measure keyed lookups with and without DataTree(index=True), and the time and
+python memory taken by the index.
+
+Run from the top of the repository: python -m benchmarks.bench_index
+"""
+
+import random
+import time
+import tracemalloc
+
+import libyang
+
+from .common import IFACE_XPATH
+from .common import interface_items
+from .common import new_context
+from .common import timed
+
+
+def lookups(tree, xpaths):
+    start = time.time()
+    for xpath in xpaths:
+        tree.get_value(xpath)
+    return (time.time() - start) / len(xpaths)
+
+
+def main():
+    ctx = new_context()
+    for count in (1000, 20000):
+        items = list(interface_items(count, counters=True))
+        plain = libyang.DataTree(ctx)
+        plain.set_many(items)
+        indexed = libyang.DataTree(ctx, index=True)
+        indexed.set_many(items)
+        xpaths = [IFACE_XPATH % ('eth%d' % random.randrange(count)) + '/mtu' for _ in range(100000)]
+
+        print('%d interfaces, %d nodes' % (count, plain.count_xpath('//*')))
+        timed('  index build', indexed.get_value, xpaths[0])
+        indexed._changed()
+        tracemalloc.start()
+        indexed.get_value(xpaths[0])
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('  index memory %27.1f MiB' % (peak / 1048576.0))
+        slow = lookups(plain, xpaths[:200])
+        fast = lookups(indexed, xpaths)
+        print('  get_value() %28.2f us' % (slow * 1e6))
+        print('  get_value() index=True %17.2f us (x%d)' % (fast * 1e6, slow / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare DataTree.insert_list() against a loop of DataTree.set_xpath() calls
+and DataTree.set_many(), reported as list entries per second.
+
+Run from the top of the repository: python -m benchmarks.bench_insert_list
+"""
+
+import array
+import time
+
+import libyang
+
+from .common import interface_items
+from .common import new_context
+
+
+LIST_XPATH = '/bench:interfaces/interface'
+
+
+def columns(count):
+    return {
+        'name': ['eth%d' % i for i in range(count)],
+        'description': ['interface number %d' % i for i in range(count)],
+        'enabled': [i % 2 == 0 for i in range(count)],
+        'mtu': array.array('H', (1500 + i % 8000 for i in range(count))),
+        'speed': [10000000000] * count,
+    }
+
+
+def rate(label, count, func, *args):
+    start = time.time()
+    func(*args)
+    elapsed = time.time() - start
+    print('%-24s %10.0f entries/s (%.3fs)' % (label, count / elapsed, elapsed))
+
+
+def set_loop(ctx, items):
+    tree = libyang.DataTree(ctx)
+    for xpath, value in items:
+        tree.set_xpath(xpath, value)
+
+
+def set_many(ctx, items):
+    libyang.DataTree(ctx).set_many(items)
+
+
+def insert_list(ctx, cols):
+    libyang.DataTree(ctx).insert_list(LIST_XPATH, cols)
+
+
+def main():
+    ctx = new_context()
+    for count in (10000, 100000, 1000000):
+        print('%d interfaces' % count)
+        if count <= 10000:
+            items = list(interface_items(count))
+            rate('  set_xpath() loop', count, set_loop, ctx, items)
+            rate('  set_many()', count, set_many, ctx, items)
+        rate('  insert_list()', count, insert_list, ctx, columns(count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare the time and peak python memory of walking 400000 matches with
+DataTree.get_xpath() materialized in a list and with DataTree.iter_xpath(),
+and of serving a page of 100 matches out of them.
+
+Run from the top of the repository: python -m benchmarks.bench_iter_xpath
+"""
+
+import itertools
+import time
+import tracemalloc
+
+import libyang
+
+from .common import interfaces_dict
+from .common import new_context
+
+
+COUNTERS_XPATH = '/bench:interfaces/interface/counters/*'
+
+
+def measure(label, func, *args):
+    tracemalloc.start()
+    start = time.time()
+    func(*args)
+    elapsed = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('%-40s %10.3f ms %10.1f MiB peak' % (label, elapsed * 1000, peak / 1048576.0))
+
+
+def sum_list(tree):
+    return sum(node.value for node in list(tree.get_xpath(COUNTERS_XPATH)))
+
+
+def sum_iter(tree):
+    with tree.iter_xpath(COUNTERS_XPATH) as nodes:
+        return sum(node.value for node in nodes)
+
+
+def page_slice(tree):
+    nodes = tree.get_xpath(COUNTERS_XPATH)
+    return [node.value for node in itertools.islice(nodes, 200000, 200100)]
+
+
+def page_iter(tree):
+    with tree.iter_xpath(COUNTERS_XPATH, offset=200000, limit=100) as nodes:
+        return [node.value for node in nodes]
+
+
+def main():
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(25000, counters=True))
+    print('timings are inflated by tracemalloc, compare them relatively')
+    measure('list(get_xpath()) all', sum_list, tree)
+    measure('iter_xpath() all', sum_iter, tree)
+    measure('islice(get_xpath()) page', page_slice, tree)
+    measure('iter_xpath(offset, limit) page', page_iter, tree)
+
+
+if __name__ == '__main__':
+    main()
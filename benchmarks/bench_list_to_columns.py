@@ -0,0 +1,53 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare DataTree.list_to_columns() against pivoting the DataNodes returned by
+DataTree.dump_datanodes() into columns, on interface counters.
+
+Run from the top of the repository: python -m benchmarks.bench_list_to_columns
+"""
+
+import sys
+
+import libyang
+from libyang import codec
+
+from .common import COUNTERS
+from .common import interfaces_dict
+from .common import new_context
+from .common import timed
+
+
+LIST_XPATH = '/bench:interfaces/interface'
+LEAVES = ['name'] + ['counters/' + c for c in COUNTERS]
+
+
+def datanodes_pivot(tree):
+    columns = dict((name, []) for name in LEAVES)
+    prefix = len(LIST_XPATH)
+    for node in tree.dump_datanodes():
+        xpath = node.xpath
+        if not xpath.startswith(LIST_XPATH + '['):
+            continue
+        # /bench:interfaces/interface[name='eth0']/counters/in-octets
+        name = xpath[xpath.index(']', prefix) + 2:]
+        if name in columns:
+            columns[name].append(node.value)
+    return columns
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(count, counters=True))
+    print('%d interfaces, %d columns' % (count, len(LEAVES)))
+    timed('dump_datanodes() pivot', datanodes_pivot, tree)
+    timed('list_to_columns() numpy=%s' % (codec.numpy is not None),
+          tree.list_to_columns, LIST_XPATH, LEAVES)
+    codec.numpy = None
+    timed('list_to_columns() array.array', tree.list_to_columns, LIST_XPATH, LEAVES)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare the time and peak RSS of parsing a large XML document (50000
+interfaces with counters) from a str, bytes and a file. Each measurement
+runs in its own process, the RSS high-water mark is reset (linux only) once
+the payload is in memory. The increase includes the parsed tree itself.
+
+Run from the top of the repository: python -m benchmarks.bench_loads
+"""
+
+import mmap
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import libyang
+from _libyang import lib
+from libyang.util import str2c
+
+from .common import interfaces_dict
+from .common import new_context
+from .common import reset_peak_rss
+from .common import rss
+
+
+def str2c_copy(ctx, payload, filename):
+    # what loads() used to do: encode, then copy into a char[]
+    tree = libyang.DataTree(ctx)
+    tree._root = lib.lyd_parse_mem(ctx._ctx, str2c(payload), lib.LYD_XML,
+                                   lib.LYD_OPT_CONFIG | lib.LYD_OPT_TRUSTED)
+    return tree
+
+
+def loads_str(ctx, payload, filename):
+    tree = libyang.DataTree(ctx)
+    tree.loads(payload, trusted=True)
+    return tree
+
+
+def loads_bytes(ctx, payload, filename):
+    tree = libyang.DataTree(ctx)
+    tree.loads(payload, trusted=True)
+    return tree
+
+
+def loads_mmap(ctx, payload, filename):
+    tree = libyang.DataTree(ctx)
+    with open(filename, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        tree.loads(mapped, trusted=True)
+        mapped.close()
+    return tree
+
+
+def load_file(ctx, payload, filename):
+    tree = libyang.DataTree(ctx)
+    with open(filename, 'rb') as f:
+        tree.load(f, trusted=True)
+    return tree
+
+
+# parse function, type of the payload read beforehand
+MODES = {
+    'lyd_parse_mem(str2c(str))': (str2c_copy, 'str'),
+    'lyd_parse_mem(str2c(bytes))': (str2c_copy, 'bytes'),
+    'loads(str)': (loads_str, 'str'),
+    'loads(bytes)': (loads_bytes, 'bytes'),
+    'loads(mmap)': (loads_mmap, None),
+    'load(file)': (load_file, None),
+}
+
+
+def run(mode, filename):
+    func, payload_type = MODES[mode]
+    ctx = new_context()
+    payload = None
+    if payload_type is not None:
+        with open(filename, 'rb') as f:
+            payload = f.read()
+        if payload_type == 'str':
+            payload = payload.decode('utf-8')
+    reset_peak_rss()
+    before = rss()
+    start = time.time()
+    func(ctx, payload, filename)
+    elapsed = time.time() - start
+    print('%-28s %10.3f ms %8.1f MiB peak RSS increase' % (mode, elapsed * 1000, rss('VmHWM') - before))
+    sys.stdout.flush()
+
+
+def main():
+    if len(sys.argv) > 2:
+        run(sys.argv[1], sys.argv[2])
+        return
+    tree = libyang.DataTree.from_dict(new_context(), interfaces_dict(50000, counters=True))
+    fd, filename = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    try:
+        tree.dump(filename)
+        print('%.1f MiB of XML' % (os.path.getsize(filename) / 1048576.0))
+        for mode in sorted(MODES):
+            subprocess.check_call([sys.executable, '-m', 'benchmarks.bench_loads', mode, filename])
+    finally:
+        os.unlink(filename)
+
+
+if __name__ == '__main__':
+    main()
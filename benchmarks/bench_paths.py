@@ -0,0 +1,46 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare calling lyd_path() on each node of a large result set (800000
+counters of 50000 interfaces) against generating all the paths at once. The
+xpath is evaluated once beforehand, it is timed on its own.
+
+Run from the top of the repository: python -m benchmarks.bench_paths
+"""
+
+import libyang
+from _libyang import ffi
+from _libyang import lib
+from libyang.data import set_paths
+from libyang.util import c2str
+from libyang.xpath import xpath2c
+
+from .common import interfaces_dict
+from .common import new_context
+from .common import timed
+
+
+COUNTERS_XPATH = '/bench:interfaces/interface/counters/*'
+
+
+def lyd_path_loop(node_set):
+    return [c2str(ffi.gc(lib.lyd_path(node_set.set.d[i]), lib.free))
+            for i in range(node_set.number)]
+
+
+def main():
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(50000, counters=True))
+    node_set = timed('lyd_find_path()', lib.lyd_find_path, tree._root, xpath2c(COUNTERS_XPATH))
+    try:
+        print('%d paths' % node_set.number)
+        timed('lyd_path() loop', lyd_path_loop, node_set)
+        timed('set_paths()', set_paths, node_set)
+        timed('set_paths(templates=True)', set_paths, node_set, templates=True)
+    finally:
+        lib.ly_set_free(node_set)
+
+
+if __name__ == '__main__':
+    main()
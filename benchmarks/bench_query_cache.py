@@ -0,0 +1,50 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Measure a read-heavy workload (the same queries asked again and again, with
+a write from time to time) with and without DataTree(query_cache=N).
+
+Run from the top of the repository: python -m benchmarks.bench_query_cache
+"""
+
+import random
+import time
+
+import libyang
+
+from .common import IFACE_XPATH
+from .common import interface_items
+from .common import new_context
+
+
+def workload(tree, queries, writes_every):
+    start = time.time()
+    for i, xpath in enumerate(queries):
+        if writes_every and i % writes_every == 0:
+            tree.set_xpath(IFACE_XPATH % 'eth0' + '/mtu', 1500 + i % 8000)
+        tree.get_values(xpath)
+        tree.count_xpath(xpath)
+    return (time.time() - start) / len(queries)
+
+
+def main():
+    ctx = new_context()
+    count = 2000
+    items = list(interface_items(count, counters=True))
+    # an API layer asking about a few hot objects
+    hot = [IFACE_XPATH % ('eth%d' % random.randrange(count)) + '/mtu' for _ in range(50)]
+    hot.append('/bench:interfaces/interface[enabled="true"]/name')
+    queries = [random.choice(hot) for _ in range(20000)]
+    print('%d interfaces, %d distinct queries' % (count, len(set(queries))))
+    for writes_every in (0, 1000, 100):
+        for size in (0, 1024):
+            tree = libyang.DataTree(ctx, query_cache=size)
+            tree.set_many(items)
+            per_query = workload(tree, queries, writes_every)
+            print('  write every %-5s query_cache=%-5d %10.1f us per query %s' % (
+                writes_every or '-', size, per_query * 1e6, tree.query_cache_stats() or ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Per-leaf cost of filling wide list entries with absolute
+DataTree.set_xpath() calls versus DataNode.set() relative to the entry.
+
+Run from the top of the repository: python -m benchmarks.bench_relative_set
+"""
+
+import time
+
+import libyang
+
+from .common import IFACE_XPATH
+from .common import new_context
+
+
+COUNTERS = (
+    'in-octets', 'in-unicast-pkts', 'in-broadcast-pkts', 'in-multicast-pkts',
+    'in-discards', 'in-errors', 'in-unknown-protos', 'in-fcs-errors',
+    'out-octets', 'out-unicast-pkts', 'out-broadcast-pkts', 'out-multicast-pkts',
+    'out-discards', 'out-errors', 'carrier-transitions', 'resets',
+)
+LEAVES = [('description', 'some interface'), ('enabled', True), ('mtu', 1500),
+          ('speed', 10000000000), ('type', 'ethernet'), ('load', '12.50')]
+LEAVES += [('counters/' + c, 123456789) for c in COUNTERS]
+
+
+def fill_absolute(ctx, count):
+    tree = libyang.DataTree(ctx)
+    for i in range(count):
+        xpath = IFACE_XPATH % ('eth%d' % i)
+        for leaf, value in LEAVES:
+            tree.set_xpath(xpath + '/' + leaf, value)
+
+
+def fill_relative(ctx, count):
+    tree = libyang.DataTree(ctx)
+    tree.set_xpath('/bench:interfaces', None)
+    interfaces = next(tree.get_xpath('/bench:interfaces'))
+    for i in range(count):
+        entry = interfaces.child('interface', name='eth%d' % i)
+        for leaf, value in LEAVES:
+            entry.set(leaf, value)
+
+
+def main():
+    ctx = new_context()
+    for count in (100, 1000, 5000):
+        nleaves = count * len(LEAVES)
+        print('%d interfaces, %d leaves each' % (count, len(LEAVES)))
+        for label, func in (('absolute set_xpath()', fill_absolute),
+                            ('relative DataNode.set()', fill_relative)):
+            start = time.time()
+            func(ctx, count)
+            elapsed = time.time() - start
+            print('  %-30s %8.2f us/leaf' % (label, elapsed * 1e6 / nleaves))
+
+
+if __name__ == '__main__':
+    main()
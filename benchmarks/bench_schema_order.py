@@ -0,0 +1,36 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare the orders available to dump a large tree (24000 interfaces with
+counters, about 500000 nodes): document order, sorted by path and schema
+order.
+
+Run from the top of the repository: python -m benchmarks.bench_schema_order
+"""
+
+import libyang
+
+from .common import interfaces_dict
+from .common import new_context
+from .common import timed
+
+
+def datanodes(tree, **kwargs):
+    return list(tree.dump_datanodes(**kwargs))
+
+
+def main():
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(24000, counters=True))
+    print('%d nodes' % len(tree.dump_values()))
+    timed('dump_datanodes()', datanodes, tree)
+    timed('dump_datanodes(sort=True)', datanodes, tree, sort=True)
+    timed('dump_datanodes(schema_order=True)', datanodes, tree, schema_order=True)
+    timed('dump_values()', tree.dump_values)
+    timed('dump_values(sort=True)', tree.dump_values, sort=True)
+    timed('dump_values(schema_order=True)', tree.dump_values, schema_order=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare DataTree.set_many()/delete_many() against loops of
+DataTree.set_xpath()/delete_xpath() calls.
+
+Run from the top of the repository: python -m benchmarks.bench_set_many
+"""
+
+import libyang
+
+from .common import IFACE_XPATH
+from .common import interface_items
+from .common import new_context
+from .common import timed
+
+
+def set_loop(ctx, items):
+    tree = libyang.DataTree(ctx)
+    for xpath, value in items:
+        tree.set_xpath(xpath, value)
+    return tree
+
+
+def set_many(ctx, items):
+    tree = libyang.DataTree(ctx)
+    tree.set_many(items)
+    return tree
+
+
+def delete_loop(tree, xpaths):
+    for xpath in xpaths:
+        tree.delete_xpath(xpath)
+
+
+def main():
+    ctx = new_context()
+    for count in (1000, 10000):
+        items = list(interface_items(count))
+        print('%d interfaces, %d leaves' % (count, len(items)))
+        timed('  set_xpath() loop', set_loop, ctx, items)
+        timed('  set_many()', set_many, ctx, items)
+
+    count = 1000
+    items = list(interface_items(count))
+    xpaths = [IFACE_XPATH % ('eth%d' % i) for i in range(count)]
+    print('deleting %d interfaces' % count)
+    timed('  delete_xpath() loop', delete_loop, set_many(ctx, items), xpaths)
+    timed('  delete_many()', set_many(ctx, items).delete_many, xpaths)
+
+
+if __name__ == '__main__':
+    main()
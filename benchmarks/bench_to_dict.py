@@ -0,0 +1,36 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare DataTree.to_dict() against json.loads(DataTree.dumps(LYD_JSON)) on a
+config of about 50MB when encoded in JSON.
+
+Run from the top of the repository: python -m benchmarks.bench_to_dict
+"""
+
+import json
+
+import libyang
+from _libyang import lib
+
+from .common import interfaces_dict
+from .common import new_context
+from .common import timed
+
+
+def loads_dumps(tree):
+    return json.loads(tree.dumps(lib.LYD_JSON))
+
+
+def main():
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(80000, counters=True))
+    print('%.1f MB of JSON' % (len(tree.dumps(lib.LYD_JSON)) / 1e6))
+    timed('json.loads(dumps(LYD_JSON))', loads_dumps, tree)
+    timed('to_dict()', tree.to_dict)
+    timed("to_dict('/bench:interfaces/interface/mtu')", tree.to_dict,
+          '/bench:interfaces/interface/mtu')
+
+
+if __name__ == '__main__':
+    main()
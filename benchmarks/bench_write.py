@@ -0,0 +1,71 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Compare the peak RSS of writing a large tree (50000 interfaces with
+counters) to a file with dumps() against write(). Each measurement runs in
+its own process, the RSS high-water mark is reset (linux only) once the tree
+is built.
+
+Run from the top of the repository: python -m benchmarks.bench_write
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import libyang
+from _libyang import lib
+
+from .common import interfaces_dict
+from .common import new_context
+from .common import reset_peak_rss
+from .common import rss
+
+
+def dumps(tree, f):
+    f.write(tree.dumps().encode('utf-8'))
+
+
+def write_file(tree, f):
+    tree.write(f)
+
+
+def write_fd(tree, f):
+    tree.write(f.fileno())
+
+
+MODES = {
+    'dumps()': dumps,
+    'write(file)': write_file,
+    'write(fd)': write_fd,
+}
+
+
+def run(mode):
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(50000, counters=True))
+    reset_peak_rss()
+    before = rss()
+    start = time.time()
+    with open(os.devnull, 'wb') as f:
+        MODES[mode](tree, f)
+    elapsed = time.time() - start
+    print('%-20s %10.3f ms %10.1f MiB peak RSS increase' % (mode, elapsed * 1000, rss('VmHWM') - before))
+    sys.stdout.flush()
+
+
+def main():
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+        return
+    tree_size = len(libyang.DataTree.from_dict(new_context(), interfaces_dict(50000, counters=True))
+                    .dumps(lib.LYD_XML))
+    print('%.1f MiB of XML' % (tree_size / 1048576.0))
+    for mode in sorted(MODES):
+        subprocess.check_call([sys.executable, '-m', 'benchmarks.bench_write', mode])
+
+
+if __name__ == '__main__':
+    main()
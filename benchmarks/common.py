@@ -0,0 +1,97 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+import os
+import time
+
+import libyang
+
+
+YANG_DIR = os.path.join(os.path.dirname(__file__), 'yang')
+IFACE_XPATH = "/bench:interfaces/interface[name='%s']"
+
+
+#------------------------------------------------------------------------------
+def new_context():
+    ctx = libyang.Context(YANG_DIR)
+    ctx.load_module('bench')
+    return ctx
+
+
+#------------------------------------------------------------------------------
+def interface_items(count, counters=False):
+    """
+    Generate (xpath, value) tuples describing count interfaces.
+    """
+    for i in range(count):
+        xpath = IFACE_XPATH % ('eth%d' % i)
+        yield xpath + '/description', 'interface number %d' % i
+        yield xpath + '/enabled', i % 2 == 0
+        yield xpath + '/mtu', 1500 + i % 8000
+        yield xpath + '/speed', 10000000000
+        if counters:
+            yield xpath + '/counters/in-octets', i * 1000
+            yield xpath + '/counters/out-octets', i * 2000
+
+
+#------------------------------------------------------------------------------
+COUNTERS = (
+    'in-octets', 'in-unicast-pkts', 'in-broadcast-pkts', 'in-multicast-pkts',
+    'in-discards', 'in-errors', 'in-unknown-protos', 'in-fcs-errors',
+    'out-octets', 'out-unicast-pkts', 'out-broadcast-pkts',
+    'out-multicast-pkts', 'out-discards', 'out-errors', 'carrier-transitions',
+    'resets',
+)
+
+
+def interfaces_dict(count, counters=False):
+    """
+    Return count interfaces as nested dicts, see DataTree.from_dict().
+    With counters, each interface has 21 leaves instead of 5.
+    """
+    interfaces = []
+    for i in range(count):
+        iface = {
+            'name': 'eth%d' % i,
+            'description': 'interface number %d' % i,
+            'enabled': i % 2 == 0,
+            'mtu': 1500 + i % 8000,
+            'speed': 10000000000,
+        }
+        if counters:
+            iface['counters'] = dict((c, i * n) for n, c in enumerate(COUNTERS))
+        interfaces.append(iface)
+    return {'bench:interfaces': {'interface': interfaces}}
+
+
+#------------------------------------------------------------------------------
+def timed(label, func, *args, **kwargs):
+    """
+    Run func once and print how long it took. Returns whatever func returned.
+    """
+    start = time.time()
+    ret = func(*args, **kwargs)
+    elapsed = time.time() - start
+    print('%-40s %10.3f ms' % (label, elapsed * 1000))
+    return ret
+
+
+#------------------------------------------------------------------------------
+def reset_peak_rss():
+    """
+    Reset the RSS high-water mark of the process (linux only).
+    """
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def rss(field='VmRSS'):
+    """
+    Return a memory field of /proc/self/status in MiB: VmRSS for the current
+    RSS, VmHWM for the peak.
+    """
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
@@ -0,0 +1,49 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Call DataTree.count_xpath() and DataTree.exists() a million times each and
+print the maximum RSS of the process every 100000 calls, it must stay flat.
+
+Run from the top of the repository: python -m benchmarks.soak_count_xpath
+"""
+
+import resource
+import time
+
+import libyang
+
+from .common import IFACE_XPATH
+from .common import interfaces_dict
+from .common import new_context
+
+
+CALLS = 1000000
+STEP = 100000
+
+
+def max_rss():
+    # KiB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def soak(label, func, xpath):
+    print(label)
+    start = time.time()
+    for i in range(CALLS // STEP):
+        for _ in range(STEP):
+            func(xpath)
+        print('  %7d calls  %8d KiB max RSS' % ((i + 1) * STEP, max_rss()))
+    print('  %.1f us per call' % ((time.time() - start) * 1e6 / CALLS))
+
+
+def main():
+    ctx = new_context()
+    tree = libyang.DataTree.from_dict(ctx, interfaces_dict(10))
+    xpath = ctx.compile_xpath(IFACE_XPATH % 'eth5' + '/mtu')
+    soak('count_xpath()', tree.count_xpath, xpath)
+    soak('exists()', tree.exists, xpath)
+
+
+if __name__ == '__main__':
+    main()
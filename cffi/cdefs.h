@@ -15,9 +15,12 @@ struct ly_ctx;
 #define LYD_OPT_TRUSTED ...
 #define LYP_WITHSIBLINGS ...
 #define LYD_PATH_OPT_UPDATE ...
+#define LYD_PATH_OPT_NOPARENTRET ...
 #define LYD_OPT_EXPLICIT ...
 #define LYD_OPT_DESTRUCT ...
 #define LYD_OPT_STRICT ...
+#define LYD_DUP_OPT_RECURSIVE ...
+#define LYD_DUP_OPT_WITH_PARENTS ...
 
 struct ly_ctx *ly_ctx_new(const char *, int);
 int ly_ctx_set_searchdir(struct ly_ctx *, const char *);
@@ -157,6 +160,7 @@ struct lys_type_info_bits {
 
 struct lys_type_info_dec64 {
 	struct lys_restr *range;
+	uint8_t dig;
 	...;
 };
 
@@ -324,6 +328,7 @@ const struct lys_module *ly_ctx_load_module(struct ly_ctx *, const char *, const
 const struct lys_module *ly_ctx_get_module_iter(const struct ly_ctx *, uint32_t *);
 const struct lys_module *ly_ctx_get_module(const struct ly_ctx *, const char *, const char *, int);
 struct ly_set *ly_ctx_find_path(struct ly_ctx *, const char *);
+const struct lys_node *ly_ctx_get_node(const struct ly_ctx *, const struct lys_node *, const char *, int);
 void ly_set_free(struct ly_set *set);
 const struct lys_node_list *lys_is_key(const struct lys_node_leaf *, uint8_t *);
 
@@ -440,14 +445,23 @@ struct lyd_node_leaf_list {
 };
 
 struct lyd_node *lyd_new_path(struct lyd_node*, const struct ly_ctx*, const char*, void*, int, int);
+struct lyd_node *lyd_new(struct lyd_node *, const struct lys_module *, const char *);
+struct lyd_node *lyd_new_leaf(struct lyd_node *, const struct lys_module *, const char *, const char *);
+int lyd_insert_sibling(struct lyd_node **, struct lyd_node *);
 int lyd_print_file(FILE *f, const struct lyd_node *root, LYD_FORMAT format, int options);
 int lyd_print_mem(char **, const struct lyd_node *root, LYD_FORMAT format, int options);
+int lyd_print_path(const char *path, const struct lyd_node *root, LYD_FORMAT format, int options);
+int lyd_lyb_data_length(const char *data);
+size_t strlen(const char *);
 int lyd_merge(struct lyd_node*, const struct lyd_node*, int options);
 struct ly_set *lyd_find_path(const struct lyd_node *ctx_node, const char *path);
 struct lyd_node *lyd_parse_path(struct ly_ctx *ctx, const char *path, LYD_FORMAT format, int options);
 struct lyd_node *lyd_parse_mem(struct ly_ctx *ctx, const char *data, LYD_FORMAT format, int options);
+struct lyd_node *lyd_parse_fd(struct ly_ctx *ctx, int fd, LYD_FORMAT format, int options);
 struct lyd_difflist *lyd_diff(struct lyd_node *first, struct lyd_node *second, int options);
 char *lyd_path(const struct lyd_node *node);
+struct lyd_node *lyd_dup(const struct lyd_node *node, int options);
+struct lyd_node *lyd_dup_withsiblings(const struct lyd_node *node, int options);
 void lyd_free(struct lyd_node *node);
 void lyd_free_withsiblings(struct lyd_node *node);
 void lyd_unlink(struct lyd_node *node);
@@ -458,5 +472,71 @@ const char *, const char *, const char *);
 char *lypy_data_path_pattern(const struct lys_node *);
 char *lypy_node_fullname(const struct lys_node *);
 const struct lyd_node *lypy_get_root_node(const struct lyd_node *node);
+int lypy_set_many(struct lyd_node **, const struct ly_ctx *,
+const char **, const char **, unsigned int, int *, char **);
+int lypy_delete_many(struct lyd_node **, const struct ly_ctx *,
+const char **, unsigned int, int *, char **);
+struct lypy_value {
+	uint16_t nodetype;
+	LY_DATA_TYPE type;
+	const char *str;
+	lyd_val value;
+	uint8_t dig;
+};
+int lypy_count_path(const struct lyd_node *, const char *);
+int lypy_exists(const struct lyd_node *, const char *);
+int lypy_get_values(const struct lyd_node *, const char *, struct lypy_value **);
+struct lypy_tree {
+	unsigned int count;
+	uint32_t *depths;
+	uint32_t *ids;
+	unsigned int nnums;
+	int64_t *nums;
+	size_t strs_len;
+	char *strs;
+	unsigned int nschemas;
+	const struct lys_node **schemas;
+	uint8_t *qualified;
+	...;
+};
+int lypy_flatten(const struct lyd_node *, int, struct lypy_tree *);
+void lypy_tree_free(struct lypy_tree *);
+struct lypy_column {
+	const struct lys_node *schema;
+	int64_t *nums;
+	char *strs;
+	size_t strs_len;
+	uint8_t *missing;
+	unsigned int nmissing;
+	...;
+};
+int lypy_list_columns(const struct lyd_node *, const char *, const struct lys_node *,
+struct lypy_column *, unsigned int);
+void lypy_columns_free(struct lypy_column *, unsigned int);
+#define LYPY_WALK_SIBLINGS ...
+#define LYPY_WALK_FIRST ...
+#define LYPY_WALK_VALUES ...
+#define LYPY_WALK_SCHEMA_ORDER ...
+#define LYPY_PATHS_TEMPLATES ...
+struct lypy_paths {
+	unsigned int count;
+	struct lyd_node **nodes;
+	char *paths;
+	size_t paths_len;
+	struct lypy_value *values;
+	char *keys;
+	size_t keys_len;
+	unsigned int *nkeys;
+	...;
+};
+int lypy_walk_paths(struct lyd_node *, int, uint16_t, struct lypy_paths *);
+int lypy_set_paths(const struct ly_set *, unsigned int, unsigned int, int, struct lypy_paths *);
+void lypy_paths_free(struct lypy_paths *);
+struct lyd_node *lypy_dup_matches(const struct lyd_node *, const char *);
+extern "Python" int lypy_write_cb(void *, const char *, size_t);
+int lypy_print_clb(void *, const struct lyd_node *, LYD_FORMAT, int, size_t);
+int lypy_print_fd(int, const struct lyd_node *, LYD_FORMAT, int, size_t);
+int lypy_insert_list(struct lyd_node **, struct lyd_node *, const struct lys_node *,
+const struct lys_node **, unsigned int, const char **, const char **, unsigned int, int *);
 int validate_data_tree(struct lyd_node *node, struct ly_ctx *ctx);
 int lypy_process_attributes(struct lyd_node *node, struct ly_ctx *ctx, struct lyd_node *tempRoot);
\ No newline at end of file
@@ -3,6 +3,11 @@
  * SPDX-License-Identifier: MIT
  */
 
+#include <errno.h>
+#include <stdarg.h>
+#include <stdio.h>
+#include <unistd.h>
+
 #include <libyang/libyang.h>
 
 static const struct lys_ext_instance *
@@ -129,6 +134,1949 @@ const struct lyd_node *lypy_get_root_node(const struct lyd_node *node) {
 
 }
 
+/*
+ * Join the errors logged in the current thread for ctx (like Context.error()
+ * does) in a new string and clear them.
+ */
+static char *lypy_take_errors(const struct ly_ctx *ctx)
+{
+	struct ly_err_item *e;
+	size_t size = 1;
+	char *msg;
+
+	for (e = ly_err_first(ctx); e; e = e->next) {
+		size += e->path ? strlen(e->path) + 2 : 0;
+		size += e->msg ? strlen(e->msg) + 2 : 0;
+		size += e->apptag ? strlen(e->apptag) + 2 : 0;
+		size++;
+	}
+	msg = malloc(size);
+	if (msg) {
+		msg[0] = '\0';
+		for (e = ly_err_first(ctx); e; e = e->next) {
+			const char *parts[3] = {e->path, e->msg, e->apptag};
+			const char *sep = msg[0] ? " " : "";
+			int i;
+
+			for (i = 0; i < 3; i++) {
+				if (!parts[i])
+					continue;
+				strcat(msg, sep);
+				strcat(msg, parts[i]);
+				sep = ": ";
+			}
+		}
+	}
+	ly_err_clean((struct ly_ctx *)ctx, NULL);
+	return msg;
+}
+
+/*
+ * Each failed item gets failed[i] set and the libyang errors it caused in
+ * errors[i] (to be freed by the caller, NULL if there was no memory left),
+ * so that they do not pile up into the messages of the next failures.
+ */
+int lypy_set_many(struct lyd_node **root, const struct ly_ctx *ctx,
+	const char **paths, const char **values, unsigned int count,
+	int *failed, char **errors)
+{
+	struct lyd_node *node;
+	struct ly_set *set;
+	unsigned int i;
+	int nfailed = 0;
+
+	ly_err_clean((struct ly_ctx *)ctx, NULL);
+	for (i = 0; i < count; i++) {
+		failed[i] = 0;
+		errors[i] = NULL;
+		if (!*root) {
+			node = lyd_new_path(NULL, ctx, paths[i], (void *)values[i],
+				0, LYD_PATH_OPT_UPDATE);
+			if (node) {
+				*root = node;
+				continue;
+			}
+		} else {
+			node = lyd_new_path(*root, NULL, paths[i], (void *)values[i],
+				0, LYD_PATH_OPT_UPDATE);
+			if (node)
+				continue;
+			/* NULL is also returned when nothing changed */
+			set = lyd_find_path(*root, paths[i]);
+			if (set && set->number) {
+				ly_set_free(set);
+				continue;
+			}
+			ly_set_free(set);
+		}
+		failed[i] = 1;
+		errors[i] = lypy_take_errors(ctx);
+		nfailed++;
+	}
+
+	return nfailed;
+}
+
+int lypy_delete_many(struct lyd_node **root, const struct ly_ctx *ctx,
+	const char **paths, unsigned int count, int *failed, char **errors)
+{
+	struct lyd_node *node;
+	struct ly_set *set;
+	unsigned int i, j;
+	int nfailed = 0;
+
+	ly_err_clean((struct ly_ctx *)ctx, NULL);
+	for (i = 0; i < count; i++) {
+		failed[i] = 0;
+		errors[i] = NULL;
+		if (!*root)
+			continue;
+		set = lyd_find_path(*root, paths[i]);
+		if (!set) {
+			failed[i] = 1;
+			errors[i] = lypy_take_errors(ctx);
+			nfailed++;
+			continue;
+		}
+		/* unlink everything first, the set may hold nested nodes */
+		for (j = 0; j < set->number; j++) {
+			node = set->set.d[j];
+			if (node == *root)
+				*root = node->next;
+			lyd_unlink(node);
+		}
+		for (j = 0; j < set->number; j++)
+			lyd_free(set->set.d[j]);
+		ly_set_free(set);
+	}
+
+	return nfailed;
+}
+
+static int lypy_list_predicate(char *buf, size_t size,
+	const struct lys_node_list *slist, const char **keys)
+{
+	size_t len = 0;
+	uint8_t i;
+	int n;
+
+	buf[0] = '\0';
+	for (i = 0; i < slist->keys_size; i++) {
+		char quote = strchr(keys[i], '\'') ? '"' : '\'';
+		if (quote == '"' && strchr(keys[i], '"'))
+			return -1;
+		n = snprintf(buf + len, size - len, "[%s=%c%s%c]",
+			slist->keys[i]->name, quote, keys[i], quote);
+		if (n < 0 || (size_t)n >= size - len)
+			return -1;
+		len += n;
+	}
+	return 0;
+}
+
+static int lypy_update_leaf(struct lyd_node *entry,
+	const struct lys_node *sleaf, const char *value)
+{
+	struct lyd_node *child;
+
+	LY_TREE_FOR(entry->child, child) {
+		if (child->schema != sleaf)
+			continue;
+		if (sleaf->nodetype == LYS_LEAFLIST) {
+			if (!strcmp(((struct lyd_node_leaf_list *)child)->value_str, value))
+				return 0;
+			continue;
+		}
+		return lyd_change_leaf((struct lyd_node_leaf_list *)child, value) < 0;
+	}
+
+	return !lyd_new_leaf(entry, lys_node_module(sleaf), sleaf->name, value);
+}
+
+/*
+ * Create (or update) one list entry per row. Columns are given as blobs of
+ * NUL separated values, the first ones being the list keys in schema order.
+ * A column may have an array of missing flags for rows without a value.
+ */
+int lypy_insert_list(struct lyd_node **root, struct lyd_node *parent,
+	const struct lys_node *schema, const struct lys_node **columns,
+	unsigned int ncols, const char **blobs, const char **missing,
+	unsigned int nrows, int *failed)
+{
+	const struct lys_node_list *slist = (const struct lys_node_list *)schema;
+	struct lyd_node *entry, *siblings;
+	const char **values = NULL;
+	char predicate[4096];
+	unsigned int row, col;
+	int nfailed = 0, created;
+
+	values = malloc(ncols * sizeof(*values));
+	if (!values)
+		return -1;
+	for (col = 0; col < ncols; col++)
+		values[col] = blobs[col];
+
+	for (row = 0; row < nrows; row++) {
+		failed[row] = 0;
+		created = 0;
+		entry = NULL;
+		siblings = parent ? parent->child : *root;
+
+		if (lypy_list_predicate(predicate, sizeof(predicate), slist, values))
+			goto fail;
+		if (siblings && lyd_find_sibling_val(siblings, schema, predicate, &entry))
+			goto fail;
+
+		if (!entry) {
+			entry = lyd_new(parent, lys_node_module(schema), schema->name);
+			if (!entry)
+				goto fail;
+			created = 1;
+			for (col = 0; col < slist->keys_size; col++) {
+				if (!lyd_new_leaf(entry, lys_node_module(columns[col]),
+						columns[col]->name, values[col]))
+					goto fail;
+			}
+		}
+
+		for (col = slist->keys_size; col < ncols; col++) {
+			if (missing[col] && missing[col][row])
+				continue;
+			if (lypy_update_leaf(entry, columns[col], values[col]))
+				goto fail;
+		}
+
+		if (created && !parent) {
+			if (!*root)
+				*root = entry;
+			else if (lyd_insert_sibling(root, entry))
+				goto fail;
+		}
+		goto next;
+fail:
+		if (created)
+			lyd_free(entry);
+		failed[row] = 1;
+		nfailed++;
+next:
+		for (col = 0; col < ncols; col++)
+			values[col] += strlen(values[col]) + 1;
+	}
+
+	free(values);
+	return nfailed;
+}
+
+#define LYPY_WALK_SIBLINGS 0x1
+#define LYPY_WALK_FIRST 0x2
+#define LYPY_WALK_VALUES 0x4
+#define LYPY_WALK_SCHEMA_ORDER 0x8
+#define LYPY_PATHS_TEMPLATES 0x10
+
+struct lypy_value {
+	uint16_t nodetype;
+	LY_DATA_TYPE type;
+	const char *str;
+	lyd_val value;
+	uint8_t dig;
+};
+
+static uint8_t lypy_dec64_digits(const struct lys_type *type)
+{
+	/* fraction-digits is only set on the type which defines it */
+	while (!type->info.dec64.dig && type->der)
+		type = &type->der->type;
+	return type->info.dec64.dig;
+}
+
+static void lypy_fill_value(struct lypy_value *v, const struct lyd_node *node)
+{
+	v->nodetype = node->schema->nodetype;
+	if (node->schema->nodetype & (LYS_LEAF | LYS_LEAFLIST)) {
+		/* leaf and leaf-list schema nodes share the same layout */
+		const struct lys_type *type = &((struct lys_node_leaf *)node->schema)->type;
+		v->type = type->base;
+		v->str = ((struct lyd_node_leaf_list *)node)->value_str;
+		v->value = ((struct lyd_node_leaf_list *)node)->value;
+		if (type->base == LY_TYPE_DEC64)
+			v->dig = lypy_dec64_digits(type);
+	}
+}
+
+/*
+ * Collect the schema node type, base type, (dictionary) value string and
+ * parsed value of all the nodes matching path. Returns the number of values, stored in an
+ * array the caller must free(), or -1 on allocation error.
+ */
+int lypy_get_values(const struct lyd_node *root, const char *path,
+	struct lypy_value **values)
+{
+	struct lypy_value *v = NULL;
+	struct ly_set *set;
+	unsigned int i;
+	int count;
+
+	*values = NULL;
+	set = lyd_find_path(root, path);
+	if (!set)
+		return 0;
+
+	count = set->number;
+	if (count) {
+		v = calloc(count, sizeof(*v));
+		if (!v) {
+			ly_set_free(set);
+			return -1;
+		}
+	}
+
+	for (i = 0; i < set->number; i++)
+		lypy_fill_value(&v[i], set->set.d[i]);
+
+	ly_set_free(set);
+	*values = v;
+	return count;
+}
+
+/* Open addressing hash table of pointers to uint32_t values. */
+struct lypy_map {
+	const void **keys;
+	uint32_t *values;
+	size_t size, count;
+};
+
+static void lypy_map_free(struct lypy_map *map)
+{
+	free(map->keys);
+	free(map->values);
+	memset(map, 0, sizeof(*map));
+}
+
+static size_t lypy_map_slot(const struct lypy_map *map, const void *key)
+{
+	size_t mask = map->size - 1, i = ((uintptr_t)key >> 4) & mask;
+
+	while (map->keys[i] && map->keys[i] != key)
+		i = (i + 1) & mask;
+	return i;
+}
+
+static int lypy_map_get(const struct lypy_map *map, const void *key, uint32_t *value)
+{
+	size_t i;
+
+	if (!map->size)
+		return 0;
+	i = lypy_map_slot(map, key);
+	if (!map->keys[i])
+		return 0;
+	*value = map->values[i];
+	return 1;
+}
+
+static int lypy_map_put(struct lypy_map *map, const void *key, uint32_t value)
+{
+	struct lypy_map old;
+	size_t i, j;
+
+	if (map->count * 2 >= map->size) {
+		old = *map;
+		map->size = old.size ? old.size * 2 : 64;
+		map->keys = calloc(map->size, sizeof(*map->keys));
+		map->values = malloc(map->size * sizeof(*map->values));
+		if (!map->keys || !map->values) {
+			free(map->keys);
+			free(map->values);
+			*map = old;
+			return -1;
+		}
+		for (i = 0; i < old.size; i++) {
+			if (!old.keys[i])
+				continue;
+			j = lypy_map_slot(map, old.keys[i]);
+			map->keys[j] = old.keys[i];
+			map->values[j] = old.values[i];
+		}
+		free(old.keys);
+		free(old.values);
+	}
+
+	i = lypy_map_slot(map, key);
+	if (!map->keys[i])
+		map->count++;
+	map->keys[i] = key;
+	map->values[i] = value;
+	return 0;
+}
+
+struct lypy_tree {
+	unsigned int count;
+	uint32_t *depths;
+	uint32_t *ids;
+	unsigned int nnums;
+	int64_t *nums;
+	size_t strs_len;
+	char *strs;
+	unsigned int nschemas;
+	const struct lys_node **schemas;
+	uint8_t *qualified;
+	/* private */
+	size_t size, nums_size, strs_size, schemas_size;
+	struct lypy_map ids_map;
+};
+
+void lypy_tree_free(struct lypy_tree *tree)
+{
+	free(tree->depths);
+	free(tree->ids);
+	free(tree->nums);
+	free(tree->strs);
+	free(tree->schemas);
+	free(tree->qualified);
+	lypy_map_free(&tree->ids_map);
+	memset(tree, 0, sizeof(*tree));
+}
+
+static int lypy_grow(void *array, size_t *size, size_t need, size_t elsize)
+{
+	size_t new_size = *size ? *size : 256;
+	void *p;
+
+	if (need <= *size)
+		return 0;
+	while (new_size < need)
+		new_size *= 2;
+	p = realloc(*(void **)array, new_size * elsize);
+	if (!p)
+		return -1;
+	*(void **)array = p;
+	*size = new_size;
+	return 0;
+}
+
+/*
+ * Return the index of the schema node of node in tree->schemas, adding it
+ * when first seen.
+ */
+static int lypy_tree_schema_id(struct lypy_tree *tree, const struct lyd_node *node,
+	unsigned int depth)
+{
+	const struct lys_node *schema = node->schema;
+	uint32_t id;
+
+	if (lypy_map_get(&tree->ids_map, schema, &id))
+		return id;
+
+	if (tree->nschemas == tree->schemas_size) {
+		size_t size = tree->schemas_size;
+		if (lypy_grow(&tree->qualified, &size, tree->nschemas + 1,
+				sizeof(*tree->qualified)) < 0)
+			return -1;
+		if (lypy_grow(&tree->schemas, &tree->schemas_size, tree->nschemas + 1,
+				sizeof(*tree->schemas)) < 0)
+			return -1;
+	}
+	if (lypy_map_put(&tree->ids_map, schema, tree->nschemas) < 0)
+		return -1;
+	tree->schemas[tree->nschemas] = schema;
+	/* a schema node is always found at the same depth */
+	tree->qualified[tree->nschemas] = !depth || lys_node_module(schema) !=
+		lys_node_module(node->parent->schema);
+	return tree->nschemas++;
+}
+
+enum lypy_value_kind {
+	LYPY_VALUE_NONE,
+	LYPY_VALUE_NUM,
+	LYPY_VALUE_STR,
+};
+
+/*
+ * Integers, booleans and decimal64 are exported as int64_t (uint64 values
+ * are stored as is and must be converted back), empty leaves have no value
+ * and everything else is exported as a string.
+ */
+static enum lypy_value_kind lypy_value_kind(LY_DATA_TYPE base)
+{
+	switch (base) {
+	case LY_TYPE_EMPTY:
+		return LYPY_VALUE_NONE;
+	case LY_TYPE_BOOL:
+	case LY_TYPE_DEC64:
+	case LY_TYPE_INT8:
+	case LY_TYPE_INT16:
+	case LY_TYPE_INT32:
+	case LY_TYPE_INT64:
+	case LY_TYPE_UINT8:
+	case LY_TYPE_UINT16:
+	case LY_TYPE_UINT32:
+	case LY_TYPE_UINT64:
+		return LYPY_VALUE_NUM;
+	default:
+		return LYPY_VALUE_STR;
+	}
+}
+
+static int64_t lypy_value_num(const struct lyd_node_leaf_list *leaf, LY_DATA_TYPE base)
+{
+	switch (base) {
+	case LY_TYPE_BOOL:
+		return leaf->value.bln;
+	case LY_TYPE_DEC64:
+		return leaf->value.dec64;
+	case LY_TYPE_INT8:
+		return leaf->value.int8;
+	case LY_TYPE_INT16:
+		return leaf->value.int16;
+	case LY_TYPE_INT32:
+		return leaf->value.int32;
+	case LY_TYPE_INT64:
+		return leaf->value.int64;
+	case LY_TYPE_UINT8:
+		return leaf->value.uint8;
+	case LY_TYPE_UINT16:
+		return leaf->value.uint16;
+	case LY_TYPE_UINT32:
+		return leaf->value.uint32;
+	case LY_TYPE_UINT64:
+		return (int64_t)leaf->value.uint64;
+	default:
+		return 0;
+	}
+}
+
+/* Append n bytes of mem to buf, which is kept NUL terminated. */
+static int lypy_append_mem(char **buf, size_t *len, size_t *size, const char *mem, size_t n)
+{
+	if (lypy_grow(buf, size, *len + n + 1, 1) < 0)
+		return -1;
+	if (n)
+		memcpy(*buf + *len, mem, n);
+	*len += n;
+	(*buf)[*len] = '\0';
+	return 0;
+}
+
+/* Append all the strings given up to a NULL argument to buf. */
+static int lypy_append_all(char **buf, size_t *len, size_t *size, ...)
+{
+	const char *str;
+	va_list ap;
+	int ret = 0;
+
+	va_start(ap, size);
+	while ((str = va_arg(ap, const char *))) {
+		if (lypy_append_mem(buf, len, size, str, strlen(str)) < 0) {
+			ret = -1;
+			break;
+		}
+	}
+	va_end(ap);
+	return ret;
+}
+
+/* Append a NUL terminated copy of str (NULL is appended as "") to buf. */
+static int lypy_append_str(char **buf, size_t *len, size_t *size, const char *str)
+{
+	if (lypy_append_mem(buf, len, size, str ? str : "", str ? strlen(str) : 0) < 0)
+		return -1;
+	/* keep the NUL terminator */
+	(*len)++;
+	return 0;
+}
+
+/*
+ * Store the value of a leaf or leaf-list node in tree->nums or tree->strs,
+ * see lypy_value_kind().
+ */
+static int lypy_tree_value(struct lypy_tree *tree, const struct lyd_node *node)
+{
+	const struct lyd_node_leaf_list *leaf = (const struct lyd_node_leaf_list *)node;
+	/* leaf and leaf-list schema nodes share the same layout */
+	LY_DATA_TYPE base = ((const struct lys_node_leaf *)node->schema)->type.base;
+
+	switch (lypy_value_kind(base)) {
+	case LYPY_VALUE_NUM:
+		if (lypy_grow(&tree->nums, &tree->nums_size, tree->nnums + 1,
+				sizeof(*tree->nums)) < 0)
+			return -1;
+		tree->nums[tree->nnums++] = lypy_value_num(leaf, base);
+		return 0;
+	case LYPY_VALUE_STR:
+		return lypy_append_str(&tree->strs, &tree->strs_len, &tree->strs_size,
+			leaf->value_str);
+	default:
+		return 0;
+	}
+}
+
+static const struct lys_node *lypy_schema_parent(const struct lys_node *snode)
+{
+	do {
+		snode = lys_parent(snode);
+	} while (snode && snode->nodetype == LYS_USES);
+	return snode;
+}
+
+/*
+ * Tell if a default node is printed by libyang in the default (explicit)
+ * with-defaults mode: only if it holds state data.
+ */
+static int lypy_wd_toprint(const struct lyd_node *node)
+{
+	const struct lyd_node *next, *elem;
+
+	if (!node->dflt || (node->schema->flags & LYS_CONFIG_R))
+		return 1;
+	LY_TREE_DFS_BEGIN(node, next, elem) {
+		if (elem->schema->flags & LYS_CONFIG_R)
+			return 1;
+		LY_TREE_DFS_END(node, next, elem)
+	}
+	return 0;
+}
+
+/*
+ * Same as lyd_toprint() from libyang printer.c: default nodes are omitted,
+ * unless they are the only nodes of a non-default case.
+ */
+static int lypy_toprint(const struct lyd_node *node)
+{
+	const struct lys_node *scase, *schoice;
+	const struct lyd_node *first;
+
+	if (lypy_wd_toprint(node))
+		return 1;
+	scase = lypy_schema_parent(node->schema);
+	if (!scase || scase->nodetype != LYS_CASE)
+		return 0;
+	schoice = lypy_schema_parent(scase);
+	if (!schoice || schoice->nodetype != LYS_CHOICE ||
+			((const struct lys_node_choice *)schoice)->dflt == scase)
+		return 0;
+	for (first = node->prev; first->prev->next; first = first->prev)
+		;
+	for (; first; first = first->next) {
+		if (first != node && lypy_schema_parent(first->schema) == scase &&
+				lypy_wd_toprint(first))
+			return 0;
+	}
+	return 1;
+}
+
+/*
+ * Flatten the subtree of start (and of all its siblings if requested) in
+ * depth-first order. Default nodes are skipped like the libyang printers do. For each node, tree->depths holds its depth and
+ * tree->ids the index of its schema node in tree->schemas. Leaf values are
+ * stored in node order in tree->nums or tree->strs (see lypy_tree_value()).
+ * tree->qualified tells, for each schema node, if its name must be qualified
+ * with its module name like in the JSON encoding. Returns 0 on success, -1 on
+ * allocation error. The tree arrays must be released with lypy_tree_free().
+ */
+int lypy_flatten(const struct lyd_node *start, int siblings, struct lypy_tree *tree)
+{
+	const struct lyd_node *node;
+	unsigned int depth = 0;
+	int id;
+
+	memset(tree, 0, sizeof(*tree));
+	if (siblings) {
+		while (start->prev->next)
+			start = start->prev;
+	}
+
+	node = start;
+	while (node) {
+		if (tree->count == tree->size) {
+			size_t size = tree->size;
+			if (lypy_grow(&tree->ids, &size, tree->count + 1, sizeof(*tree->ids)) < 0)
+				goto error;
+			if (lypy_grow(&tree->depths, &tree->size, tree->count + 1,
+					sizeof(*tree->depths)) < 0)
+				goto error;
+		}
+		if (!lypy_toprint(node))
+			goto next;
+		id = lypy_tree_schema_id(tree, node, depth);
+		if (id < 0)
+			goto error;
+		tree->depths[tree->count] = depth;
+		tree->ids[tree->count] = id;
+		tree->count++;
+
+		if (node->schema->nodetype & (LYS_LEAF | LYS_LEAFLIST)) {
+			if (lypy_tree_value(tree, node) < 0)
+				goto error;
+		} else if (!(node->schema->nodetype & LYS_ANYDATA) && node->child) {
+			node = node->child;
+			depth++;
+			continue;
+		}
+next:
+		/* next sibling, or next sibling of the closest ancestor */
+		while (node) {
+			if (!depth) {
+				node = siblings ? node->next : NULL;
+				break;
+			}
+			if (node->next) {
+				node = node->next;
+				break;
+			}
+			node = node->parent;
+			depth--;
+		}
+	}
+
+	return 0;
+
+error:
+	lypy_tree_free(tree);
+	return -1;
+}
+
+struct lypy_column {
+	const struct lys_node *schema;
+	int64_t *nums;
+	char *strs;
+	size_t strs_len;
+	uint8_t *missing;
+	unsigned int nmissing;
+	/* private */
+	size_t strs_size;
+};
+
+void lypy_columns_free(struct lypy_column *columns, unsigned int ncols)
+{
+	unsigned int i;
+
+	for (i = 0; i < ncols; i++) {
+		free(columns[i].nums);
+		free(columns[i].strs);
+		free(columns[i].missing);
+		columns[i].nums = NULL;
+		columns[i].strs = NULL;
+		columns[i].missing = NULL;
+	}
+}
+
+/*
+ * Fill row of the columns from the leaves of a list entry, looking into its
+ * child containers as well.
+ */
+static int lypy_fill_columns(const struct lyd_node *node, struct lypy_column *columns,
+	unsigned int ncols, unsigned int row)
+{
+	const struct lyd_node_leaf_list *leaf;
+	const struct lyd_node *child;
+	struct lypy_column *col;
+	LY_DATA_TYPE base;
+	unsigned int i;
+
+	LY_TREE_FOR(node->child, child) {
+		if (child->schema->nodetype == LYS_CONTAINER) {
+			if (lypy_fill_columns(child, columns, ncols, row) < 0)
+				return -1;
+			continue;
+		}
+		if (child->schema->nodetype != LYS_LEAF)
+			continue;
+		for (i = 0; i < ncols; i++) {
+			if (columns[i].schema == child->schema)
+				break;
+		}
+		if (i == ncols)
+			continue;
+
+		col = &columns[i];
+		leaf = (const struct lyd_node_leaf_list *)child;
+		base = ((const struct lys_node_leaf *)child->schema)->type.base;
+		col->missing[row] = 0;
+		if (col->nums) {
+			col->nums[row] = lypy_value_num(leaf, base);
+		} else if (lypy_value_kind(base) == LYPY_VALUE_STR) {
+			if (lypy_append_str(&col->strs, &col->strs_len, &col->strs_size,
+					leaf->value_str) < 0)
+				return -1;
+		}
+	}
+
+	return 0;
+}
+
+static unsigned int lypy_count_entries(const struct lyd_node *first,
+	const struct lys_node *list)
+{
+	const struct lyd_node *node;
+	unsigned int count = 0;
+
+	LY_TREE_FOR(first, node) {
+		if (node->schema == list)
+			count++;
+	}
+	return count;
+}
+
+/*
+ * Export the given leaves (schema nodes in columns[].schema, direct children
+ * of the list or of its child containers) of all the entries of a list in
+ * columns. The entries are looked up under all the nodes matching
+ * parent_path, or among the top-level nodes when parent_path is NULL. For
+ * each leaf, columns[].missing tells which entries do not have it, numeric
+ * values are stored in columns[].nums and string values in columns[].strs
+ * (see lypy_value_kind()). Returns the number of entries, -1 on error. The
+ * columns must be released with lypy_columns_free().
+ */
+int lypy_list_columns(const struct lyd_node *root, const char *parent_path,
+	const struct lys_node *list, struct lypy_column *columns, unsigned int ncols)
+{
+	const struct lyd_node **parents = NULL, *first, *node;
+	unsigned int nparents = 1, count = 0, row = 0, i, c;
+	enum lypy_value_kind kind;
+	struct ly_set *set = NULL;
+	int ret = -1;
+
+	for (c = 0; c < ncols; c++) {
+		columns[c].nums = NULL;
+		columns[c].strs = NULL;
+		columns[c].strs_len = columns[c].strs_size = 0;
+		columns[c].missing = NULL;
+		columns[c].nmissing = 0;
+	}
+	if (!root) {
+		nparents = 0;
+	} else if (parent_path) {
+		set = lyd_find_path(root, parent_path);
+		nparents = set ? set->number : 0;
+		if (set)
+			parents = (const struct lyd_node **)set->set.d;
+	} else {
+		while (root->prev->next)
+			root = root->prev;
+	}
+
+	for (i = 0; i < nparents; i++) {
+		first = parents ? parents[i]->child : root;
+		count += lypy_count_entries(first, list);
+	}
+
+	for (c = 0; c < ncols; c++) {
+		/* at least one byte, malloc(0) may return NULL */
+		columns[c].missing = malloc(count + 1);
+		if (!columns[c].missing)
+			goto out;
+		memset(columns[c].missing, 1, count);
+		kind = lypy_value_kind(((const struct lys_node_leaf *)columns[c].schema)->type.base);
+		if (kind == LYPY_VALUE_NUM) {
+			columns[c].nums = calloc(count + 1, sizeof(*columns[c].nums));
+			if (!columns[c].nums)
+				goto out;
+		}
+	}
+
+	for (i = 0; i < nparents; i++) {
+		first = parents ? parents[i]->child : root;
+		LY_TREE_FOR(first, node) {
+			if (node->schema != list)
+				continue;
+			if (lypy_fill_columns(node, columns, ncols, row) < 0)
+				goto out;
+			for (c = 0; c < ncols; c++) {
+				if (!columns[c].missing[row])
+					continue;
+				columns[c].nmissing++;
+				/* keep the strings aligned with the rows */
+				if (!columns[c].nums && lypy_append_str(&columns[c].strs,
+						&columns[c].strs_len, &columns[c].strs_size, NULL) < 0)
+					goto out;
+			}
+			row++;
+		}
+	}
+	ret = row;
+
+out:
+	ly_set_free(set);
+	if (ret < 0)
+		lypy_columns_free(columns, ncols);
+	return ret;
+}
+
+/* NUL terminated predicate values split out of a path template */
+struct lypy_keys {
+	char *buf;
+	size_t len, size;
+	unsigned int count;
+};
+
+/*
+ * Append a predicate value to buf, quoted as lyd_path() does. When building
+ * a path template (keys is not NULL), append a %s placeholder instead and
+ * the value to keys.
+ */
+static int lypy_path_value(char **buf, size_t *len, size_t *size, struct lypy_keys *keys,
+	const char *value)
+{
+	const char *quote;
+
+	if (keys) {
+		if (lypy_append_str(&keys->buf, &keys->len, &keys->size, value) < 0)
+			return -1;
+		keys->count++;
+		return lypy_append_all(buf, len, size, "%s", NULL);
+	}
+	quote = strchr(value, '\'') ? "\"" : "'";
+	return lypy_append_all(buf, len, size, quote, value, quote, NULL);
+}
+
+/*
+ * Append the last step of the data path of node to buf, in the same format
+ * as lyd_path(): "/[module:]name" followed by the key predicates of list
+ * entries ("[key='value']", or the position for lists without keys) and the
+ * value predicate of leaf-list entries ("[.='value']"). See lypy_path_value()
+ * for keys.
+ */
+static int lypy_path_step(char **buf, size_t *len, size_t *size, struct lypy_keys *keys,
+	const struct lyd_node *node)
+{
+	const struct lys_module *module = lyd_node_module(node);
+	const struct lys_node_list *slist;
+	const struct lyd_node *key;
+	const char *value;
+	char pos[16];
+	int i;
+
+	if (lypy_append_all(buf, len, size, "/", NULL) < 0)
+		return -1;
+	if ((!node->parent || module != lyd_node_module(node->parent)) &&
+			lypy_append_all(buf, len, size, module->name, ":", NULL) < 0)
+		return -1;
+	if (lypy_append_all(buf, len, size, node->schema->name, NULL) < 0)
+		return -1;
+
+	switch (node->schema->nodetype) {
+	case LYS_LIST:
+		slist = (const struct lys_node_list *)node->schema;
+		if (!slist->keys_size) {
+			snprintf(pos, sizeof(pos), "[%u]", lyd_list_pos(node));
+			return lypy_append_all(buf, len, size, pos, NULL);
+		}
+		for (i = 0; i < slist->keys_size; i++) {
+			LY_TREE_FOR(node->child, key) {
+				if (key->schema == (struct lys_node *)slist->keys[i])
+					break;
+			}
+			if (!key || !((const struct lyd_node_leaf_list *)key)->value_str)
+				continue;
+			value = ((const struct lyd_node_leaf_list *)key)->value_str;
+			if (lypy_append_all(buf, len, size, "[", NULL) < 0)
+				return -1;
+			if (lyd_node_module(key) != module &&
+					lypy_append_all(buf, len, size, lyd_node_module(key)->name, ":", NULL) < 0)
+				return -1;
+			if (lypy_append_all(buf, len, size, key->schema->name, "=", NULL) < 0)
+				return -1;
+			if (lypy_path_value(buf, len, size, keys, value) < 0)
+				return -1;
+			if (lypy_append_all(buf, len, size, "]", NULL) < 0)
+				return -1;
+		}
+		return 0;
+	case LYS_LEAFLIST:
+		value = ((const struct lyd_node_leaf_list *)node)->value_str;
+		if (!value)
+			return 0;
+		if (lypy_append_all(buf, len, size, "[.=", NULL) < 0)
+			return -1;
+		if (lypy_path_value(buf, len, size, keys, value) < 0)
+			return -1;
+		return lypy_append_all(buf, len, size, "]", NULL);
+	default:
+		return 0;
+	}
+}
+
+struct lypy_paths {
+	unsigned int count;
+	struct lyd_node **nodes;
+	char *paths;
+	size_t paths_len;
+	struct lypy_value *values;
+	char *keys;
+	size_t keys_len;
+	unsigned int *nkeys;
+	/* private */
+	size_t size, paths_size, keys_size;
+};
+
+void lypy_paths_free(struct lypy_paths *out)
+{
+	free(out->nodes);
+	free(out->paths);
+	free(out->values);
+	free(out->keys);
+	free(out->nkeys);
+	memset(out, 0, sizeof(*out));
+}
+
+static int lypy_paths_add(struct lypy_paths *out, struct lyd_node *node, const char *path,
+	const struct lypy_keys *keys, int flags)
+{
+	if (out->count == out->size) {
+		size_t size = out->size;
+		if ((flags & LYPY_WALK_VALUES) && lypy_grow(&out->values, &size, out->count + 1,
+				sizeof(*out->values)) < 0)
+			return -1;
+		size = out->size;
+		if (keys && lypy_grow(&out->nkeys, &size, out->count + 1, sizeof(*out->nkeys)) < 0)
+			return -1;
+		if (lypy_grow(&out->nodes, &out->size, out->count + 1, sizeof(*out->nodes)) < 0)
+			return -1;
+	}
+	if (lypy_append_str(&out->paths, &out->paths_len, &out->paths_size, path) < 0)
+		return -1;
+	if (keys) {
+		if (lypy_append_mem(&out->keys, &out->keys_len, &out->keys_size, keys->buf,
+				keys->len) < 0)
+			return -1;
+		out->nkeys[out->count] = keys->count;
+	}
+	if (flags & LYPY_WALK_VALUES) {
+		memset(&out->values[out->count], 0, sizeof(*out->values));
+		lypy_fill_value(&out->values[out->count], node);
+	}
+	out->nodes[out->count++] = node;
+	return 0;
+}
+
+/*
+ * Compare the values of two leaf or leaf-list data nodes of the same type:
+ * numerically for numeric types (see lypy_value_kind()), as strings
+ * otherwise. Missing nodes come first.
+ */
+static int lypy_leaf_cmp(const struct lyd_node *a, const struct lyd_node *b)
+{
+	const struct lyd_node_leaf_list *x = (const struct lyd_node_leaf_list *)a;
+	const struct lyd_node_leaf_list *y = (const struct lyd_node_leaf_list *)b;
+	LY_DATA_TYPE base;
+	int64_t i, j;
+
+	if (!a || !b)
+		return !!a - !!b;
+	base = ((const struct lys_node_leaf *)a->schema)->type.base;
+	switch (lypy_value_kind(base)) {
+	case LYPY_VALUE_NUM:
+		i = lypy_value_num(x, base);
+		j = lypy_value_num(y, base);
+		if (base == LY_TYPE_UINT64)
+			return ((uint64_t)i > (uint64_t)j) - ((uint64_t)i < (uint64_t)j);
+		return (i > j) - (i < j);
+	case LYPY_VALUE_STR:
+		return strcmp(x->value_str ? x->value_str : "", y->value_str ? y->value_str : "");
+	default:
+		return 0;
+	}
+}
+
+static const struct lyd_node *lypy_find_child(const struct lyd_node *node,
+	const struct lys_node *schema)
+{
+	const struct lyd_node *child;
+
+	LY_TREE_FOR(node->child, child) {
+		if (child->schema == schema)
+			return child;
+	}
+	return NULL;
+}
+
+/* Compare two entries of the same list or leaf-list by key or by value. */
+static int lypy_entry_cmp(const struct lyd_node *a, const struct lyd_node *b)
+{
+	const struct lys_node_list *slist;
+	const struct lys_node *key;
+	int i, ret;
+
+	if (a->schema->nodetype == LYS_LEAFLIST)
+		return lypy_leaf_cmp(a, b);
+	if (a->schema->nodetype != LYS_LIST)
+		return 0;
+
+	slist = (const struct lys_node_list *)a->schema;
+	for (i = 0; i < slist->keys_size; i++) {
+		key = (const struct lys_node *)slist->keys[i];
+		ret = lypy_leaf_cmp(lypy_find_child(a, key), lypy_find_child(b, key));
+		if (ret)
+			return ret;
+	}
+	return 0;
+}
+
+struct lypy_sibling {
+	struct lyd_node *node;
+	uint32_t rank;
+	unsigned int pos;
+};
+
+/*
+ * Siblings in schema order: top-level nodes by module name, then in the
+ * order their schema nodes are defined, then list and leaf-list entries by
+ * key or value unless they are ordered-by user. Remaining ties keep the
+ * data order.
+ */
+static int lypy_sibling_cmp(const void *a, const void *b)
+{
+	const struct lypy_sibling *x = a, *y = b;
+	int ret;
+
+	if (!x->node->parent) {
+		ret = strcmp(lyd_node_module(x->node)->name, lyd_node_module(y->node)->name);
+		if (ret)
+			return ret;
+	}
+	if (x->rank != y->rank)
+		return x->rank < y->rank ? -1 : 1;
+	if (!(x->node->schema->flags & LYS_USERORDERED)) {
+		ret = lypy_entry_cmp(x->node, y->node);
+		if (ret)
+			return ret;
+	}
+	return (x->pos > y->pos) - (x->pos < y->pos);
+}
+
+/*
+ * Rank the schema node of node among its siblings, in lys_getnext() order
+ * (augments included). All the siblings are ranked at once and the ranks are
+ * kept in the ranks map.
+ */
+static int lypy_schema_rank(struct lypy_map *ranks, const struct lyd_node *node,
+	uint32_t *rank)
+{
+	const struct lys_node *parent = NULL, *iter = NULL;
+	const struct lys_module *module = NULL;
+	uint32_t n = 0;
+
+	if (lypy_map_get(ranks, node->schema, rank))
+		return 0;
+
+	if (node->parent)
+		parent = node->parent->schema;
+	else
+		module = lys_node_module(node->schema);
+	while ((iter = lys_getnext(iter, parent, module, 0))) {
+		if (lypy_map_put(ranks, iter, n++) < 0)
+			return -1;
+	}
+
+	if (!lypy_map_get(ranks, node->schema, rank)) {
+		/* not found with lys_getnext(), rank it last */
+		*rank = n;
+		if (lypy_map_put(ranks, node->schema, n) < 0)
+			return -1;
+	}
+	return 0;
+}
+
+struct lypy_frame {
+	struct lypy_sibling *siblings;
+	unsigned int pos, count;
+	size_t len;
+};
+
+/*
+ * Fill a walk frame with first (and its following siblings if requested)
+ * in schema order. len is the length of the path of their parent.
+ */
+static int lypy_frame_init(struct lypy_frame *frame, struct lypy_map *ranks,
+	struct lyd_node *first, int siblings, size_t len)
+{
+	struct lyd_node *node;
+	unsigned int i, count = 0;
+
+	memset(frame, 0, sizeof(*frame));
+	for (node = first; node; node = siblings ? node->next : NULL)
+		count++;
+	frame->siblings = malloc(count * sizeof(*frame->siblings));
+	if (!frame->siblings)
+		return -1;
+
+	i = 0;
+	for (node = first; node; node = siblings ? node->next : NULL) {
+		frame->siblings[i].node = node;
+		frame->siblings[i].pos = i;
+		if (lypy_schema_rank(ranks, node, &frame->siblings[i].rank) < 0) {
+			free(frame->siblings);
+			frame->siblings = NULL;
+			return -1;
+		}
+		i++;
+	}
+	if (count > 1)
+		qsort(frame->siblings, count, sizeof(*frame->siblings), lypy_sibling_cmp);
+
+	frame->count = count;
+	frame->len = len;
+	return 0;
+}
+
+/*
+ * Same as the document order walk of lypy_walk_paths() but with siblings
+ * in schema order (see lypy_sibling_cmp()). Each group of siblings is sorted
+ * on its own when the walk reaches it.
+ */
+static int lypy_walk_schema_order(struct lyd_node *start, int flags, uint16_t nodetypes,
+	struct lypy_paths *out, char **path, size_t *path_len, size_t *path_size)
+{
+	struct lypy_map ranks = {0};
+	struct lypy_frame *frames = NULL, *f;
+	size_t frames_size = 0;
+	struct lyd_node *node;
+	int depth = -1, ret = -1;
+
+	if (lypy_grow(&frames, &frames_size, 1, sizeof(*frames)) < 0)
+		goto out;
+	if (lypy_frame_init(&frames[0], &ranks, start, flags & LYPY_WALK_SIBLINGS, *path_len) < 0)
+		goto out;
+	depth = 0;
+
+	while (depth >= 0) {
+		f = &frames[depth];
+		if (f->pos == f->count) {
+			free(f->siblings);
+			depth--;
+			continue;
+		}
+		node = f->siblings[f->pos++].node;
+		*path_len = f->len;
+		if (lypy_path_step(path, path_len, path_size, NULL, node) < 0)
+			goto out;
+		if ((node->schema->nodetype & nodetypes) && lypy_paths_add(out, node, *path, NULL, flags) < 0)
+			goto out;
+
+		if (!(node->schema->nodetype & (LYS_LEAF | LYS_LEAFLIST | LYS_ANYDATA))
+				&& node->child) {
+			if (lypy_grow(&frames, &frames_size, depth + 2, sizeof(*frames)) < 0)
+				goto out;
+			if (lypy_frame_init(&frames[depth + 1], &ranks, node->child, 1, *path_len) < 0)
+				goto out;
+			depth++;
+		}
+	}
+	ret = 0;
+
+out:
+	for (; depth >= 0; depth--)
+		free(frames[depth].siblings);
+	free(frames);
+	lypy_map_free(&ranks);
+	return ret;
+}
+
+/*
+ * Walk the subtree of start in document (depth-first) order and collect the
+ * nodes whose schema type is in nodetypes, with their data path in the same
+ * format as lyd_path(). The paths are built incrementally from the path of
+ * their parent instead of walking up to the root for each node.
+ *
+ * The following siblings of start (and their subtree) are walked too with
+ * LYPY_WALK_SIBLINGS, all its siblings with LYPY_WALK_FIRST. With
+ * LYPY_WALK_VALUES, the values of the nodes are collected as well (see
+ * lypy_get_values()). With LYPY_WALK_SCHEMA_ORDER, siblings are walked in
+ * schema order instead of data order, see lypy_walk_schema_order(). Paths
+ * are stored in out->paths as a NUL separated blob. Returns 0 on success, -1
+ * on allocation error. The results must be released with lypy_paths_free().
+ */
+int lypy_walk_paths(struct lyd_node *start, int flags, uint16_t nodetypes,
+	struct lypy_paths *out)
+{
+	size_t path_len = 0, path_size = 0, lens_size = 0, *lens = NULL;
+	unsigned int depth = 0;
+	struct lyd_node *node;
+	char *path = NULL;
+
+	memset(out, 0, sizeof(*out));
+	if (flags & LYPY_WALK_FIRST) {
+		while (start->prev->next)
+			start = start->prev;
+		flags |= LYPY_WALK_SIBLINGS;
+	}
+
+	/* lens[depth] is the length of the path of the parent of the nodes at depth */
+	if (lypy_grow(&lens, &lens_size, 1, sizeof(*lens)) < 0)
+		goto error;
+	if (start->parent) {
+		char *parent_path = lyd_path(start->parent);
+		int ret = parent_path ? lypy_append_all(&path, &path_len, &path_size,
+			parent_path, NULL) : -1;
+		free(parent_path);
+		if (ret < 0)
+			goto error;
+	}
+	lens[0] = path_len;
+
+	if (flags & LYPY_WALK_SCHEMA_ORDER) {
+		if (lypy_walk_schema_order(start, flags, nodetypes, out, &path, &path_len,
+				&path_size) < 0)
+			goto error;
+		free(path);
+		free(lens);
+		return 0;
+	}
+
+	node = start;
+	while (node) {
+		path_len = lens[depth];
+		if (lypy_path_step(&path, &path_len, &path_size, NULL, node) < 0)
+			goto error;
+		if ((node->schema->nodetype & nodetypes) && lypy_paths_add(out, node, path, NULL, flags) < 0)
+			goto error;
+
+		if (!(node->schema->nodetype & (LYS_LEAF | LYS_LEAFLIST | LYS_ANYDATA))
+				&& node->child) {
+			if (lypy_grow(&lens, &lens_size, depth + 2, sizeof(*lens)) < 0)
+				goto error;
+			lens[++depth] = path_len;
+			node = node->child;
+			continue;
+		}
+		/* next sibling, or next sibling of the closest ancestor */
+		while (node) {
+			if (!depth) {
+				node = (flags & LYPY_WALK_SIBLINGS) ? node->next : NULL;
+				break;
+			}
+			if (node->next) {
+				node = node->next;
+				break;
+			}
+			node = node->parent;
+			depth--;
+		}
+	}
+
+	free(path);
+	free(lens);
+	return 0;
+
+error:
+	free(path);
+	free(lens);
+	lypy_paths_free(out);
+	return -1;
+}
+
+/* an ancestor step of the last path built by lypy_set_paths() */
+struct lypy_ancestor {
+	const struct lyd_node *node;
+	/* lengths of the path (and keys) up to and including this step */
+	size_t len, keys_len;
+	unsigned int nkeys;
+};
+
+/*
+ * Collect the data paths of the nodes of set between start and stop, in the
+ * same format as lyd_path(). Consecutive nodes usually have ancestors in
+ * common (siblings, entries of the same list): the path of their common
+ * ancestors is kept from one node to the next and only the remaining steps
+ * are appended.
+ *
+ * With LYPY_PATHS_TEMPLATES, the paths are templates with a %s placeholder
+ * in place of each key and leaf-list value, the values are stored in
+ * out->keys as a NUL separated blob and their number in out->nkeys. With
+ * LYPY_WALK_VALUES, the values of the nodes are collected as well. Returns 0
+ * on success, -1 on allocation error. The results must be released with
+ * lypy_paths_free().
+ */
+int lypy_set_paths(const struct ly_set *set, unsigned int start, unsigned int stop,
+	int flags, struct lypy_paths *out)
+{
+	struct lypy_ancestor *steps = NULL;
+	const struct lyd_node **chain = NULL, *iter;
+	size_t steps_size = 0, chain_size = 0, path_len = 0, path_size = 0;
+	struct lypy_keys keys = {0}, *pkeys = NULL;
+	unsigned int i, depth, same, nsteps = 0;
+	char *path = NULL;
+
+	memset(out, 0, sizeof(*out));
+	if (flags & LYPY_PATHS_TEMPLATES)
+		pkeys = &keys;
+	if (stop > set->number)
+		stop = set->number;
+
+	for (i = start; i < stop; i++) {
+		/* ancestors of the node, from the top-level one to the node itself */
+		depth = 0;
+		for (iter = set->set.d[i]; iter; iter = iter->parent)
+			depth++;
+		if (lypy_grow(&chain, &chain_size, depth, sizeof(*chain)) < 0 ||
+				lypy_grow(&steps, &steps_size, depth, sizeof(*steps)) < 0)
+			goto error;
+		iter = set->set.d[i];
+		for (same = depth; same > 0; same--) {
+			chain[same - 1] = iter;
+			iter = iter->parent;
+		}
+
+		/* keep the steps in common with the previous path */
+		for (same = 0; same < depth && same < nsteps; same++) {
+			if (steps[same].node != chain[same])
+				break;
+		}
+		if (same == depth)
+			/* the same node twice, rebuild its last step */
+			same--;
+		path_len = same ? steps[same - 1].len : 0;
+		keys.len = same ? steps[same - 1].keys_len : 0;
+		keys.count = same ? steps[same - 1].nkeys : 0;
+
+		for (nsteps = same; nsteps < depth; nsteps++) {
+			if (lypy_path_step(&path, &path_len, &path_size, pkeys, chain[nsteps]) < 0)
+				goto error;
+			steps[nsteps].node = chain[nsteps];
+			steps[nsteps].len = path_len;
+			steps[nsteps].keys_len = keys.len;
+			steps[nsteps].nkeys = keys.count;
+		}
+		if (lypy_paths_add(out, set->set.d[i], path, pkeys, flags) < 0)
+			goto error;
+	}
+
+	free(path);
+	free(keys.buf);
+	free(chain);
+	free(steps);
+	return 0;
+
+error:
+	free(path);
+	free(keys.buf);
+	free(chain);
+	free(steps);
+	lypy_paths_free(out);
+	return -1;
+}
+
+/*
+ * Return a copy of the nodes matching path, with their parents, all merged
+ * in a single tree the caller must free with lyd_free_withsiblings(). NULL
+ * when nothing matches.
+ *
+ * Only the matching subtrees and their ancestors (with the keys of the list
+ * entries) are copied, each ancestor once: the copies of the ancestors are
+ * kept in a map to attach the next matches to them, so that the cost does
+ * not depend on the size of the rest of the tree. Matches below another
+ * match are already part of its copy and skipped.
+ */
+static struct ly_set *lypy_find_path(const struct lyd_node *root, const char *path);
+
+struct lyd_node *lypy_dup_matches(const struct lyd_node *root, const char *path)
+{
+	struct lyd_node *result = NULL, *dup, *child, **copies = NULL;
+	struct lypy_map matched = {0}, copied = {0};
+	const struct lyd_node *node, *iter;
+	size_t ncopies = 0, copies_size = 0;
+	struct ly_set *set;
+	unsigned int i;
+	uint32_t idx;
+
+	set = lypy_find_path(root, path);
+	if (!set)
+		return NULL;
+	for (i = 0; i < set->number; i++) {
+		if (lypy_map_put(&matched, set->set.d[i], i) < 0)
+			goto error;
+	}
+
+	for (i = 0; i < set->number; i++) {
+		node = set->set.d[i];
+		for (iter = node->parent; iter; iter = iter->parent) {
+			if (lypy_map_get(&matched, iter, &idx))
+				break;
+		}
+		if (iter)
+			continue;
+
+		child = NULL;
+		if ((node->schema->nodetype != LYS_LEAF) ||
+				!lys_is_key((const struct lys_node_leaf *)node->schema, NULL)) {
+			child = lyd_dup(node, LYD_DUP_OPT_RECURSIVE);
+			if (!child)
+				goto error;
+		}
+		/* keys are copied with their list entry, start from there */
+		else {
+			node = node->parent;
+		}
+
+		/* copy the missing ancestors up to an already copied one */
+		for (iter = child ? node->parent : node; iter; iter = iter->parent) {
+			if (lypy_map_get(&copied, iter, &idx)) {
+				if (child && lyd_insert(copies[idx], child))
+					goto error_child;
+				child = NULL;
+				break;
+			}
+			dup = lyd_dup(iter, LYD_DUP_OPT_WITH_KEYS);
+			if (!dup)
+				goto error_child;
+			if (child && lyd_insert(dup, child)) {
+				lyd_free(dup);
+				goto error_child;
+			}
+			child = dup;
+			if (lypy_grow(&copies, &copies_size, ncopies + 1, sizeof(*copies)) < 0 ||
+					lypy_map_put(&copied, iter, ncopies) < 0)
+				goto error_child;
+			copies[ncopies++] = dup;
+		}
+		if (!child)
+			continue;
+
+		/* new top-level node */
+		if (!result)
+			result = child;
+		else if (lyd_insert_sibling(&result, child))
+			goto error_child;
+	}
+
+	lypy_map_free(&matched);
+	lypy_map_free(&copied);
+	free(copies);
+	ly_set_free(set);
+	return result;
+
+error_child:
+	lyd_free(child);
+error:
+	lypy_map_free(&matched);
+	lypy_map_free(&copied);
+	free(copies);
+	ly_set_free(set);
+	lyd_free_withsiblings(result);
+	return NULL;
+}
+
+/* implemented in python, see libyang.util.StreamWriter */
+static int lypy_write_cb(void *, const char *, size_t);
+
+/* buffer of lypy_print_clb() and lypy_print_fd() */
+struct lypy_writer {
+	void *handle;
+	int fd;
+	char *buf;
+	size_t len, size;
+	int error;
+};
+
+static int lypy_writer_output(struct lypy_writer *w, const char *buf, size_t count)
+{
+	ssize_t n;
+
+	if (w->handle)
+		return lypy_write_cb(w->handle, buf, count);
+	while (count) {
+		n = write(w->fd, buf, count);
+		if (n < 0) {
+			if (errno == EINTR)
+				continue;
+			return -1;
+		}
+		buf += n;
+		count -= n;
+	}
+	return 0;
+}
+
+static int lypy_writer_flush(struct lypy_writer *w)
+{
+	if (w->len && !w->error && lypy_writer_output(w, w->buf, w->len) < 0)
+		w->error = 1;
+	w->len = 0;
+	return w->error ? -1 : 0;
+}
+
+static ssize_t lypy_writer_write(void *arg, const void *buf, size_t count)
+{
+	struct lypy_writer *w = arg;
+
+	if (w->error)
+		return -1;
+	if (w->len + count > w->size) {
+		if (lypy_writer_flush(w) < 0)
+			return -1;
+		if (count >= w->size) {
+			/* too large to be buffered, pass it through */
+			if (lypy_writer_output(w, buf, count) < 0) {
+				w->error = 1;
+				return -1;
+			}
+			return count;
+		}
+	}
+	memcpy(w->buf + w->len, buf, count);
+	w->len += count;
+	return count;
+}
+
+static int lypy_print_buffered(struct lypy_writer *w, const struct lyd_node *root,
+	LYD_FORMAT format, int options, size_t chunk_size)
+{
+	int ret;
+
+	w->size = chunk_size ? chunk_size : 1;
+	w->buf = malloc(w->size);
+	if (!w->buf)
+		return -1;
+	ret = lyd_print_clb(lypy_writer_write, w, root, format, options);
+	if (lypy_writer_flush(w) < 0)
+		ret = -1;
+	free(w->buf);
+	return ret;
+}
+
+/*
+ * Print root with lyd_print_clb() and hand the output to the python object
+ * behind handle in chunks of chunk_size bytes, instead of calling back into
+ * python for each of the many small writes of the libyang printers. Returns
+ * 0 on success, -1 if the python side failed, a libyang error otherwise.
+ */
+int lypy_print_clb(void *handle, const struct lyd_node *root, LYD_FORMAT format,
+	int options, size_t chunk_size)
+{
+	struct lypy_writer w = {0};
+
+	w.handle = handle;
+	return lypy_print_buffered(&w, root, format, options, chunk_size);
+}
+
+/*
+ * Same as lyd_print_fd() but with the output written to fd in chunks of
+ * chunk_size bytes, lyd_print_fd() makes a write() call for each of the
+ * small writes of the printers. Returns 0 on success, -1 if write() failed
+ * (see errno), a libyang error otherwise.
+ */
+int lypy_print_fd(int fd, const struct lyd_node *root, LYD_FORMAT format,
+	int options, size_t chunk_size)
+{
+	struct lypy_writer w = {0};
+
+	w.fd = fd;
+	return lypy_print_buffered(&w, root, format, options, chunk_size);
+}
+
+int lypy_count_path(const struct lyd_node *root, const char *path)
+{
+	struct ly_set *set;
+	int count;
+
+	set = lyd_find_path(root, path);
+	if (!set)
+		return -1;
+	count = set->number;
+	ly_set_free(set);
+	return count;
+}
+
+#define LYPY_MAX_DEPTH 32
+#define LYPY_MAX_PREDS 8
+
+struct lypy_pred {
+	const char *name;
+	size_t name_len;
+	const char *value;
+	size_t value_len;
+};
+
+struct lypy_step {
+	const char *module;
+	size_t module_len;
+	const char *name;
+	size_t name_len;
+	struct lypy_pred preds[LYPY_MAX_PREDS];
+	int npreds;
+};
+
+static int lypy_is_name_char(char c)
+{
+	return (c >= 'a' && c <= 'z') || (c >= 'A' && c <= 'Z') ||
+		(c >= '0' && c <= '9') || c == '-' || c == '_' || c == '.';
+}
+
+static int lypy_streq(const char *str, const char *s, size_t len)
+{
+	return str && !strncmp(str, s, len) && str[len] == '\0';
+}
+
+/*
+ * Split an absolute path made only of [prefix:]name steps with
+ * [name='value'] or [.='value'] predicates. Returns the number of steps or
+ * -1 if the path uses anything else (wildcards, functions, axes, ...).
+ */
+static int lypy_parse_path(const char *p, struct lypy_step *steps)
+{
+	struct lypy_step *step;
+	struct lypy_pred *pred;
+	const char *start;
+	char quote;
+	int n = 0;
+
+	while (*p) {
+		if (*p != '/' || n == LYPY_MAX_DEPTH)
+			return -1;
+		step = &steps[n++];
+		step->module = NULL;
+		step->npreds = 0;
+		start = ++p;
+		for (; *p && *p != '/' && *p != '['; p++) {
+			if (*p == ':' && !step->module) {
+				step->module = start;
+				step->module_len = p - start;
+				start = p + 1;
+			} else if (!lypy_is_name_char(*p)) {
+				return -1;
+			}
+		}
+		step->name = start;
+		step->name_len = p - start;
+		if (!step->name_len || (step->module && !step->module_len) || *start == '.')
+			return -1;
+
+		while (*p == '[') {
+			if (step->npreds == LYPY_MAX_PREDS)
+				return -1;
+			pred = &step->preds[step->npreds++];
+			for (p++; *p == ' '; p++);
+			pred->name = p;
+			for (; lypy_is_name_char(*p) || *p == ':'; p++);
+			pred->name_len = p - pred->name;
+			for (; *p == ' '; p++);
+			if (!pred->name_len || *p != '=')
+				return -1;
+			for (p++; *p == ' '; p++);
+			if (*p != '\'' && *p != '"')
+				return -1;
+			quote = *p++;
+			pred->value = p;
+			for (; *p && *p != quote; p++);
+			if (!*p)
+				return -1;
+			pred->value_len = p - pred->value;
+			for (p++; *p == ' '; p++);
+			if (*p != ']')
+				return -1;
+			p++;
+		}
+	}
+
+	/* the first step must say which module it belongs to */
+	if (!n || !steps[0].module)
+		return -1;
+	return n;
+}
+
+/* The type of a leaf or leaf-list, leafrefs resolved to their target. */
+static const struct lys_type *lypy_leaf_type(const struct lys_node *schema)
+{
+	const struct lys_type *type;
+
+	if (schema->nodetype == LYS_LEAF)
+		type = &((const struct lys_node_leaf *)schema)->type;
+	else
+		type = &((const struct lys_node_leaflist *)schema)->type;
+	while (type->base == LY_TYPE_LEAFREF && type->info.lref.target)
+		type = &type->info.lref.target->type;
+	return type;
+}
+
+/* Parse a [+-]digits integer of at most 20 digits, nothing else. */
+static int lypy_parse_int(const char *value, size_t len, int *negative, uint64_t *num)
+{
+	size_t i = 0;
+
+	*negative = 0;
+	if (len && (value[0] == '+' || value[0] == '-')) {
+		*negative = value[0] == '-';
+		i++;
+	}
+	if (i == len || len - i > 20)
+		return -1;
+	*num = 0;
+	for (; i < len; i++) {
+		if (value[i] < '0' || value[i] > '9')
+			return -1;
+		if (*num > (UINT64_MAX - (value[i] - '0')) / 10)
+			return -1;
+		*num = *num * 10 + (value[i] - '0');
+	}
+	return 0;
+}
+
+/*
+ * Compare the value of a leaf with the value of a predicate the way libyang
+ * does: strings, enumerations and booleans have a single lexical form,
+ * integers are compared by value (leading zeros, + sign). Returns 1 if they
+ * are equal, 0 if not and LYPY_UNDECIDED for the other types and for
+ * integers written in any other way (whitespace...), the path must then be
+ * given to libyang.
+ */
+#define LYPY_UNDECIDED -2
+
+static int lypy_value_eq(const struct lyd_node *node, const char *value, size_t len)
+{
+	const char *str = ((const struct lyd_node_leaf_list *)node)->value_str;
+	uint64_t a, b;
+	int neg_a, neg_b;
+
+	switch (lypy_leaf_type(node->schema)->base) {
+	case LY_TYPE_STRING:
+	case LY_TYPE_ENUM:
+	case LY_TYPE_BOOL:
+		return lypy_streq(str, value, len);
+	case LY_TYPE_INT8:
+	case LY_TYPE_INT16:
+	case LY_TYPE_INT32:
+	case LY_TYPE_INT64:
+	case LY_TYPE_UINT8:
+	case LY_TYPE_UINT16:
+	case LY_TYPE_UINT32:
+	case LY_TYPE_UINT64:
+		if (!str || lypy_parse_int(str, strlen(str), &neg_a, &a) < 0 ||
+				lypy_parse_int(value, len, &neg_b, &b) < 0)
+			return LYPY_UNDECIDED;
+		if (a == 0 && b == 0)
+			return neg_b ? LYPY_UNDECIDED : 1;
+		return a == b && neg_a == neg_b;
+	default:
+		return LYPY_UNDECIDED;
+	}
+}
+
+static int lypy_match_pred(const struct lyd_node *node, const struct lypy_pred *pred)
+{
+	const struct lyd_node *child;
+	const char *name = pred->name;
+	size_t len = pred->name_len;
+	const char *sep = memchr(name, ':', len);
+	int ret;
+
+	if (sep) {
+		len -= sep + 1 - name;
+		name = sep + 1;
+	}
+	if (len == 1 && *name == '.') {
+		if (!(node->schema->nodetype & (LYS_LEAF | LYS_LEAFLIST)))
+			return 0;
+		return lypy_value_eq(node, pred->value, pred->value_len);
+	}
+	if (node->schema->nodetype & (LYS_LEAF | LYS_LEAFLIST | LYS_ANYDATA))
+		return 0;
+	LY_TREE_FOR(node->child, child) {
+		if (!(child->schema->nodetype & (LYS_LEAF | LYS_LEAFLIST)))
+			continue;
+		if (!lypy_streq(child->schema->name, name, len))
+			continue;
+		ret = lypy_value_eq(child, pred->value, pred->value_len);
+		if (ret)
+			return ret;
+	}
+	return 0;
+}
+
+/*
+ * Look for the nodes matching the n steps of a simple path among siblings.
+ * Returns 1 at the first match when set is NULL, otherwise all the matches
+ * are added to set and 0 is returned (-1 on allocation error,
+ * LYPY_UNDECIDED when a predicate cannot be compared here).
+ */
+static int lypy_find_first(const struct lyd_node *siblings,
+	const struct lypy_step *step, int n, const char *module, size_t module_len,
+	struct ly_set *set)
+{
+	const struct lyd_node *node;
+	int i, ret;
+
+	if (step->module) {
+		module = step->module;
+		module_len = step->module_len;
+	}
+	LY_TREE_FOR(siblings, node) {
+		if (!lypy_streq(node->schema->name, step->name, step->name_len) ||
+				!lypy_streq(lys_node_module(node->schema)->name, module, module_len))
+			continue;
+		for (i = 0; i < step->npreds; i++) {
+			ret = lypy_match_pred(node, &step->preds[i]);
+			if (ret < 0)
+				return ret;
+			if (!ret)
+				break;
+		}
+		if (i < step->npreds)
+			continue;
+		if (n == 1) {
+			if (!set)
+				return 1;
+			if (ly_set_add(set, (void *)node, LY_SET_OPT_USEASLIST) < 0)
+				return -1;
+			continue;
+		}
+		if (node->schema->nodetype & (LYS_LEAF | LYS_LEAFLIST | LYS_ANYDATA))
+			continue;
+		ret = lypy_find_first(node->child, step + 1, n - 1, module, module_len, set);
+		if (ret)
+			return ret;
+	}
+	return 0;
+}
+
+/*
+ * Same as lyd_find_path() but simple paths (see lypy_parse_path()) are
+ * walked directly instead of going through the xpath engine.
+ */
+static struct ly_set *lypy_find_path(const struct lyd_node *root, const char *path)
+{
+	struct lypy_step steps[LYPY_MAX_DEPTH];
+	struct ly_set *set;
+	int n, ret;
+
+	n = lypy_parse_path(path, steps);
+	if (n < 0)
+		return lyd_find_path(root, path);
+	set = ly_set_new();
+	if (!set)
+		return NULL;
+	while (root->prev->next)
+		root = root->prev;
+	ret = lypy_find_first(root, steps, n, NULL, 0, set);
+	if (ret < 0) {
+		ly_set_free(set);
+		return ret == LYPY_UNDECIDED ? lyd_find_path(root, path) : NULL;
+	}
+	return set;
+}
+
+/*
+ * Return 1 if at least one node matches path, 0 if none. Simple paths are
+ * walked directly, stopping at the first match without allocating anything,
+ * others go through lyd_find_path(). Returns -1 if the path is invalid.
+ */
+int lypy_exists(const struct lyd_node *root, const char *path)
+{
+	struct lypy_step steps[LYPY_MAX_DEPTH];
+	int n, count;
+
+	n = lypy_parse_path(path, steps);
+	if (n >= 0) {
+		/* walk from the first top-level sibling */
+		while (root->prev->next)
+			root = root->prev;
+		n = lypy_find_first(root, steps, n, NULL, 0, NULL);
+		if (n != LYPY_UNDECIDED)
+			return n;
+	}
+	count = lypy_count_path(root, path);
+	return count > 0 ? 1 : count;
+}
+
 int validate_data_tree(struct lyd_node *node, struct ly_ctx *ctx){
 	struct lyd_node *ptr = node;
 	int response = 0;
@@ -139,7 +2087,7 @@ int validate_data_tree(struct lyd_node *node, struct ly_ctx *ctx){
 int lypy_process_attributes(struct lyd_node *root, struct ly_ctx *ctx, struct lyd_node *template_root)
 {
 	struct lyd_node *elem, *next;
-	struct lyd_attr *node_attr;
+	struct lyd_attr *node_attr, *next_attr;
 	struct ly_set *nodes_to_remove_from_root = ly_set_new();
 	struct ly_set *nodes_to_remove_from_template = ly_set_new();
 	char *node_xpath;
@@ -147,7 +2095,8 @@ int lypy_process_attributes(struct lyd_node *root, struct ly_ctx *ctx, struct ly
 
 	LY_TREE_DFS_BEGIN(template_root, next, elem)
 	{
-		for (node_attr = elem->attr; node_attr; node_attr = node_attr->next) {
+		for (node_attr = elem->attr; node_attr; node_attr = next_attr) {
+			next_attr = node_attr->next;
 			if(strcmp(node_attr->name, "operation") == 0) {
 				if(strcmp(node_attr->value_str, "remove") == 0) {
 					node_xpath = lyd_path(elem);
@@ -157,7 +2106,7 @@ int lypy_process_attributes(struct lyd_node *root, struct ly_ctx *ctx, struct ly
 					if ((elem->schema->nodetype == LYS_LIST) || (elem->schema->nodetype == LYS_LEAFLIST)) {
 						const char *list_name = elem->schema->name;
 						const char *list_parent_xpath = lyd_path(elem->parent);
-						list_xpath = (char *) malloc(1 + strlen(list_parent_xpath) + strlen(list_name));
+						list_xpath = (char *) malloc(3 + strlen(list_parent_xpath) + strlen(list_name));
 						sprintf(list_xpath, "/%s/%s", list_parent_xpath, list_name);
 						node_xpath = list_xpath;
 					} else
@@ -165,7 +2114,7 @@ int lypy_process_attributes(struct lyd_node *root, struct ly_ctx *ctx, struct ly
 						node_xpath = lyd_path(elem);
 					}
 					ly_set_merge(nodes_to_remove_from_root, lyd_find_path(root, node_xpath), 0);
-					if(list_xpath != NULL) { free(list_xpath); };
+					if(list_xpath != NULL) { free(list_xpath); list_xpath = NULL; };
 					lyd_free_attr(ctx, elem, node_attr, 0);
 				}
 			}
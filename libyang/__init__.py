@@ -1,29 +1,58 @@
 # Copyright (c) 2018-2019 Robin Jarry
 # SPDX-License-Identifier: MIT
 
+import itertools
 import logging
+import operator
 import os
+import struct
 
 from _libyang import ffi
 from _libyang import lib
 
+from .codec import decode_column
+from .codec import decode_values
+from .codec import encode_c
+from .codec import leaf_encoder
+from .data import DUMP_NODETYPES
 from .data import DataNode
+from .data import NodeSetIterator
+from .data import in_choice
+from .data import lyd2dict
+from .data import print_mem
+from .data import set_paths
+from .data import walk_paths
+from .schema import Container
+from .schema import Leaf
+from .schema import List
 from .schema import Module
 from .schema import Node
+from .schema import iter_children
+from .util import BatchError
 from .util import LibyangError
+from .util import LRUCache
+from .util import StreamWriter
+from .util import buf2c
 from .util import c2str
 from .util import str2c
+from .util import take_errors
+from .xpath import XPath
+from .xpath import xpath2c
+from .xpath import xpath2str
 
 
 # ------------------------------------------------------------------------------
 class Context(object):
 
     def __init__(self, search_path=None,
-                 options=lib.LY_CTX_DISABLE_SEARCHDIR_CWD):
+                 options=lib.LY_CTX_DISABLE_SEARCHDIR_CWD,
+                 xpath_cache_size=1024):
         self._ctx = ffi.gc(lib.ly_ctx_new(ffi.NULL, options),
                            lambda c: lib.ly_ctx_destroy(c, ffi.NULL))
         if not self._ctx:
             raise self.error('cannot create context')
+        self._xpath_cache = LRUCache(xpath_cache_size)
+        self._encoders = {}
 
         search_dirs = []
         if 'YANGPATH' in os.environ:
@@ -88,6 +117,26 @@ class Context(object):
         for i in range(node_set.number):
             yield Node.new(self, node_set.set.s[i])
 
+    def compile_xpath(self, path):
+        """
+        Return a reusable XPath handle for a data path. It can be passed to all
+        DataTree methods in place of the path string. Handles are kept in a per
+        context LRU cache, see xpath_cache_stats().
+        """
+        if isinstance(path, XPath):
+            return path
+        xpath = self._xpath_cache.get(path)
+        if xpath is None:
+            xpath = XPath(self, path)
+            self._xpath_cache.put(path, xpath)
+        return xpath
+
+    def xpath_cache_stats(self):
+        """
+        Return a dict with the hits/misses/size of the compiled xpath cache.
+        """
+        return self._xpath_cache.stats()
+
     def __iter__(self):
         """
         Return an iterator that yields all implemented modules from the context
@@ -109,12 +158,32 @@ class DataTree:
 
     As elements of data are set they will be validated against the schema of
     that particular node.
+
+    With index=True, a dict mapping the data path of every node (as returned
+    by lyd_path, e.g. "/mod:cont/list[key='k']/leaf") to the node is kept so
+    that lookups of exact paths do not go through the libyang xpath engine.
+    It is built on the first lookup, updated by set_xpath() and delete_xpath()
+    and rebuilt after other changes (loads, merges...). Any path which is not
+    in the index is looked up with the xpath engine as usual.
+
+    The generation attribute is incremented by every change made to the tree.
+    With query_cache=N, the results of the last N get_xpath(), gets_xpath(),
+    get_paths(), count_xpath(), exists() and get_values() calls are kept and
+    returned again for the same arguments until the next change. The values
+    of DataNode objects are shared between the callers of a cached query.
     """
 
-    def __init__(self, ctx):
+    # cached results can legitimately be None
+    _MISSING = object()
+
+    def __init__(self, ctx, index=False, query_cache=0):
         self._ctx = ctx
         self._lyctx = ctx._ctx
         self._root = None
+        self._indexed = index
+        self._index = None
+        self.generation = 0
+        self._query_cache = LRUCache(query_cache) if query_cache else None
 
     def set_xpath(self, xpath, value):
         """
@@ -124,61 +193,573 @@ class DataTree:
         will return NULL.
         """
 
-        libyang_value = DataNode.convert_python_value(value)
+        libyang_value = self._encode_value(xpath, value)
+        self._changed(index=False)
 
         if self._root is None:
-            node = lib.lyd_new_path(ffi.NULL, self._lyctx , str2c(xpath), libyang_value, 0, lib.LYD_PATH_OPT_UPDATE)
+            node = lib.lyd_new_path(ffi.NULL, self._lyctx , xpath2c(xpath), libyang_value, 0, lib.LYD_PATH_OPT_UPDATE)
             if not node:
                 raise LibyangError('The value {0} was not set at {1}\nCheck the path and value'.format(value, xpath))
             self._root = node
         else:
-            node = lib.lyd_new_path(self._root, ffi.NULL, str2c(xpath), libyang_value, 0, lib.LYD_PATH_OPT_UPDATE)
+            node = lib.lyd_new_path(self._root, ffi.NULL, xpath2c(xpath), libyang_value, 0, lib.LYD_PATH_OPT_UPDATE)
 
         if not node:
-            node_set = lib.lyd_find_path(self._root, str2c(xpath))
+            node_set = lib.lyd_find_path(self._root, xpath2c(xpath))
             if node_set.number == 0:
                 raise LibyangError('The value {0} was not set at {1}\nCheck the path and value'.format(value, xpath))
+        else:
+            self._added(node)
+
+    def _encode_value(self, xpath, value):
+        """
+        Compiled paths know the type of their leaf and get the value encoded
+        accordingly, plain strings are handled regardless of the schema.
+        """
+        if isinstance(xpath, XPath):
+            return encode_c(xpath.encoder(), value)
+        return DataNode.convert_python_value(value)
+
+    def set_many(self, items):
+        """
+        Set several values by XPATH - items is an iterable of (xpath, value)
+        tuples which are all applied in a single call down to libyang.
+
+        Items which could not be set do not stop the others from being applied,
+        they are all reported together in one BatchError at the end.
+        """
+        items = list(items)
+        if not items:
+            return
+
+        # the char[] buffers must outlive the call, keep a reference on them
+        xpaths = [xpath2c(xpath) for xpath, _ in items]
+        values = [self._encode_value(xpath, value) for xpath, value in items]
+        failed = ffi.new('int []', len(items))
+        errors = ffi.new('char *[]', len(items))
+        root = ffi.new('struct lyd_node **', self._root or ffi.NULL)
+
+        self._changed()
+        nfailed = lib.lypy_set_many(root, self._lyctx, ffi.new('char *[]', xpaths),
+                                    ffi.new('char *[]', values), len(items), failed, errors)
+        if root[0] != ffi.NULL:
+            self._root = root[0]
+
+        if nfailed:
+            taken = take_errors(failed, errors, len(items))
+            lines = ['The value {0} was not set at {1}: {2}'.format(items[i][1], xpath2str(items[i][0]), msg)
+                     for i, msg in taken]
+            raise BatchError('\n'.join(lines) + '\nCheck the paths and values',
+                             [(i, xpath2str(items[i][0]), msg) for i, msg in taken])
+
+    def delete_many(self, xpaths):
+        """
+        Delete the values at several XPATHs in a single call down to libyang.
+
+        Invalid XPATHs do not stop the others from being deleted, they are all
+        reported together in one BatchError at the end.
+        """
+        xpaths = list(xpaths)
+        if self._root is None or not xpaths:
+            return
+
+        paths = [xpath2c(xpath) for xpath in xpaths]
+        failed = ffi.new('int []', len(xpaths))
+        errors = ffi.new('char *[]', len(xpaths))
+        root = ffi.new('struct lyd_node **', self._root)
+
+        self._changed()
+        nfailed = lib.lypy_delete_many(root, self._lyctx, ffi.new('char *[]', paths),
+                                       len(xpaths), failed, errors)
+        self._root = root[0] if root[0] != ffi.NULL else None
+
+        if nfailed:
+            taken = [(i, xpath2str(xpaths[i]), msg) for i, msg in take_errors(failed, errors, len(xpaths))]
+            raise BatchError('Unable to delete xpath: %s' % ', '.join('%s (%s)' % (x, m) for _, x, m in taken),
+                             taken)
+
+    def insert_list(self, list_path, columns):
+        """
+        Create (or update) list entries from columns of values - columns is a
+        dict mapping the name of each leaf of the list to a sequence of values
+        (list, tuple, array.array, numpy array...) with one value per entry.
+
+        All the list keys must be given, a None value in any other column
+        leaves that leaf untouched for that entry. The entries are all created
+        in a single call down to libyang, without an xpath per leaf, rows which
+        could not be set are reported together in one LibyangError at the end.
+        """
+        snode = self._list_schema(list_path)
+        keys = [key.name() for key in snode.keys()]
+        leaves = dict((leaf.name(), leaf) for leaf in snode.children(types=(Node.LEAF,)))
+
+        names = keys + sorted(name for name in columns if name not in keys)
+        for name in names:
+            if name not in columns:
+                raise LibyangError('missing key %s for list %s' % (name, list_path))
+            if name not in leaves:
+                raise LibyangError('%s is not a leaf of list %s' % (name, list_path))
+
+        values = []
+        for name in names:
+            column = columns[name]
+            if hasattr(column, 'tolist'):
+                column = column.tolist()
+            values.append(list(column))
+        nrows = len(values[0]) if values else 0
+        if any(len(column) != nrows for column in values):
+            raise LibyangError('all columns must have the same length')
+        if not nrows:
+            return
+
+        # the char[] buffers must outlive the call, keep a reference on them
+        blobs = []
+        missing = []
+        for name, column in zip(names, values):
+            mask = bytearray(1 if value is None else 0 for value in column)
+            if any(mask):
+                if name in keys:
+                    raise LibyangError('missing value for key %s of list %s' % (name, list_path))
+                missing.append(ffi.new('char []', bytes(mask)))
+            else:
+                missing.append(ffi.NULL)
+            encoder = leaf_encoder(leaves[name]._node, self._ctx._encoders)
+            blobs.append(ffi.new('char []', b'\0'.join(encoder(value) or b'' for value in column)))
+
+        parent = self._list_parent(list_path, snode)
+        schemas = [leaves[name]._node for name in names]
+        failed = ffi.new('int []', nrows)
+        root = ffi.new('struct lyd_node **', self._root or ffi.NULL)
+
+        self._changed()
+        nfailed = lib.lypy_insert_list(root, parent, snode._node,
+                                       ffi.new('struct lys_node *[]', schemas), len(names),
+                                       ffi.new('char *[]', blobs), ffi.new('char *[]', missing),
+                                       nrows, failed)
+        if root[0] != ffi.NULL:
+            self._root = root[0]
+
+        if nfailed < 0:
+            raise LibyangError('Unable to insert entries in list %s' % list_path)
+        if nfailed:
+            errors = ['The entry %s was not set in %s' %
+                      (dict((k, values[i][row]) for i, k in enumerate(keys)), list_path)
+                      for row in range(nrows) if failed[row]]
+            raise LibyangError('\n'.join(errors) + '\nCheck the keys and values')
+
+    def list_to_columns(self, list_path, leaves=None):
+        """
+        Export leaves of all the entries of a list as columns - the opposite of
+        DataTree.insert_list(). Returns a dict mapping the name of each leaf to
+        a sequence with one value per entry, see codec.decode_column().
+
+        leaves are names relative to the list entries and may go through child
+        containers ('mtu', 'counters/in-octets'), they default to all the
+        leaves of the list. The entries of all the lists matching list_path are
+        exported, in data order, in a single traversal down in libyang.
+        """
+        snode = self._list_schema(list_path)
+        if leaves is None:
+            leaves = [leaf.name() for leaf in snode.children(types=(Node.LEAF,))]
+        schemas = [self._list_leaf_schema(snode, name, list_path) for name in leaves]
+
+        if lib.lys_parent(snode._node) == ffi.NULL:
+            parent_path = ffi.NULL
+        else:
+            parent_path = str2c(xpath2str(list_path).rsplit('/', 1)[0])
+        columns = ffi.new('struct lypy_column []', len(schemas))
+        for column, leaf in zip(columns, schemas):
+            column.schema = leaf._node
+
+        count = lib.lypy_list_columns(self._root or ffi.NULL, parent_path, snode._node,
+                                      columns, len(schemas))
+        if count < 0:
+            raise LibyangError('Unable to export list %s' % list_path)
+        try:
+            return dict((name, decode_column(column, count)) for name, column in zip(leaves, columns))
+        finally:
+            lib.lypy_columns_free(columns, len(schemas))
+
+    def _list_leaf_schema(self, snode, name, list_path):
+        node = snode
+        for step in name.split('/'):
+            if node is not snode and not isinstance(node, Container):
+                node = None
+                break
+            node = next((child for child in node.children() if child.name() == step), None)
+            if node is None:
+                break
+        if not isinstance(node, Leaf):
+            raise LibyangError('%s is not a leaf of list %s' % (name, list_path))
+        return node
+
+    def _list_schema(self, list_path):
+        if not isinstance(list_path, XPath):
+            list_path = self._ctx.compile_xpath(list_path)
+        snode = list_path.schema()
+        if not isinstance(snode, List):
+            raise LibyangError('%s is not a list' % list_path)
+        return snode
+
+    def _list_parent(self, list_path, snode):
+        """
+        Return the data node the list entries are to be created under, creating
+        it if needed - or ffi.NULL for a top-level list.
+        """
+        if lib.lys_parent(snode._node) == ffi.NULL:
+            return ffi.NULL
+
+        parent_path = str2c(xpath2str(list_path).rsplit('/', 1)[0])
+        if self._root is None:
+            self._root = lib.lyd_new_path(ffi.NULL, self._lyctx, parent_path, ffi.NULL, 0, 0)
+            if not self._root:
+                self._root = None
+                raise LibyangError('Unable to create the parent of list %s' % list_path)
+        else:
+            lib.lyd_new_path(self._root, ffi.NULL, parent_path, ffi.NULL, 0, lib.LYD_PATH_OPT_UPDATE)
+
+        node_set = ffi.gc(lib.lyd_find_path(self._root, parent_path), lib.ly_set_free)
+        if not node_set or node_set.number != 1:
+            raise LibyangError('Unable to create the parent of list %s' % list_path)
+        return node_set.set.d[0]
+
+    @classmethod
+    def from_dict(cls, ctx, obj):
+        """
+        Build a new DataTree from nested python dicts, laid out like the JSON
+        encoding of the data - top-level keys are prefixed with the module name,
+        lists are lists of dicts and leaf-lists are lists of values.
+        """
+        tree = cls(ctx)
+        root = tree._dict2tree(obj)
+        if root != ffi.NULL:
+            tree._root = root
+        return tree
+
+    def update_from_dict(self, obj):
+        """
+        Merge nested python dicts (see from_dict()) into the existing data.
+        """
+        root = self._dict2tree(obj)
+        if root == ffi.NULL:
+            return
+        self._changed()
+        if self._root is None:
+            self._root = root
+            return
+        if lib.lyd_merge(self._root, root, lib.LYD_OPT_EXPLICIT | lib.LYD_OPT_DESTRUCT) != 0:
+            lib.lyd_free_withsiblings(root)
+            raise self._ctx.error('Merge Error')
+
+    def _dict2tree(self, obj):
+        """
+        Create the nodes described by obj next to their schema nodes, without
+        going through any path. Returns the first top-level node (or ffi.NULL)
+        which the caller owns.
+        """
+        root = ffi.new('struct lyd_node **', ffi.NULL)
+        plans = {}
+        try:
+            for key, value in obj.items():
+                module_name, _, name = key.rpartition(':')
+                module = lib.ly_ctx_get_module(self._lyctx, str2c(module_name), ffi.NULL, 1)
+                if not module:
+                    raise LibyangError('%s: unknown module %r' % (key, module_name))
+                snode = self._schema_plan(module, plans)[4].get((module_name, name))
+                if snode is None:
+                    raise LibyangError('%s: no such node in module %s' % (key, module_name))
+                for node in self._dict2nodes(ffi.NULL, snode, value, plans):
+                    if root[0] == ffi.NULL:
+                        root[0] = node
+                    else:
+                        lib.lyd_insert_sibling(root, node)
+        except:
+            if root[0] != ffi.NULL:
+                lib.lyd_free_withsiblings(root[0])
+            raise
+        return root[0]
+
+    def _schema_plan(self, snode, plans):
+        """
+        Return (module, name, nodetype, keys, children, encoder) for a lys_node
+        (or a lys_module) - resolved once per _dict2tree() call. Children are
+        indexed by (module name, name), augments may add same-named ones.
+        """
+        plan = plans.get(snode)
+        if plan is None:
+            children = dict(((c.module().name(), c.name()), c._node)
+                            for c in iter_children(self._ctx, snode))
+            if ffi.typeof(snode) == ffi.typeof('struct lys_module *'):
+                plan = (snode, ffi.NULL, 0, (), children, None)
+            else:
+                keys = ()
+                if snode.nodetype == lib.LYS_LIST:
+                    keys = tuple(k.name() for k in List(self._ctx, snode).keys())
+                plan = (lib.lys_node_module(snode), snode.name, snode.nodetype, keys, children,
+                        leaf_encoder(snode, self._ctx._encoders))
+            plans[snode] = plan
+        return plan
+
+    def _dict2nodes(self, parent, snode, value, plans):
+        """
+        Create the data nodes of schema node snode under parent from value.
+        Returns the created nodes, only meaningful for top-level nodes (which
+        are not linked to a parent).
+        """
+        module, name, nodetype, keys, children, encoder = self._schema_plan(snode, plans)
+
+        if nodetype & (lib.LYS_LEAF | lib.LYS_LEAFLIST):
+            nodes = []
+            for v in (value if nodetype == lib.LYS_LEAFLIST else (value,)):
+                c_value = encoder(v)
+                if c_value is None:
+                    c_value = ffi.NULL
+                node = lib.lyd_new_leaf(parent, module, name, c_value)
+                if not node:
+                    raise self._ctx.error('The value %s was not set at %s', v, c2str(name))
+                nodes.append(node)
+            return nodes
+
+        if nodetype == lib.LYS_LIST:
+            if isinstance(value, (dict, bytes, type(u''))) or not hasattr(value, '__iter__'):
+                raise LibyangError('%s: expected a list of entries, got %s'
+                                   % (self._dict_path(parent, module, name), type(value).__name__))
+            entries = value
+        else:
+            entries = (value,)
+        # JSON names are qualified only when the module differs from the parent
+        module_name = c2str(module.name)
+
+        nodes = []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                raise LibyangError('%s: expected a dict, got %s'
+                                   % (self._dict_path(parent, module, name), type(entry).__name__))
+            node = lib.lyd_new(parent, module, name)
+            if not node:
+                raise self._ctx.error('Unable to create %s', c2str(name))
+            if parent == ffi.NULL:
+                nodes.append(node)
+            try:
+                for key in keys:
+                    if key not in entry:
+                        raise LibyangError('missing key %s for list %s' % (key, c2str(name)))
+                    self._dict2nodes(node, children[(module_name, key)], entry[key], plans)
+                for child_name, child_value in entry.items():
+                    child_module, _, child_name = child_name.rpartition(':')
+                    child_module = child_module or module_name
+                    if child_module == module_name and child_name in keys:
+                        continue
+                    schild = children.get((child_module, child_name))
+                    if schild is None:
+                        raise LibyangError('%s: no such node under %s' % (child_name, c2str(name)))
+                    self._dict2nodes(node, schild, child_value, plans)
+            except:
+                if parent == ffi.NULL:
+                    for n in nodes:
+                        lib.lyd_free(n)
+                raise
+        return nodes
+
+    @staticmethod
+    def _dict_path(parent, module, name):
+        """
+        Data path of the node being created, for error messages.
+        """
+        prefix = DataNode._path(parent) if parent != ffi.NULL else ''
+        return '%s/%s:%s' % (prefix, c2str(module.name), c2str(name))
+
+    def _changed(self, index=True):
+        """
+        Start a new generation of the tree: drop the cached query results and
+        the index (unless the caller keeps it up to date, index=False), it is
+        rebuilt on the next lookup.
+        """
+        self.generation += 1
+        if self._query_cache is not None:
+            self._query_cache.clear(stats=False)
+        if index:
+            self._index = None
+
+    def _added(self, lyd_node):
+        """
+        Add the subtree of lyd_node, returned by lyd_new_path(), to the index.
+        Creating a node in a choice case makes libyang free the nodes of the
+        other cases, whose addresses may still be indexed: the whole index is
+        dropped then.
+        """
+        if self._index is None:
+            return
+        paths = list(self._subtree_paths(lyd_node))
+        for _, address in paths:
+            if in_choice(ffi.cast('struct lyd_node *', address).schema):
+                self._index = None
+                return
+        self._index.update(paths)
+
+    def _query(self, func, args, collect=None):
+        """
+        Return func(*args), from the query cache when enabled. The results of
+        generators are collected with collect first. The first argument is
+        the xpath, compiled or not.
+        """
+        if self._query_cache is None:
+            return func(*args)
+        key = (func.__name__, xpath2str(args[0])) + tuple(args[1:])
+        result = self._query_cache.get(key, self._MISSING)
+        if result is self._MISSING:
+            result = func(*args)
+            if collect is not None:
+                result = collect(result)
+            self._query_cache.put(key, result)
+        if isinstance(result, list):
+            # callers may modify the list they get
+            return list(result)
+        return result
+
+    def query_cache_stats(self):
+        """
+        Return a dict with the hits/misses/size of the query cache and the
+        current generation of the tree, None when the cache is disabled.
+        """
+        if self._query_cache is None:
+            return None
+        stats = self._query_cache.stats()
+        stats['generation'] = self.generation
+        return stats
+
+    def _index_lookup(self, xpath):
+        """
+        Return the node at the exact data path xpath from the index, None if
+        it is not there or if the tree is not indexed.
+        """
+        if not self._indexed or self._root is None:
+            return None
+        if self._index is None:
+            self._index = dict(self._subtree_paths(self._root, siblings=True))
+        address = self._index.get(xpath2str(xpath))
+        if address is None:
+            return None
+        return ffi.cast('struct lyd_node *', address)
+
+    def _subtree_paths(self, lyd_node, siblings=False):
+        """
+        Return (path, node address) tuples for all the nodes of the subtree of
+        lyd_node. Addresses are kept as ints which take less memory than
+        cdata pointers.
+        """
+        out, paths = walk_paths(lyd_node, lib.LYPY_WALK_FIRST if siblings else 0)
+        addresses = struct.unpack('%dP' % out.count, ffi.buffer(out.nodes, out.count * ffi.sizeof('void *'))[:])
+        return zip(paths, addresses)
 
     def get_xpath(self, xpath):
         """
         Get the value at XPATH - returns a generator
         """
-        # TODO: work out what happens with a python generator, if the caller just calls next() does gc get as
-        # far as actually calling ly_set_free()????
+        return iter(self._query(self._get_xpath, (xpath,), tuple))
+
+    def _get_xpath(self, xpath):
+        node = self._index_lookup(xpath)
+        if node is not None:
+            yield DataNode(self, node, xpath2str(xpath))
+            return
+
         if self._root is not None:
-            node_set = lib.lyd_find_path(self._root, str2c(xpath))
+            node_set = lib.lyd_find_path(self._root, xpath2c(xpath))
             if node_set == ffi.NULL:
                 yield None
+                return
 
-            for i in range(node_set.number):
-                yield DataNode(self, node_set.set.d[i], xpath)
-            lib.ly_set_free(node_set)
+            # the set is also freed when the generator is closed early
+            try:
+                for i in range(node_set.number):
+                    yield DataNode(self, node_set.set.d[i], xpath2str(xpath))
+            finally:
+                lib.ly_set_free(node_set)
 
     def gets_xpath(self, xpath):
         """
         Get the XPATH of each list element wtithin the list - returns a generator
         """
+        return iter(self._query(self._gets_xpath, (xpath,), tuple))
+
+    def _gets_xpath(self, xpath):
         if self._root is not None:
-            node_set = lib.lyd_find_path(self._root, str2c(xpath))
+            node_set = lib.lyd_find_path(self._root, xpath2c(xpath))
             if node_set == ffi.NULL:
                 yield []
-            else:
-                for i in range(node_set.number):
-                    yield c2str(lib.lyd_path(node_set.set.d[i]))
+                return
+
+            try:
+                paths = set_paths(node_set)
+            finally:
+                lib.ly_set_free(node_set)
+            for path in paths:
+                yield path
+
+    def get_paths(self, xpath, templates=False):
+        """
+        Return the data paths of all the nodes matching XPATH, generated in a
+        single pass. With templates=True, return (template, keys) tuples
+        where the key and leaf-list values are split out of the path, e.g.
+        ("/m:interfaces/interface[name=%s]/mtu", ("eth0",)).
+        """
+        return self._query(self._get_paths, (xpath, templates))
+
+    def _get_paths(self, xpath, templates):
+        if self._root is None:
+            return []
+        node_set = lib.lyd_find_path(self._root, xpath2c(xpath))
+        if node_set == ffi.NULL:
+            return []
+        try:
+            return set_paths(node_set, templates=templates)
+        finally:
             lib.ly_set_free(node_set)
 
+    def iter_xpath(self, xpath, offset=0, limit=None, chunk_size=1024):
+        """
+        Iterate over the nodes matching XPATH, skipping the first offset ones
+        and stopping after limit of them. The returned NodeSetIterator has the
+        total number of matches in its total attribute. It creates the DataNode
+        objects chunk_size at a time and frees the libyang resources once
+        exhausted, closed or garbage collected - use it in a with block to be
+        sure they are released when stopping early.
+
+        The tree must not be modified while iterating, RuntimeError is raised
+        when it was - collect the nodes to delete, or use delete_xpath().
+        """
+        return self._iter_set(xpath, offset, limit, chunk_size,
+                              lambda node: DataNode(self, node))
+
+    def iter_paths(self, xpath, offset=0, limit=None, chunk_size=1024):
+        """
+        Same as iter_xpath() but yields the data path of each node.
+        """
+        return self._iter_set(xpath, offset, limit, chunk_size, set_paths, bulk=True)
+
+    def _iter_set(self, xpath, offset, limit, chunk_size, convert, bulk=False):
+        node_set = ffi.NULL
+        if self._root is not None:
+            node_set = lib.lyd_find_path(self._root, xpath2c(xpath))
+        return NodeSetIterator(node_set, convert, offset, limit, chunk_size, bulk, self)
+
     def delete_xpath(self, xpath):
         """
         Delete the value at XPATH
         """
         if self._root is None:
             return
+        self._changed(index=False)
 
-        node_set = lib.lyd_find_path(self._root, str2c(xpath))
+        node_set = lib.lyd_find_path(self._root, xpath2c(xpath))
         if node_set == ffi.NULL:
             return
 
         for i in range(node_set.number):
+            if self._index is not None:
+                for path, _ in self._subtree_paths(node_set.set.d[i]):
+                    self._index.pop(path, None)
             result = lib.lyd_unlink(node_set.set.d[i])
             if result:
                 raise LibyangError('Unable to delete xpath: %s' %(xpath))
@@ -187,24 +768,124 @@ class DataTree:
         """
         Count results for a given XPATH
         """
+        return self._query(self._count_xpath, (xpath,))
+
+    def _count_xpath(self, xpath):
         if self._root is None:
             return 0
+        if self._index_lookup(xpath) is not None:
+            return 1
 
-        node_set = lib.lyd_find_path(self._root, str2c(xpath))
-        if node_set == ffi.NULL:
-            return 0
-        return int(node_set.number)
+        return max(lib.lypy_count_path(self._root, xpath2c(xpath)), 0)
+
+    def exists(self, xpath):
+        """
+        Return True if at least one node matches XPATH. Absolute paths made
+        only of names and [name='value'] predicates are resolved by walking the
+        tree down to the first match, others through a full XPATH lookup.
+        """
+        return self._query(self._exists, (xpath,))
+
+    def _exists(self, xpath):
+        if self._root is None:
+            return False
+        if self._index_lookup(xpath) is not None:
+            return True
+
+        return lib.lypy_exists(self._root, xpath2c(xpath)) > 0
+
+    def get_values(self, xpath):
+        """
+        Get the python values of all the nodes matching XPATH as a list, see
+        DataNode.value - without creating a DataNode for each of them.
+        """
+        return self._query(self._get_values, (xpath,))
+
+    def _get_values(self, xpath):
+        if self._root is None:
+            return []
+        node = self._index_lookup(xpath)
+        if node is not None:
+            return [DataNode(self, node).value]
+
+        values = ffi.new('struct lypy_value **')
+        count = lib.lypy_get_values(self._root, xpath2c(xpath), values)
+        if count < 0:
+            raise LibyangError('Unable to get values at %s' % xpath)
+        values = ffi.gc(values[0], lib.free)
+        return decode_values(values, count)
+
+    def get_value(self, xpath, default=None):
+        """
+        Get the python value of the first node matching XPATH, or default if
+        there is none.
+        """
+        values = self.get_values(xpath)
+        if not values:
+            return default
+        return values[0]
+
+    def to_dict(self, xpath=None):
+        """
+        Export the data to nested python dicts, laid out like the JSON encoding
+        (see DataTree.from_dict()) without going through JSON. Default nodes
+        added by the validation are omitted like in dumps(). When XPATH is
+        given, only the matching nodes (with their subtree and parents) are
+        exported.
+        """
+        if self._root is None:
+            return {}
+        if xpath is None:
+            return lyd2dict(self._root, siblings=True)
+
+        matches = lib.lypy_dup_matches(self._root, xpath2c(xpath))
+        if not matches:
+            return {}
+        try:
+            return lyd2dict(matches, siblings=True)
+        finally:
+            lib.lyd_free_withsiblings(matches)
 
     def dump(self, filename, format=lib.LYD_XML):
         """
         Dump to a file with the specified format
         """
-        with open(filename, 'w') as fh:
-            lib.lyd_print_file(fh, self._root, format, lib.LYP_WITHSIBLINGS)
+        if lib.lyd_print_path(str2c(filename), self._root, format, lib.LYP_WITHSIBLINGS) != 0:
+            raise self._ctx.error('Unable to dump data to %s', filename)
+
+    def write(self, stream, format=lib.LYD_XML, chunk_size=65536):
+        """
+        Print the tree with the specified format straight to stream, without
+        building the whole document in memory: stream is either a raw file
+        descriptor (int) or a file object, a socket or a callable (see
+        util.StreamWriter). Either way, the output is written in chunks of
+        chunk_size bytes.
+        """
+        if not self._root:
+            raise LibyangError('No data to dump')
+
+        if isinstance(stream, int):
+            ret = lib.lypy_print_fd(stream, self._root, format, lib.LYP_WITHSIBLINGS, chunk_size)
+            if ret < 0:
+                raise OSError(ffi.errno, os.strerror(ffi.errno))
+            if ret != 0:
+                raise self._ctx.error('Unable to dump data')
+            return
+
+        writer = StreamWriter(stream, binary=format == lib.LYD_LYB)
+        handle = ffi.new_handle(writer)
+        ret = lib.lypy_print_clb(handle, self._root, format, lib.LYP_WITHSIBLINGS, chunk_size)
+        if writer.error is not None:
+            raise writer.error
+        if ret != 0:
+            raise self._ctx.error('Unable to dump data')
 
     def load(self, filename, format=lib.LYD_XML, trusted=False, strict=True):
         """
-        Load from a file with the specified format
+        Load from a file with the specified format - a path, or an open file
+        descriptor or file object (from its beginning, regardless of its
+        position) of a regular file. libyang maps the file in memory instead
+        of reading it.
         # TODO:  what about freeing an initial root if one exists
         """
         option = lib.LYD_OPT_CONFIG
@@ -214,13 +895,22 @@ class DataTree:
             option = option | lib.LYD_OPT_TRUSTED
         if self._root:
             raise LibyangError('load() not supported when data is already set - because the old node is not cleanly released.')
-        self._root = lib.lyd_parse_path(self._lyctx , str2c(filename), format, option)
+        self._changed()
+        if hasattr(filename, 'fileno'):
+            filename = filename.fileno()
+        if isinstance(filename, int):
+            self._root = lib.lyd_parse_fd(self._lyctx, filename, format, option)
+        else:
+            self._root = lib.lyd_parse_path(self._lyctx , str2c(filename), format, option)
         if self._root == ffi.NULL:
             raise self._ctx.error('Marshalling Error')
 
     def loads(self, payload, format=lib.LYD_XML, trusted=False, strict=True):
         """
-        Load from a string with the specified format
+        Load from a string with the specified format - bytes for LYD_LYB.
+
+        The payload can also be a bytes, bytearray, memoryview or mmap object
+        which is parsed in place, see util.buf2c().
         """
         option = lib.LYD_OPT_CONFIG
         if strict:
@@ -230,7 +920,9 @@ class DataTree:
         if self._root:
             raise LibyangError('load() not supported when data is already set - because the old note is not cleanly released.')
 
-        self._root = lib.lyd_parse_mem(self._lyctx, str2c(payload), format, option)
+        self._changed()
+        self._root = lib.lyd_parse_mem(self._lyctx, buf2c(payload, format == lib.LYD_LYB),
+                                       format, option)
         if self._root == ffi.NULL:
             raise self._ctx.error('Marshalling Error')
 
@@ -246,12 +938,13 @@ class DataTree:
         if not self._root:
             raise LibyangError('merges() not possible until data exists on the root object.')
 
-        tmp = lib.lyd_parse_mem(self._lyctx, str2c(payload), format, option)
+        tmp = lib.lyd_parse_mem(self._lyctx, buf2c(payload, format == lib.LYD_LYB), format, option)
         if tmp == ffi.NULL:
             raise self._ctx.error('Marshalling Merge Error')
 
+        self._changed()
         if not lib.lyd_merge(self._root, tmp, lib.LYD_OPT_EXPLICIT) == 0:
-            return self._ctx.error('Merge Error')
+            raise self._ctx.error('Merge Error')
     
     def advancedmerge(self, payload, format=lib.LYD_XML, trusted=True, strict=True):
         if self._root:
@@ -260,47 +953,189 @@ class DataTree:
                 option = option | lib.LYD_OPT_STRICT
             if trusted:
                 option = option | lib.LYD_OPT_TRUSTED
-            template_root = lib.lyd_parse_mem(self._lyctx, str2c(payload), format, option)
+            template_root = lib.lyd_parse_mem(self._lyctx, buf2c(payload, format == lib.LYD_LYB),
+                                              format, option)
             if template_root == ffi.NULL:
                 raise self._ctx.error('Marshalling Advanced Merge Error')
             
+            self._changed()
             if lib.lypy_process_attributes(self._root, self._lyctx, template_root) == 1:
                 raise LibyangError('Validation failed after processing attributes')
         else:
             raise LibyangError('advanced merges() not possible until data exists on the root object.')
 
-    def dumps(self, format=lib.LYD_XML):
+    def dumps(self, format=lib.LYD_XML, as_bytes=False, xpath=None):
         """
-        Load from a string with the specified format
+        Dump to a string with the specified format - bytes for LYD_LYB.
+
+        With as_bytes=True, return a cffi buffer object wrapping the output of
+        libyang without any copy, for any format. It supports the buffer
+        protocol (socket.sendall(), memoryview(), bytes()...) and the memory
+        is released when it is garbage collected. The buffer is writable, but
+        writing to it does not change the tree.
+
+        When XPATH is given, only the matching nodes (with their subtree and
+        parents) are dumped. They are copied to be printed (see
+        lypy_dup_matches()), the rest of the tree is not. When nothing
+        matches, the result is empty: a string, bytes for LYD_LYB, or an
+        empty buffer object with as_bytes=True.
         """
         if not self._root:
             raise LibyangError('No data to dump')
 
-        buf = ffi.new('char **')
-        lib.lyd_print_mem(buf, self._root, format, lib.LYP_WITHSIBLINGS)
-        return c2str(buf[0])
-
-    def dump_datanodes(self):
-        # This is suboptimal at present - want to move this down to C or
-        # avoid the extra funaction call.
-        nodelist = {}
-        start_node = lib.lypy_get_root_node(self._root)
+        root = self._root
+        if xpath is not None:
+            root = lib.lypy_dup_matches(self._root, xpath2c(xpath))
+            if not root:
+                if as_bytes:
+                    return ffi.buffer(ffi.new('char[]', 0))
+                return b'' if format == lib.LYD_LYB else ''
+        try:
+            result = print_mem(root, format, lib.LYP_WITHSIBLINGS, as_bytes)
+        finally:
+            if xpath is not None:
+                lib.lyd_free_withsiblings(root)
+        if result is None:
+            raise self._ctx.error('Unable to dump data')
+        return result
 
-        DataNode._find_nodes(self._lyctx, nodelist, start_node)
+    def dump_datanodes(self, sort=False, schema_order=False):
+        """
+        Yield a DataNode for all the containers, leaves and leaf-lists of the
+        tree, in document order - or sorted by path, or in schema order (see
+        DataNode.dump_datanodes()).
+        """
+        if self._root is None:
+            return
+        for node in DataNode._dump(self, self._root, lib.LYPY_WALK_FIRST, sort, schema_order):
+            yield node
 
-        for node in nodelist:
-            yield nodelist[node]
+    def dump_values(self, sort=False, schema_order=False):
+        """
+        Return (path, value) tuples for all the containers, leaves and
+        leaf-lists of the tree, in document order - or sorted by path, or in
+        schema order (see DataNode.dump_datanodes()). Values follow the
+        DataNode.value rules but no DataNode is created.
+        """
+        if self._root is None:
+            return []
+        flags = lib.LYPY_WALK_FIRST | lib.LYPY_WALK_VALUES
+        if schema_order:
+            flags |= lib.LYPY_WALK_SCHEMA_ORDER
+            sort = False
+        out, paths = walk_paths(self._root, flags, DUMP_NODETYPES)
+        items = list(zip(paths, decode_values(out.values, out.count)))
+        if sort:
+            items.sort(key=operator.itemgetter(0))
+        return items
 
     def validate(self):
         if not self._root:
             return True
 
+        self._changed()
         result = lib.validate_data_tree(self._root, self._ctx._ctx)
 
         if result == 0:
             return True
         raise self._ctx.error('Validation Error')
 
+    def transaction(self, validate=True):
+        """
+        Return a Transaction buffering changes to this tree, to be used as a
+        context manager:
+
+            with tree.transaction() as txn:
+                txn.set_xpath(xpath, value)
+                txn.delete_xpath(other_xpath)
+        """
+        return Transaction(self, validate=validate)
+
+
+# ------------------------------------------------------------------------------
+class Transaction(object):
+
+    """
+    Buffer sets, deletes and merges on a DataTree and apply them together on
+    commit(), followed by a single validation of the whole tree.
+
+    The tree is snapshotted with lyd_dup before anything is applied. If any
+    change or the final validation fails, the tree is restored from that
+    snapshot so it is never left half-applied. DataNode objects obtained from
+    the tree before a rollback must not be used afterwards.
+    """
+
+    SET = 'set'
+    DELETE = 'delete'
+    MERGE = 'merge'
+
+    def __init__(self, tree, validate=True):
+        self._tree = tree
+        self._validate = validate
+        self._changes = []
+
+    def set_xpath(self, xpath, value):
+        self._changes.append((self.SET, (xpath, value)))
+
+    def delete_xpath(self, xpath):
+        self._changes.append((self.DELETE, xpath))
+
+    def merges(self, payload, format=lib.LYD_XML, trusted=True, strict=True):
+        self._changes.append((self.MERGE, (payload, format, trusted, strict)))
+
+    def rollback(self):
+        """
+        Forget all the changes buffered so far, the tree is left untouched.
+        """
+        self._changes = []
+
+    def commit(self):
+        """
+        Apply all buffered changes then validate the tree once.
+        """
+        tree = self._tree
+        changes = self._changes
+        self._changes = []
+
+        snapshot = ffi.NULL
+        if tree._root is not None:
+            snapshot = lib.lyd_dup_withsiblings(tree._root, lib.LYD_DUP_OPT_RECURSIVE)
+            if snapshot == ffi.NULL:
+                raise tree._ctx.error('Cannot snapshot data tree')
+
+        try:
+            # consecutive sets/deletes go down to libyang in a single call
+            for op, group in itertools.groupby(changes, key=lambda c: c[0]):
+                args = [arg for _, arg in group]
+                if op == self.SET:
+                    tree.set_many(args)
+                elif op == self.DELETE:
+                    tree.delete_many(args)
+                else:
+                    for merge_args in args:
+                        tree.merges(*merge_args)
+            if self._validate:
+                tree.validate()
+        except:
+            if tree._root is not None:
+                lib.lyd_free_withsiblings(tree._root)
+            tree._root = snapshot if snapshot != ffi.NULL else None
+            tree._changed()
+            raise
+
+        if snapshot != ffi.NULL:
+            lib.lyd_free_withsiblings(snapshot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
 
 # ------------------------------------------------------------------------------
 LOG_LEVELS = {
@@ -0,0 +1,84 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+"""
+Parse and dump many data trees at once on a pool of threads.
+
+cffi releases the GIL while lyd_parse_mem() and lyd_print_mem() run, so the
+work of the threads overlaps. The context must not be modified (no modules
+loaded) while they run. libyang keeps the errors of each thread apart, they
+are collected in the thread where they happened.
+"""
+
+from multiprocessing.pool import ThreadPool
+
+from _libyang import lib
+
+from . import DataTree
+from .util import LibyangError
+
+
+#------------------------------------------------------------------------------
+class BulkError(LibyangError):
+
+    """
+    Raised when some of the items of a bulk operation failed. The results
+    attribute has the result of each item in order, the exception raised
+    instead for the failed ones, which are also in the errors dict by index.
+    """
+
+    def __init__(self, results, errors):
+        msgs = ['#%d: %s' % (i, errors[i]) for i in sorted(errors)]
+        super(BulkError, self).__init__(
+            '%d of %d failed\n%s' % (len(errors), len(results), '\n'.join(msgs)))
+        self.results = results
+        self.errors = errors
+
+
+#------------------------------------------------------------------------------
+def _capture(func):
+    def wrapper(arg):
+        try:
+            return func(arg), None
+        except LibyangError as e:
+            return None, e
+    return wrapper
+
+
+def _run(func, items, workers):
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        outcomes = [_capture(func)(item) for item in items]
+    else:
+        pool = ThreadPool(min(workers, len(items)))
+        try:
+            outcomes = pool.map(_capture(func), items, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    errors = dict((i, e) for i, (_, e) in enumerate(outcomes) if e is not None)
+    if errors:
+        raise BulkError([e if e is not None else r for r, e in outcomes], errors)
+    return [r for r, _ in outcomes]
+
+
+#------------------------------------------------------------------------------
+def parse_many(ctx, payloads, format=lib.LYD_XML, workers=4, trusted=False, strict=True):
+    """
+    Parse each payload (see DataTree.loads()) into its own DataTree, on
+    workers threads. Returns the trees in the order of the payloads, raises
+    BulkError if any could not be parsed.
+    """
+    def parse(payload):
+        tree = DataTree(ctx)
+        tree.loads(payload, format, trusted, strict)
+        return tree
+    return _run(parse, payloads, workers)
+
+
+def dump_many(trees, format=lib.LYD_XML, workers=4, as_bytes=False):
+    """
+    Dump each tree (see DataTree.dumps()) on workers threads. Returns the
+    results in the order of the trees, raises BulkError if any failed.
+    """
+    return _run(lambda tree: tree.dumps(format, as_bytes), trees, workers)
@@ -0,0 +1,407 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+import array
+import decimal
+import functools
+import numbers
+import struct
+
+from _libyang import ffi
+from _libyang import lib
+
+from .util import LibyangError
+from .util import c2str
+
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+#------------------------------------------------------------------------------
+def encode_str(value):
+    """
+    Schema agnostic encoder, used for string-like types and when the type of
+    the target node is not known.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return b'true' if value else b'false'
+    if not isinstance(value, bytes):
+        if not hasattr(value, 'encode'):
+            value = str(value)
+        if not isinstance(value, bytes):
+            value = value.encode('utf-8')
+    return value
+
+
+#------------------------------------------------------------------------------
+def encode_bool(value):
+    if value is True:
+        return b'true'
+    if value is False:
+        return b'false'
+    return encode_str(value)
+
+
+#------------------------------------------------------------------------------
+def encode_int(value):
+    if isinstance(value, numbers.Integral) and not isinstance(value, bool):
+        return b'%d' % value
+    return encode_str(value)
+
+
+#------------------------------------------------------------------------------
+def encode_empty(value):
+    # an empty leaf exists or not, there is no value to turn it off
+    if value is None or value is True:
+        return None
+    raise LibyangError('invalid value for empty leaf: %r' % (value,))
+
+
+#------------------------------------------------------------------------------
+def encode_bits(value):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return b' '.join(encode_str(v) for v in value)
+    return encode_str(value)
+
+
+#------------------------------------------------------------------------------
+def dec64_encoder(digits):
+    quantum = decimal.Decimal(1).scaleb(-digits)
+
+    def encode_dec64(value):
+        if isinstance(value, numbers.Number) and not isinstance(value, bool):
+            try:
+                # the shortest repr of floats, not their exact binary value
+                exact = decimal.Decimal(repr(value) if isinstance(value, float) else value)
+                quantized = exact.quantize(quantum)
+            except (TypeError, decimal.InvalidOperation):
+                quantized = exact = None
+            # never round, like libyang does with strings
+            if exact is None or quantized != exact:
+                raise LibyangError('%r cannot be represented with %d fraction digits'
+                                   % (value, digits))
+            return format(quantized, 'f').encode('ascii')
+        return encode_str(value)
+
+    return encode_dec64
+
+
+#------------------------------------------------------------------------------
+INT_TYPES = frozenset((
+    lib.LY_TYPE_INT8,
+    lib.LY_TYPE_INT16,
+    lib.LY_TYPE_INT32,
+    lib.LY_TYPE_INT64,
+    lib.LY_TYPE_UINT8,
+    lib.LY_TYPE_UINT16,
+    lib.LY_TYPE_UINT32,
+    lib.LY_TYPE_UINT64,
+))
+ENCODERS = {
+    lib.LY_TYPE_BOOL: encode_bool,
+    lib.LY_TYPE_EMPTY: encode_empty,
+    lib.LY_TYPE_BITS: encode_bits,
+}
+for t in INT_TYPES:
+    ENCODERS[t] = encode_int
+del t
+
+
+#------------------------------------------------------------------------------
+def type_encoder(type_p):
+    """
+    Return the encoder for a struct lys_type *. Enumerations, identityrefs,
+    strings, binaries, instance-identifiers and unions are sent as is.
+    """
+    base = type_p.base
+    if base == lib.LY_TYPE_LEAFREF:
+        target = type_p.info.lref.target
+        if not target:
+            return encode_str
+        return type_encoder(ffi.addressof(target.type))
+    if base == lib.LY_TYPE_DEC64:
+        return dec64_encoder(dec64_digits(type_p))
+    return ENCODERS.get(base, encode_str)
+
+
+#------------------------------------------------------------------------------
+def dec64_digits(type_p):
+    # fraction-digits is only set on the type which defines it
+    while type_p.info.dec64.dig == 0 and type_p.der:
+        type_p = ffi.addressof(type_p.der.type)
+    return type_p.info.dec64.dig
+
+
+#------------------------------------------------------------------------------
+def leaf_encoder(snode, cache=None):
+    """
+    Return a function converting python values to the string representation
+    libyang expects for the leaf or leaf-list schema node snode (a struct
+    lys_node *). Encoders return None when the value should be ffi.NULL.
+
+    When given, cache is a dict where encoders are kept by schema node.
+    """
+    if not snode or not snode.nodetype & (lib.LYS_LEAF | lib.LYS_LEAFLIST):
+        return encode_str
+    if cache is not None and snode in cache:
+        return cache[snode]
+    if snode.nodetype == lib.LYS_LEAF:
+        leaf = ffi.cast('struct lys_node_leaf *', snode)
+    else:
+        leaf = ffi.cast('struct lys_node_leaflist *', snode)
+    encoder = type_encoder(ffi.addressof(leaf.type))
+    if cache is not None:
+        cache[snode] = encoder
+    return encoder
+
+
+#------------------------------------------------------------------------------
+def encode_c(encoder, value):
+    """
+    Encode value and return it as a char[] suitable for libyang.
+    """
+    value = encoder(value)
+    if value is None:
+        return ffi.NULL
+    return ffi.new('char []', value)
+
+
+#------------------------------------------------------------------------------
+# Decoders read the value already parsed by libyang from the lyd_val union,
+# they are given the union and the fraction-digits (only set for decimal64).
+# Types not listed here are decoded from their value string.
+DECODERS = {
+    lib.LY_TYPE_INT8: lambda val, dig: val.int8,
+    lib.LY_TYPE_INT16: lambda val, dig: val.int16,
+    lib.LY_TYPE_INT32: lambda val, dig: val.int32,
+    lib.LY_TYPE_INT64: lambda val, dig: val.int64,
+    lib.LY_TYPE_UINT8: lambda val, dig: val.uint8,
+    lib.LY_TYPE_UINT16: lambda val, dig: val.uint16,
+    lib.LY_TYPE_UINT32: lambda val, dig: val.uint32,
+    lib.LY_TYPE_UINT64: lambda val, dig: val.uint64,
+    lib.LY_TYPE_BOOL: lambda val, dig: bool(val.bln),
+    lib.LY_TYPE_DEC64: lambda val, dig: decimal.Decimal(val.dec64).scaleb(-dig),
+    lib.LY_TYPE_EMPTY: lambda val, dig: True,
+}
+
+
+#------------------------------------------------------------------------------
+def decode_leaf(lyd_node):
+    """
+    Return the python value of a leaf or leaf-list data node, according to
+    the base type of its schema node. Integers and booleans are returned as
+    such, decimal64 as decimal.Decimal, empty leaves as True and everything
+    else as strings.
+    """
+    type_p = ffi.addressof(ffi.cast('struct lys_node_leaf *', lyd_node.schema).type)
+    leaf = ffi.cast('struct lyd_node_leaf_list *', lyd_node)
+    decoder = DECODERS.get(type_p.base)
+    if decoder is None:
+        return c2str(leaf.value_str)
+    dig = 0
+    if type_p.base == lib.LY_TYPE_DEC64:
+        dig = dec64_digits(type_p)
+    return decoder(leaf.value, dig)
+
+
+#------------------------------------------------------------------------------
+def decode_value(v, strings):
+    """
+    Convert a struct lypy_value to a python value, following the same rules
+    as DataNode.value. Strings come from the libyang dictionary: they are
+    decoded once per pointer and kept in the strings dict.
+    """
+    if not v.nodetype & (lib.LYS_LEAF | lib.LYS_LEAFLIST):
+        return True if v.nodetype & (lib.LYS_LIST | lib.LYS_CONTAINER) else None
+    decoder = DECODERS.get(v.type)
+    if decoder is not None:
+        return decoder(v.value, v.dig)
+    s = strings.get(v.str)
+    if s is None:
+        s = strings[v.str] = c2str(v.str)
+    return s
+
+
+#------------------------------------------------------------------------------
+def decode_values(values, count):
+    """
+    Convert count struct lypy_value (see lypy_get_values()) to python values.
+    """
+    strings = {}
+    return [decode_value(values[i], strings) for i in range(count)]
+
+
+#------------------------------------------------------------------------------
+# Converters for the raw int64_t values stored by lypy_flatten(), given the
+# fraction-digits (only set for decimal64). Integers are returned as is.
+NUM_CONVERTERS = {
+    lib.LY_TYPE_UINT64: lambda num, dig: num & 0xffffffffffffffff,
+    lib.LY_TYPE_BOOL: lambda num, dig: bool(num),
+    lib.LY_TYPE_DEC64: lambda num, dig: decimal.Decimal(num).scaleb(-dig),
+}
+KIND_CONTAINER, KIND_LIST, KIND_LEAF, KIND_LEAFLIST = range(4)
+SOURCE_NONE, SOURCE_NUMS, SOURCE_STRS = range(3)
+
+
+def _flat_schema_info(schema, qualified):
+    """
+    Return (name, kind, source, convert) for a schema node of a struct
+    lypy_tree. source tells where leaf values are stored, convert is None
+    when they can be used as is.
+    """
+    name = c2str(schema.name)
+    if qualified:
+        name = '%s:%s' % (c2str(lib.lys_node_module(schema).name), name)
+    if schema.nodetype == lib.LYS_LIST:
+        return name, KIND_LIST, SOURCE_NONE, None
+    if not schema.nodetype & (lib.LYS_LEAF | lib.LYS_LEAFLIST):
+        return name, KIND_CONTAINER, SOURCE_NONE, None
+    kind = KIND_LEAF if schema.nodetype == lib.LYS_LEAF else KIND_LEAFLIST
+    type_p = ffi.addressof(ffi.cast('struct lys_node_leaf *', schema).type)
+    if type_p.base == lib.LY_TYPE_EMPTY:
+        return name, kind, SOURCE_NONE, None
+    if type_p.base not in DECODERS:
+        return name, kind, SOURCE_STRS, None
+    convert = NUM_CONVERTERS.get(type_p.base)
+    if convert is not None:
+        dig = dec64_digits(type_p) if type_p.base == lib.LY_TYPE_DEC64 else 0
+        convert = functools.partial(convert, dig=dig)
+    return name, kind, SOURCE_NUMS, convert
+
+
+def decode_tree(tree):
+    """
+    Build nested python dicts from a struct lypy_tree (see lypy_flatten()),
+    laid out like the JSON encoding: names are qualified with their module
+    name when it differs from their parent's, containers are dicts, lists are
+    lists of dicts and leaf-lists are lists of values. Leaf values follow the
+    same rules as DataNode.value.
+
+    The per-node arrays are converted to python objects in bulk, which keeps
+    the python loop down to a few dict operations per node.
+    """
+    count = tree.count
+    if count == 0:
+        return {}
+    depths = struct.unpack('=%dI' % count, ffi.buffer(tree.depths, 4 * count)[:])
+    ids = struct.unpack('=%dI' % count, ffi.buffer(tree.ids, 4 * count)[:])
+    nums = iter(struct.unpack('=%dq' % tree.nnums, ffi.buffer(tree.nums, 8 * tree.nnums)[:]))
+    strs = iter(ffi.buffer(tree.strs, tree.strs_len)[:].decode('utf-8').split(u'\0'))
+    infos = [_flat_schema_info(tree.schemas[i], tree.qualified[i]) for i in range(tree.nschemas)]
+
+    result = {}
+    stack = [result]
+    for depth, sid in zip(depths, ids):
+        parent = stack[depth]
+        name, kind, source, convert = infos[sid]
+        if kind == KIND_CONTAINER:
+            child = parent[name] = {}
+            stack[depth + 1:] = [child]
+            continue
+        if kind == KIND_LIST:
+            child = {}
+            if name in parent:
+                parent[name].append(child)
+            else:
+                parent[name] = [child]
+            stack[depth + 1:] = [child]
+            continue
+        if source == SOURCE_STRS:
+            value = next(strs)
+        elif source == SOURCE_NUMS:
+            value = next(nums)
+            if convert is not None:
+                value = convert(value)
+        else:
+            value = True  # empty leaf
+        if kind == KIND_LEAF:
+            parent[name] = value
+        elif name in parent:
+            parent[name].append(value)
+        else:
+            parent[name] = [value]
+    return result
+
+
+#------------------------------------------------------------------------------
+# array.array typecodes for the numeric types exported in columns, 'q' and 'Q'
+# are not available on python 2 where 'l' and 'L' are 64 bits wide on LP64.
+_INT64, _UINT64 = ('q', 'Q') if hasattr(array, 'typecodes') else ('l', 'L')
+ARRAY_TYPECODES = {
+    lib.LY_TYPE_INT8: 'b',
+    lib.LY_TYPE_INT16: 'h',
+    lib.LY_TYPE_INT32: 'i',
+    lib.LY_TYPE_INT64: _INT64,
+    lib.LY_TYPE_UINT8: 'B',
+    lib.LY_TYPE_UINT16: 'H',
+    lib.LY_TYPE_UINT32: 'I',
+    lib.LY_TYPE_UINT64: _UINT64,
+    lib.LY_TYPE_DEC64: 'd',
+}
+NUMPY_DTYPES = {
+    lib.LY_TYPE_INT8: 'int8',
+    lib.LY_TYPE_INT16: 'int16',
+    lib.LY_TYPE_INT32: 'int32',
+    lib.LY_TYPE_INT64: 'int64',
+    lib.LY_TYPE_UINT8: 'uint8',
+    lib.LY_TYPE_UINT16: 'uint16',
+    lib.LY_TYPE_UINT32: 'uint32',
+    lib.LY_TYPE_UINT64: 'uint64',
+    lib.LY_TYPE_BOOL: 'bool',
+    lib.LY_TYPE_DEC64: 'float64',
+}
+
+
+def decode_column(column, count):
+    """
+    Convert a struct lypy_column of count rows (see lypy_list_columns()) to a
+    python sequence. Numeric leaves (integers, booleans and decimal64 as
+    floats) are returned as numpy arrays when numpy is available - masked
+    arrays if some entries do not have the leaf. Without numpy, integers and
+    decimal64 are returned as array.array when all entries have the leaf.
+    Everything else is returned as a list with None for the missing values,
+    empty leaves as True.
+    """
+    type_p = ffi.addressof(ffi.cast('struct lys_node_leaf *', column.schema).type)
+    base = type_p.base
+    missing = ffi.buffer(column.missing, count)[:]
+
+    if base == lib.LY_TYPE_EMPTY:
+        return [None if m else True for m in bytearray(missing)]
+
+    if not column.nums:
+        strs = ffi.buffer(column.strs, column.strs_len)[:].decode('utf-8').split(u'\0')
+        if column.nmissing:
+            return [None if m else s for s, m in zip(strs, bytearray(missing))]
+        return strs[:count]
+
+    nums = ffi.buffer(column.nums, 8 * count)[:]
+    scale = float(10 ** dec64_digits(type_p)) if base == lib.LY_TYPE_DEC64 else None
+
+    if numpy is not None:
+        values = numpy.frombuffer(nums, dtype=numpy.int64)
+        if scale is not None:
+            values = values / scale
+        else:
+            values = values.astype(NUMPY_DTYPES[base])
+        if column.nmissing:
+            values = numpy.ma.masked_array(values, mask=numpy.frombuffer(missing, dtype=numpy.bool_))
+        return values
+
+    values = struct.unpack('=%dq' % count, nums)
+    if base == lib.LY_TYPE_BOOL:
+        values = [bool(v) for v in values]
+    elif scale is not None:
+        values = [v / scale for v in values]
+    elif base == lib.LY_TYPE_UINT64:
+        values = [v & 0xffffffffffffffff for v in values]
+    if column.nmissing:
+        return [None if m else v for v, m in zip(values, bytearray(missing))]
+    if base == lib.LY_TYPE_BOOL:
+        return values
+    return array.array(ARRAY_TYPECODES[base], values)
@@ -1,62 +1,315 @@
 # Copyright (c) 2019 Robin Jarry
 # SPDX-License-Identifier: MIT
 
+import struct
+
 from _libyang import ffi
 from _libyang import lib
 
+from .codec import decode_leaf
+from .codec import decode_tree
+from .schema import List
 from .schema import Node
+from .schema import iter_children
+from .util import LibyangError
 from .util import c2str
 from .util import str2c
+from .xpath import xpath2c
+
+
+#------------------------------------------------------------------------------
+def xpath_quote(value):
+    """
+    Quote a value to be used in an XPATH predicate. XPath 1.0 literals have
+    no escape sequence, a value containing both quote characters cannot be
+    used.
+    """
+    value = DataNode.python_value_str(value)
+    if "'" in value:
+        if '"' in value:
+            raise LibyangError('cannot quote value with both \' and ": %r' % value)
+        return '"%s"' % value
+    return "'%s'" % value
+
+
+#------------------------------------------------------------------------------
+def in_choice(snode):
+    """
+    Return True if the lys_node snode is a case of a choice (possibly
+    nested in uses statements).
+    """
+    snode = lib.lys_parent(snode)
+    while snode and snode.nodetype in (lib.LYS_USES, lib.LYS_CASE, lib.LYS_CHOICE):
+        if snode.nodetype != lib.LYS_USES:
+            return True
+        snode = lib.lys_parent(snode)
+    return False
+
+
+#------------------------------------------------------------------------------
+DUMP_NODETYPES = lib.LYS_CONTAINER | lib.LYS_LEAF | lib.LYS_LEAFLIST
+
+
+def walk_paths(lyd_node, flags=0, nodetypes=0xffff):
+    """
+    Collect the nodes of the subtree of lyd_node (see lypy_walk_paths()) with
+    their data path. Returns the struct lypy_paths, released when garbage
+    collected, and the list of paths.
+    """
+    out = ffi.gc(ffi.new('struct lypy_paths *'), lib.lypy_paths_free)
+    if lib.lypy_walk_paths(lyd_node, flags, nodetypes, out) < 0:
+        raise LibyangError('Unable to walk the data tree')
+    return out, split_blob(out.paths, out.paths_len, out.count)
+
+
+#------------------------------------------------------------------------------
+def set_paths(node_set, start=0, stop=None, templates=False):
+    """
+    Return the data paths of the nodes of a struct ly_set * between start and
+    stop, all generated at once (see lypy_set_paths()). With templates=True,
+    return (template, keys) tuples instead: the key and leaf-list values are
+    replaced by %s in the template and listed in keys, so that
+    template % tuple(xpath_quote(k) for k in keys) is the path.
+    """
+    if stop is None:
+        stop = node_set.number
+    flags = lib.LYPY_PATHS_TEMPLATES if templates else 0
+    out = ffi.new('struct lypy_paths *')
+    if lib.lypy_set_paths(node_set, start, stop, flags, out) < 0:
+        raise LibyangError('Unable to generate the data paths')
+    try:
+        paths = split_blob(out.paths, out.paths_len, out.count)
+        if not templates or not paths:
+            return paths
+        keys = split_blob(out.keys, out.keys_len, -1)
+        nkeys = struct.unpack('%dI' % out.count, ffi.buffer(out.nkeys, out.count * ffi.sizeof('unsigned int')))
+        result = []
+        pos = 0
+        for path, n in zip(paths, nkeys):
+            result.append((path, tuple(keys[pos:pos + n])))
+            pos += n
+        return result
+    finally:
+        lib.lypy_paths_free(out)
+
+
+#------------------------------------------------------------------------------
+def split_blob(buf, length, count):
+    """
+    Split a C buffer of NUL terminated strings into a list of count strings.
+    """
+    if not length:
+        return []
+    blob = ffi.buffer(buf, length)[:]
+    if not isinstance(blob, str):
+        blob = blob.decode('utf-8')
+    return blob.split('\0')[:count]
+
+
+#------------------------------------------------------------------------------
+def print_mem(lyd_node, format, options, as_bytes=False):
+    """
+    Print lyd_node with lyd_print_mem(), see DataTree.dumps() for the type of
+    the result. Returns None when libyang fails.
+    """
+    buf = ffi.new('char **')
+    if lib.lyd_print_mem(buf, lyd_node, format, options) != 0:
+        return None
+    data = ffi.gc(buf[0], lib.free)
+    if format == lib.LYD_LYB:
+        # binary, not NUL terminated
+        length = lib.lyd_lyb_data_length(data)
+    elif as_bytes:
+        length = lib.strlen(data)
+    else:
+        return c2str(data)
+    # the buffer keeps data alive
+    out = ffi.buffer(data, length)
+    return out if as_bytes else out[:]
+
 
+#------------------------------------------------------------------------------
+def lyd2dict(lyd_node, siblings=False):
+    """
+    Export the subtree of a lyd_node (and of its siblings) to nested python
+    dicts in a single pass, see codec.decode_tree().
+    """
+    tree = ffi.new('struct lypy_tree *')
+    if lib.lypy_flatten(lyd_node, siblings, tree) < 0:
+        raise LibyangError('Unable to export data')
+    try:
+        return decode_tree(tree)
+    finally:
+        lib.lypy_tree_free(tree)
 
+
+#------------------------------------------------------------------------------
 class DataNode(object):
 
-    INT_TYPES = (
-        lib.LY_TYPE_INT8,
-        lib.LY_TYPE_INT16,
-        lib.LY_TYPE_INT32,
-        lib.LY_TYPE_INT64,
-        lib.LY_TYPE_UINT8,
-        lib.LY_TYPE_UINT16,
-        lib.LY_TYPE_UINT32,
-        lib.LY_TYPE_UINT64,
-    )
-
-    BOOL_TYPES = (
-        lib.LY_TYPE_BOOL,
-    )
-
-    DECIMAL_TYPES = (
-        lib.LY_TYPE_DEC64,
-    )
-
-    EMPTY_TYPES = (
-        lib.LY_TYPE_EMPTY,
-    )
+    __slots__ = ('context', 'lyd_node', '_xpath', '_value')
+
+    # the value of a node can legitimately be None
+    _UNSET = object()
 
     def __init__(self, context, lyd_node, xpath=None):
-        self.value = self._get_value_from_lyd_node(lyd_node, xpath)
-        self.xpath = xpath
-        self.lyd_node = lyd_node
         self.context = context
+        self.lyd_node = lyd_node
+        self._xpath = xpath
+        self._value = DataNode._UNSET
+
+    @property
+    def value(self):
+        """
+        The python value of the node, converted on first access.
+        """
+        if self._value is DataNode._UNSET:
+            self._value = self._get_value_from_lyd_node(self.lyd_node)
+        return self._value
+
+    @property
+    def xpath(self):
+        """
+        The path this node was looked up with, or its own data path from
+        lyd_path() (built on first access) when none was given.
+        """
+        if self._xpath is None:
+            self._xpath = DataNode._path(self.lyd_node)
+        return self._xpath
+
+    def set(self, relative_path, value):
+        """
+        Set a value by XPATH relative to this node - siblings/dependent nodes
+        getting created like with DataTree.set_xpath().
+
+        libyang starts resolving the path from this node instead of walking
+        from the root of the tree again, which is much cheaper when filling in
+        many leaves of the same list entry.
+        """
+        path = xpath2c(relative_path)
+        self._changed()
+        node = lib.lyd_new_path(self.lyd_node, ffi.NULL, path,
+                                DataNode.convert_python_value(value), 0,
+                                lib.LYD_PATH_OPT_UPDATE)
+        if node:
+            self._added(node)
+        else:
+            node_set = ffi.gc(lib.lyd_find_path(self.lyd_node, path), lib.ly_set_free)
+            if not node_set or node_set.number == 0:
+                raise LibyangError('The value {0} was not set at {1}\nCheck the path and value'.format(
+                    value, relative_path))
+
+    def get(self, relative_path):
+        """
+        Get the first node matching an XPATH relative to this node, or None.
+        """
+        node_set = ffi.gc(lib.lyd_find_path(self.lyd_node, xpath2c(relative_path)),
+                          lib.ly_set_free)
+        if not node_set or node_set.number == 0:
+            return None
+        return DataNode(self.context, node_set.set.d[0])
+
+    def child(self, child_name, **keys):
+        """
+        Get the direct child called child_name, creating it when it does not
+        exist. For list entries the keys are given as keyword arguments, they
+        are put in schema order in the path given to libyang.
+        """
+        path = child_name
+        if keys:
+            snode = self._schema_child(child_name)
+            if not isinstance(snode, List):
+                raise LibyangError('%s is not a list under %s' % (child_name, self))
+            for key in snode.keys():
+                if key.name() not in keys:
+                    raise LibyangError('missing key %s for list %s' % (key.name(), child_name))
+                path += '[%s=%s]' % (key.name(), xpath_quote(keys[key.name()]))
+
+        c_path = str2c(path)
+        self._changed()
+        node = lib.lyd_new_path(self.lyd_node, ffi.NULL, c_path, ffi.NULL, 0,
+                                lib.LYD_PATH_OPT_UPDATE | lib.LYD_PATH_OPT_NOPARENTRET)
+        if node:
+            # the last created node was returned, not the first one
+            top = node
+            while top.parent and top.parent != self.lyd_node:
+                top = top.parent
+            self._added(top)
+        else:
+            node_set = ffi.gc(lib.lyd_find_path(self.lyd_node, c_path), lib.ly_set_free)
+            if not node_set or node_set.number == 0:
+                raise LibyangError('Unable to get or create %s under %s' % (path, self))
+            node = node_set.set.d[0]
+
+        return DataNode(self.context, node)
+
+    def _changed(self):
+        # nodes looked up from a DataTree have it as context
+        changed = getattr(self.context, '_changed', None)
+        if changed is not None:
+            changed(index=False)
+
+    def _added(self, lyd_node):
+        added = getattr(self.context, '_added', None)
+        if added is not None:
+            added(lyd_node)
+
+    def _schema_child(self, name):
+        name = name.split(':')[-1]
+        for snode in iter_children(None, self.lyd_node.schema):
+            if snode.name() == name:
+                return snode
+        return None
+
+    def to_dict(self):
+        """
+        Export this node and its subtree to nested python dicts, laid out like
+        the JSON encoding with this node as the only top-level entry.
+        """
+        return lyd2dict(self.lyd_node)
+
+    def dumps(self, format=lib.LYD_XML, as_bytes=False):
+        """
+        Dump this node and its subtree, with its parents, to a string with the
+        specified format - see DataTree.dumps(). Only the subtree and the
+        parents are copied to be printed, not the rest of the tree.
+        """
+        dup = lib.lyd_dup(self.lyd_node, lib.LYD_DUP_OPT_RECURSIVE | lib.LYD_DUP_OPT_WITH_PARENTS)
+        if not dup:
+            raise LibyangError('Unable to copy %s' % self)
+        root = ffi.cast('struct lyd_node *', lib.lypy_get_root_node(dup))
+        try:
+            result = print_mem(root, format, 0, as_bytes)
+        finally:
+            lib.lyd_free(root)
+        if result is None:
+            raise LibyangError('Unable to dump %s' % self)
+        return result
 
     def get_root(self):
-        return DataNode(self.context, lib.lypy_get_root_node(self.lyd_node))
+        return DataNode(self.context, lib.lypy_get_root_node(self.lyd_node), '/')
 
     def get_schema(self):
         return Node(self.context, self.lyd_node.schema)
 
     @staticmethod
-    def convert_python_value(value):
+    def _path(lyd_node):
+        return c2str(ffi.gc(lib.lyd_path(lyd_node), lib.free))
+
+    @staticmethod
+    def python_value_str(value):
         if isinstance(value, bool):
             if value is True:
-                return str2c('true')
-            return str2c('false')
+                return 'true'
+            return 'false'
+
+        return str(value)
 
+    @staticmethod
+    def convert_python_value(value):
         if value is None:
             return ffi.NULL
 
-        return str2c(str(value))
+        return str2c(DataNode.python_value_str(value))
 
     @staticmethod
     def _get_value_from_lyd_node(lyd_node, xpath=None):
@@ -65,28 +318,13 @@ class DataNode(object):
         their proper types.
 
         This method gets the value from a lyd_node and converts it to proper python
-        types.
-        """
-        if lyd_node.schema.nodetype in (lib.LYS_LEAF, lib.LYS_LEAFLIST):
-            leaf = ffi.cast('struct lyd_node_leaf_list *', lyd_node)
-            sleaf = ffi.cast('struct lys_node_leaf *', lyd_node.schema)
-            type = ffi.addressof(sleaf.type).base
-            if type in DataNode.INT_TYPES:
-                return int(c2str(leaf.value_str))
-            elif type in DataNode.BOOL_TYPES:
-                if c2str(leaf.value_str) == 'true':
-                    return True
-                return False
-            elif type in DataNode.DECIMAL_TYPES:
-                return float(c2str(leaf.value_str))
-            elif type in DataNode.EMPTY_TYPES:
-                return True
-            return c2str(leaf.value_str)
-
-        if lyd_node.schema.nodetype == lib.LYS_LIST:
-            return True
+        types, see codec.decode_leaf().
+        """
+        nodetype = lyd_node.schema.nodetype
+        if nodetype & (lib.LYS_LEAF | lib.LYS_LEAFLIST):
+            return decode_leaf(lyd_node)
 
-        if lyd_node.schema.nodetype == lib.LYS_CONTAINER:
+        if nodetype in (lib.LYS_LIST, lib.LYS_CONTAINER):
             return True
 
         return None
@@ -100,33 +338,109 @@ class DataNode(object):
         cls = self.__class__
         return '<%s.%s: %s>' % (cls.__module__, cls.__name__, str(self))
 
-    def dump_datanodes(self):
-        # This is suboptimal at present - want to move this down to C or
-        # avoid the extra funaction call.
-        nodelist = {}
-        start_node = self.lyd_node
+    def dump_datanodes(self, sort=True, schema_order=False):
+        """
+        Yield a DataNode for this node, its following siblings and all the
+        containers, leaves and leaf-lists below them. They are sorted by path
+        by default, sort=False keeps them in document order.
 
-        DataNode._find_nodes(self.context, nodelist, start_node)
+        schema_order=True yields them in schema order instead, in one walk
+        without any global sort: siblings in the order their schema nodes are
+        defined, list entries by key (leaf-list entries by value) unless they
+        are ordered-by user. Numeric keys are compared as numbers.
+        """
+        return DataNode._dump(self.context, self.lyd_node, lib.LYPY_WALK_SIBLINGS,
+                              sort, schema_order)
+
+    @staticmethod
+    def _dump(context, lyd_node, flags, sort, schema_order):
+        if schema_order:
+            flags |= lib.LYPY_WALK_SCHEMA_ORDER
+            sort = False
+        out, paths = walk_paths(lyd_node, flags, DUMP_NODETYPES)
+        order = range(out.count)
+        if sort:
+            order = sorted(order, key=paths.__getitem__)
+        nodes = out.nodes
+        for i in order:
+            yield DataNode(context, nodes[i], paths[i])
 
-        sorted_keys = list(nodelist.keys())
-        sorted_keys.sort()
 
-        for key in sorted_keys:
-            yield nodelist[key]
+#------------------------------------------------------------------------------
+class NodeSetIterator(object):
 
-    @staticmethod
-    def _find_nodes(context, nodelist, start_node):
-        node = start_node
-        while 1:
-            if node.schema.nodetype in (1, 4, 8):    # LEAF or LEAF_LIST
-                xpath = c2str(lib.lyd_path(node))
-                nodelist[xpath] = DataNode(context, node, xpath)
+    """
+    Iterate over a struct ly_set * of data nodes (as returned by
+    lyd_find_path()) which it owns, see DataTree.iter_xpath().
+
+    Only the offset/limit window of the set is visited and the python objects
+    are created chunk_size at a time, by calling convert on each node or, with
+    bulk=True, once per chunk as convert(node_set, start, stop) which must
+    return a list. The set is freed as soon as the
+    iteration is over, when close() is called (also on leaving a with block)
+    or when the iterator is garbage collected, whichever comes first.
+
+    The set points to the nodes of tree, which must not be modified while
+    iterating: the change is detected when the next chunk is converted and
+    RuntimeError is raised instead of reading freed nodes.
+    """
+
+    def __init__(self, node_set, convert, offset=0, limit=None, chunk_size=1024, bulk=False,
+                 tree=None):
+        self._set = node_set if node_set else None
+        self._tree = tree
+        self._generation = tree.generation if tree is not None else None
+        self._chunk = []
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive')
+        self._convert = convert
+        self._bulk = bulk
+        self._chunk_size = chunk_size
+        self.total = node_set.number if node_set else 0
+        self._pos = min(max(offset, 0), self.total)
+        self._end = self.total
+        if limit is not None:
+            self._end = min(self._pos + max(limit, 0), self.total)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._chunk:
+            self._fill()
+        return self._chunk.pop()
+
+    next = __next__  # python 2
+
+    def _fill(self):
+        if self._set is None or self._pos >= self._end:
+            self.close()
+            raise StopIteration
+        if self._tree is not None and self._tree.generation != self._generation:
+            self.close()
+            raise RuntimeError('tree changed during iteration')
+        stop = min(self._pos + self._chunk_size, self._end)
+        if self._bulk:
+            self._chunk = self._convert(self._set, self._pos, stop)
+            self._chunk.reverse()
+        else:
+            nodes = self._set.set.d
+            self._chunk = [self._convert(nodes[i]) for i in range(stop - 1, self._pos - 1, -1)]
+        # reversed, so that the chunk can be consumed with pop()
+        self._pos = stop
+
+    def close(self):
+        self._chunk = []
+        self._tree = None
+        if self._set is not None:
+            lib.ly_set_free(self._set)
+            self._set = None
 
-            if node.schema.nodetype not in (4, 8):    # LEAF or LEAF_LIST
-                if not node.child == ffi.NULL:
-                    DataNode._find_nodes(context, nodelist, node.child)
+    def __enter__(self):
+        return self
 
-            if node.next == ffi.NULL:
-                break
+    def __exit__(self, *args):
+        self.close()
 
-            node = node.next
+    def __del__(self):
+        self.close()
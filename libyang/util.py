@@ -1,7 +1,12 @@
 # Copyright (c) 2018-2019 Robin Jarry
 # SPDX-License-Identifier: MIT
 
+import codecs
+import collections
+import io
+
 from _libyang import ffi
+from _libyang import lib
 
 
 #------------------------------------------------------------------------------
@@ -10,14 +15,62 @@ class LibyangError(Exception):
 
 
 #------------------------------------------------------------------------------
+class BatchError(LibyangError):
+
+    """
+    Raised by DataTree.set_many() and delete_many() when some of the items
+    could not be applied. The errors attribute has an (index, xpath, message)
+    tuple for each of them, message being what libyang reported.
+    """
+
+    def __init__(self, msg, errors):
+        super(BatchError, self).__init__(msg)
+        self.errors = errors
+
+
+#------------------------------------------------------------------------------
+# str on python 3, unicode on python 2 (where str is bytes)
+_TEXT = type(u'')
+
+
 def str2c(s):
     if s is None:
         return ffi.NULL
-    if hasattr(s, 'encode'):
+    if isinstance(s, _TEXT):
         s = s.encode('utf-8')
     return ffi.new('char []', s)
 
 
+#------------------------------------------------------------------------------
+def buf2c(data, binary=False):
+    """
+    Return a char * to the content of a str, bytes, bytearray, memoryview or
+    mmap object to be parsed by libyang, without copying it when possible.
+
+    Text formats must be NUL terminated. bytes objects are passed as is: cffi
+    guarantees that a bytes argument of a char * parameter is NUL terminated.
+    Other buffers are used in place only when their last byte is NUL and are
+    copied once into a NUL terminated char[] otherwise. Binary data
+    (binary=True) carries its own length and is never copied. The returned
+    object keeps data alive.
+    """
+    if isinstance(data, _TEXT):
+        data = data.encode('utf-8')
+    if isinstance(data, bytes):
+        return data
+    view = memoryview(data)
+    if view.ndim != 1 or view.itemsize != 1:
+        # count bytes, not items
+        view = view.cast('B')
+    if not len(view):
+        return ffi.new('char []', 1)
+    if binary or view[-1] in (b'\0', 0):
+        return ffi.from_buffer(view)
+    c = ffi.new('char []', len(view) + 1)
+    ffi.memmove(c, view, len(view))
+    return c
+
+
 #------------------------------------------------------------------------------
 def c2str(c):
     if c == ffi.NULL:
@@ -26,3 +79,119 @@ def c2str(c):
     if hasattr(s, 'decode'):
         s = s.decode('utf-8')
     return s
+
+
+#------------------------------------------------------------------------------
+def take_errors(failed, errors, count):
+    """
+    Return the (index, message) tuples of the items flagged in the failed
+    int array, freeing the messages of the errors char * array.
+    """
+    taken = []
+    for i in range(count):
+        if failed[i]:
+            taken.append((i, c2str(errors[i]) or ''))
+            lib.free(errors[i])
+    return taken
+
+
+#------------------------------------------------------------------------------
+class StreamWriter(object):
+
+    """
+    Forward the chunks of output of lypy_print_clb() to a python object: the
+    write() method of a file object (text streams get str, decoded from
+    UTF-8), the sendall() method of a socket or any callable taking bytes.
+    The first exception raised is kept in the error attribute and stops the
+    output.
+    """
+
+    def __init__(self, stream, binary=False):
+        if hasattr(stream, 'write'):
+            self._write = stream.write
+        elif hasattr(stream, 'sendall'):
+            self._write = stream.sendall
+        elif callable(stream):
+            self._write = stream
+        else:
+            raise TypeError('cannot write to %r' % (stream,))
+        self._decoder = None
+        # raw streams (unbuffered files, socket.makefile(..., 0), etc.) may
+        # write only part of a chunk and return how much they wrote
+        self._partial = isinstance(stream, io.RawIOBase)
+        if isinstance(stream, io.TextIOBase):
+            if binary:
+                raise TypeError('binary output cannot be written to a text stream')
+            self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.error = None
+
+    def write(self, data):
+        if self._decoder is not None:
+            # chunks may end in the middle of a multi-byte character
+            data = self._decoder.decode(data)
+        written = self._write(data)
+        if self._partial:
+            view = memoryview(data)
+            while written != len(view):
+                if written is None:
+                    raise IOError('raw stream would block')
+                view = view[written:]
+                written = self._write(view)
+
+
+@ffi.def_extern(name='lypy_write_cb')
+def lypy_write_cb(handle, buf, count):
+    writer = ffi.from_handle(handle)
+    try:
+        writer.write(ffi.buffer(buf, count)[:])
+    except Exception as e:
+        writer.error = e
+        return -1
+    return 0
+
+
+#------------------------------------------------------------------------------
+class LRUCache(object):
+
+    """
+    Minimal least recently used cache which keeps track of its hits/misses.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self, stats=True):
+        self._data.clear()
+        if stats:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,92 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+import re
+
+from _libyang import ffi
+from _libyang import lib
+
+from .codec import leaf_encoder
+from .schema import Node
+from .util import str2c
+
+
+#------------------------------------------------------------------------------
+# quoted predicate values, removed before looking at the path syntax
+_LITERALS_RE = re.compile(r'\'[^\']*\'|"[^"]*"')
+# no wildcard, union, descendant axis or function call
+_SCHEMA_NODEID_RE = re.compile(r'^(?!.*//)[^*|()]*$')
+
+
+#------------------------------------------------------------------------------
+class XPath(object):
+
+    """
+    A data path compiled against a Context, see Context.compile_xpath().
+
+    It holds the path already encoded for libyang and the schema node it
+    points to, so that it can be handed over to any DataTree method in place
+    of a plain string without being converted again.
+    """
+
+    def __init__(self, context, path):
+        self.context = context
+        self.path = path
+        self._cdata = str2c(path)
+        self._snode = None
+        self._encoder = None
+
+    def schema_node(self):
+        """
+        Return the lys_node this path resolves to, or ffi.NULL if it does not
+        resolve to a single schema node (wildcards, functions, etc.). The
+        result is resolved once and cached.
+        """
+        if self._snode is None:
+            if _SCHEMA_NODEID_RE.match(_LITERALS_RE.sub('', self.path)):
+                snode = lib.ly_ctx_get_node(
+                    self.context._ctx, ffi.NULL, self._cdata, 0)
+                if not snode:
+                    lib.ly_err_clean(self.context._ctx, ffi.NULL)
+            else:
+                # ly_ctx_get_node() would log an error for these
+                snode = ffi.NULL
+            self._snode = snode
+        return self._snode
+
+    def encoder(self):
+        """
+        Return the value encoder of the leaf this path points to, see
+        codec.leaf_encoder().
+        """
+        if self._encoder is None:
+            self._encoder = leaf_encoder(
+                self.schema_node(), self.context._encoders)
+        return self._encoder
+
+    def schema(self):
+        snode = self.schema_node()
+        if not snode:
+            return None
+        return Node.new(self.context, snode)
+
+    def __str__(self):
+        return self.path
+
+    def __repr__(self):
+        cls = self.__class__
+        return '<%s.%s: %s>' % (cls.__module__, cls.__name__, str(self))
+
+
+#------------------------------------------------------------------------------
+def xpath2c(xpath):
+    if isinstance(xpath, XPath):
+        return xpath._cdata
+    return str2c(xpath)
+
+
+#------------------------------------------------------------------------------
+def xpath2str(xpath):
+    if isinstance(xpath, XPath):
+        return xpath.path
+    return xpath
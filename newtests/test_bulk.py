@@ -0,0 +1,55 @@
+# Copyright (c) 2019 Robin Jarry
+# SPDX-License-Identifier: MIT
+
+import os
+import unittest
+
+import libyang
+from libyang.bulk import BulkError
+from libyang.bulk import dump_many
+from libyang.bulk import parse_many
+
+
+YANG_DIR = os.path.join(os.path.dirname(__file__), 'yang')
+PAYLOAD = '{"minimal-integrationtest:types":{"str1":"%s"}}'
+
+
+class test_bulk(unittest.TestCase):
+
+    def setUp(self):
+        self.ctx = libyang.Context(YANG_DIR)
+        self.ctx.load_module('minimal-integrationtest')
+
+    def test_parse_dump_many(self):
+        # Arrange
+        payloads = [PAYLOAD % ('value%d' % i) for i in range(20)]
+
+        # Act
+        trees = parse_many(self.ctx, payloads, libyang.lib.LYD_JSON, workers=4)
+        dumps = dump_many(trees, libyang.lib.LYD_JSON, workers=4)
+        single = dump_many(trees, libyang.lib.LYD_JSON, workers=1)
+
+        # Assert
+        self.assertEqual([t.get_value('/minimal-integrationtest:types/str1') for t in trees],
+                         ['value%d' % i for i in range(20)])
+        self.assertEqual(dumps, payloads)
+        self.assertEqual(single, payloads)
+
+    def test_parse_many_errors(self):
+        # Arrange
+        payloads = [PAYLOAD % 'ok'] * 10
+        payloads[3] = '{"minimal-integrationtest:types":{"int_8":"not-a-number"}}'
+        payloads[7] = '{"minimal-integrationtest:types":{"unknown":"x"}}'
+
+        # Act
+        with self.assertRaises(BulkError) as cm:
+            parse_many(self.ctx, payloads, libyang.lib.LYD_JSON, workers=4)
+
+        # Assert
+        err = cm.exception
+        self.assertEqual(sorted(err.errors), [3, 7])
+        self.assertIn('not-a-number', str(err.errors[3]))
+        self.assertIn('unknown', str(err.errors[7]))
+        self.assertNotIn('unknown', str(err.errors[3]))
+        self.assertIs(err.results[3], err.errors[3])
+        self.assertIsInstance(err.results[0], libyang.DataTree)
@@ -1,7 +1,15 @@
 # Copyright (c) 2019 Robin Jarry
 # SPDX-License-Identifier: MIT
 
+import array
+import decimal
+import io
+import json
+import logging
+import mmap
 import os
+import shutil
+import tempfile
 import unittest
 
 import libyang
@@ -12,6 +20,25 @@ YANG_MODULE = 'minimal-integrationtest'
 BASE_XPATH = '/' + YANG_MODULE
 
 
+class Trickle(io.RawIOBase):
+
+    """
+    Raw stream which writes at most 7 bytes at a time.
+    """
+
+    def __init__(self):
+        super(Trickle, self).__init__()
+        self.data = b''
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        chunk = memoryview(b)[:7].tobytes()
+        self.data += chunk
+        return len(chunk)
+
+
 class test_libyangdata(unittest.TestCase):
 
     def setUp(self):
@@ -40,6 +67,704 @@ class test_libyangdata(unittest.TestCase):
         # Assert
         self.assertEqual(len(result), 2)
 
+    def test_set_many(self):
+        # Act
+        self.data.set_many([
+            (BASE_XPATH + ':types/str1', 'A'),
+            (BASE_XPATH + ':types/u_int_8', 42),
+            (BASE_XPATH + ':types/bool', False),
+            (BASE_XPATH + ":types/collection[x='mykey']/y", 'Y'),
+        ])
+
+        # Assert
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/str1')).value, 'A')
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/u_int_8')).value, 42)
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/bool')).value, False)
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ':types/collection'), 1)
+
+    def test_set_many_reports_each_failed_item(self):
+        # Act
+        with self.assertRaises(libyang.util.LibyangError) as err:
+            self.data.set_many([
+                (BASE_XPATH + ':types/str1', 'A'),
+                (BASE_XPATH + ':types/u_int_8', 9999),
+                (BASE_XPATH + ':types/str2', 'B'),
+                (BASE_XPATH + ':types/uint8', 99),
+            ])
+
+        # Assert
+        self.assertTrue('The value 9999 was not set' in str(err.exception))
+        self.assertTrue('The value 99 was not set' in str(err.exception))
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/str1')).value, 'A')
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/str2')).value, 'B')
+        self.assertEqual([(i, xpath) for i, xpath, _ in err.exception.errors],
+                         [(1, BASE_XPATH + ':types/u_int_8'), (3, BASE_XPATH + ':types/uint8')])
+        self.assertIn('9999', err.exception.errors[0][2])
+        self.assertNotIn('9999', err.exception.errors[1][2])
+        self.assertIn('uint8', err.exception.errors[1][2])
+        # nothing left behind for the next error messages
+        self.assertEqual(libyang.lib.ly_err_first(self.ctx._ctx), libyang.ffi.NULL)
+
+    def test_delete_many(self):
+        # Arrange
+        self.data.set_many([
+            (BASE_XPATH + ':types/str1', 'A'),
+            (BASE_XPATH + ':types/str2', 'B'),
+            (BASE_XPATH + ':types/str3', 'C'),
+            (BASE_XPATH + ':nesting/bronze/silver/gold/platinum/deep', 'D'),
+        ])
+
+        # Act
+        self.data.delete_many([BASE_XPATH + ':types/str1', BASE_XPATH + ':types/str3',
+                               BASE_XPATH + ':types'])
+
+        # Assert
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ':types'), 0)
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':nesting/bronze/silver/gold/platinum/deep')).value,
+                         'D')
+        with self.assertRaises(libyang.util.BatchError) as err:
+            self.data.delete_many([BASE_XPATH + ':nesting[[[', BASE_XPATH + ':nesting'])
+        self.assertEqual([(i, xpath) for i, xpath, _ in err.exception.errors], [(0, BASE_XPATH + ':nesting[[[')])
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ':nesting'), 0)
+
+    def test_insert_list(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='b']/y", 'old')
+
+        # Act
+        self.data.insert_list(BASE_XPATH + ':types/collection', {
+            'x': ['a', 'b', 'c'],
+            'y': ['A', 'B', None],
+        })
+        self.data.insert_list(BASE_XPATH + ':materials', {
+            'a': ('1', '2'),
+            'b': ('x', 'y'),
+            'c': array.array('I', [10, 20]),
+        })
+
+        # Assert
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ':types/collection'), 3)
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ":types/collection[x='b']/y")).value, 'B')
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ":types/collection[x='c']/y"), 0)
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ":materials[a='2'][b='y'][c='20']"), 1)
+
+    def test_insert_list_reports_each_failed_row(self):
+        # Act
+        with self.assertRaises(libyang.util.LibyangError) as err:
+            self.data.insert_list(BASE_XPATH + ':materials', {
+                'a': ['1', '2', '3'],
+                'b': ['x', 'y', 'z'],
+                'c': [10, 'twenty', 30],
+            })
+
+        # Assert
+        self.assertTrue("'a': '2'" in str(err.exception))
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ':materials'), 2)
+
+    def test_list_to_columns(self):
+        # Arrange
+        self.data.insert_list(BASE_XPATH + ':materials', {'a': ['1', '1', '2'], 'b': ['2', '3', '2'], 'c': [3, 4, 5]})
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='k1']/y", 'Y')
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='k2']/z/zzz", None)
+
+        # Act
+        materials = self.data.list_to_columns(BASE_XPATH + ':materials')
+        collection = self.data.list_to_columns(BASE_XPATH + ':types/collection', leaves=['x', 'y', 'z/zzz'])
+
+        # Assert
+        self.assertEqual(sorted(materials), ['a', 'b', 'c'])
+        self.assertEqual(materials['a'], ['1', '1', '2'])
+        self.assertEqual(materials['b'], ['2', '3', '2'])
+        self.assertEqual(list(materials['c']), [3, 4, 5])
+        self.assertEqual(collection, {'x': ['k1', 'k2'], 'y': ['Y', None], 'z/zzz': [None, True]})
+        with self.assertRaises(libyang.util.LibyangError):
+            self.data.list_to_columns(BASE_XPATH + ':materials', leaves=['available'])
+
+    def test_from_dict(self):
+        # Act
+        data = libyang.DataTree.from_dict(self.ctx, {
+            YANG_MODULE + ':types': {
+                'str1': 'A',
+                'bool': True,
+                'collection': [{'x': 'k1', 'y': 'Y', 'z': {'zzz': None}}, {'x': 'k2'}],
+                'simplecollection': ['a', 'b'],
+            },
+            YANG_MODULE + ':materials': [{'a': '1', 'b': '2', 'c': 3}],
+        })
+
+        # Assert
+        self.assertEqual(next(data.get_xpath(BASE_XPATH + ':types/str1')).value, 'A')
+        self.assertEqual(next(data.get_xpath(BASE_XPATH + ':types/bool')).value, True)
+        self.assertEqual(next(data.get_xpath(BASE_XPATH + ":types/collection[x='k1']/y")).value, 'Y')
+        self.assertEqual(data.count_xpath(BASE_XPATH + ':types/collection'), 2)
+        self.assertEqual(data.count_xpath(BASE_XPATH + ':types/simplecollection'), 2)
+        self.assertEqual(data.count_xpath(BASE_XPATH + ":materials[a='1'][b='2'][c='3']"), 1)
+
+    def test_from_dict_augments(self):
+        # Arrange
+        self.ctx.load_module('minimal-integrationtest-augment')
+        augment = YANG_MODULE + '-augment'
+
+        # Act
+        data = libyang.DataTree.from_dict(self.ctx, {
+            YANG_MODULE + ':types': {'str1': 'A', augment + ':str1': 42},
+        })
+        with self.assertRaises(libyang.util.LibyangError) as not_dict:
+            libyang.DataTree.from_dict(self.ctx, {YANG_MODULE + ':types': {'collection': [{'x': 'k'}, 'y']}})
+        with self.assertRaises(libyang.util.LibyangError) as not_list:
+            libyang.DataTree.from_dict(self.ctx, {YANG_MODULE + ':types': {'collection': {'x': 'k'}}})
+
+        # Assert
+        self.assertEqual(data.get_value(BASE_XPATH + ':types/str1'), 'A')
+        self.assertEqual(data.get_value(BASE_XPATH + ':types/' + augment + ':str1'), 42)
+        self.assertIn(BASE_XPATH + ':types/' + YANG_MODULE + ':collection', str(not_dict.exception))
+        self.assertIn('expected a dict', str(not_dict.exception))
+        self.assertIn('expected a list', str(not_list.exception))
+
+    def test_update_from_dict(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ':types/str1', 'A')
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='k1']/y", 'Y')
+        before = self.data.dumps()
+
+        # Act
+        self.data.update_from_dict({YANG_MODULE + ':types': {'str2': 'B', 'collection': [{'x': 'k1', 'y': 'new'}]}})
+        with self.assertRaises(libyang.util.LibyangError):
+            self.data.update_from_dict({YANG_MODULE + ':types': {'str3': 'C', 'u_int_8': 999}})
+
+        # Assert
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/str1')).value, 'A')
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/str2')).value, 'B')
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ":types/collection[x='k1']/y")).value, 'new')
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ':types/str3'), 0)
+        self.assertNotEqual(self.data.dumps(), before)
+
+    def test_index(self):
+        # Arrange
+        data = libyang.DataTree(self.ctx, index=True)
+        data.loads('{"minimal-integrationtest:types":{"str1":"A","collection":[{"x":"k1","y":"Y"}]}}',
+                   libyang.lib.LYD_JSON)
+        k1 = BASE_XPATH + ":types/collection[x='k1']"
+        k2 = BASE_XPATH + ":types/collection[x='k2']"
+
+        # Act
+        y = data.get_value(k1 + '/y')
+        data.set_xpath(k2 + '/y', 'Z')
+        data.delete_xpath(k1)
+        data.merges('{"minimal-integrationtest:types":{"str2":"B"}}', libyang.lib.LYD_JSON)
+
+        # Assert
+        self.assertEqual(y, 'Y')
+        self.assertFalse(data.exists(k1))
+        self.assertEqual(data.get_value(k1 + '/y'), None)
+        self.assertEqual(data.get_value(k2 + '/y'), 'Z')
+        self.assertEqual(next(data.get_xpath(k2)).xpath, k2)
+        self.assertEqual(data.count_xpath(k2), 1)
+        self.assertEqual(data.get_value(BASE_XPATH + ':types/str2'), 'B')
+        # not an exact data path, looked up with the xpath engine
+        self.assertEqual(data.get_values('//str1'), ['A'])
+        self.assertIn(k2 + '/y', data._index)
+        self.assertNotIn(k1 + '/y', data._index)
+
+    def test_index_choice(self):
+        # Arrange
+        data = libyang.DataTree(self.ctx, index=True)
+        radius = BASE_XPATH + ':shapes/radius'
+        side = BASE_XPATH + ':shapes/side'
+        data.set_xpath(radius, 1)
+        shapes = next(data.get_xpath(BASE_XPATH + ':shapes'))
+
+        # Act
+        before = data.get_value(radius)
+        data.set_xpath(side, 2)
+        after_set = data.get_value(radius)
+        shapes.set('radius', 3)
+        after_node_set = data.get_value(side)
+
+        # Assert
+        self.assertEqual(before, 1)
+        self.assertIsNone(after_set)
+        self.assertIsNone(after_node_set)
+        self.assertEqual(data.get_value(radius), 3)
+        self.assertFalse(data.exists(side))
+
+    def test_query_cache(self):
+        # Arrange
+        data = libyang.DataTree(self.ctx, query_cache=16)
+        data.set_xpath(BASE_XPATH + ':types/str1', 'A')
+        xpath = BASE_XPATH + ':types/str1'
+        generation = data.generation
+
+        # Act
+        before = data.get_values(xpath)
+        before.append('modified by the caller')
+        cached = data.get_values(xpath)
+        count = data.count_xpath(xpath)
+        data.set_xpath(xpath, 'B')
+        after = data.get_values(xpath)
+        data.delete_xpath(xpath)
+        deleted = (data.exists(xpath), list(data.get_xpath(xpath)), data.get_paths(xpath))
+
+        # Assert
+        self.assertEqual(cached, ['A'])
+        self.assertEqual(count, 1)
+        self.assertEqual(after, ['B'])
+        self.assertEqual(deleted, (False, [], []))
+        self.assertEqual(data.generation, generation + 2)
+        stats = data.query_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['generation']), (1, 6, generation + 2))
+        self.assertIsNone(self.data.query_cache_stats())
+
+    def test_query_cache_dump_datanodes(self):
+        # Arrange
+        data = libyang.DataTree(self.ctx, query_cache=16)
+        data.set_xpath(BASE_XPATH + ':types/str1', 'A')
+        xpath = BASE_XPATH + ':types/str2'
+        types = next(data.dump_datanodes())
+        generation = data.generation
+
+        # Act
+        before = data.exists(xpath)
+        types.set('str2', 'B')
+
+        # Assert
+        self.assertFalse(before)
+        self.assertTrue(data.exists(xpath))
+        self.assertEqual(data.generation, generation + 1)
+
+    def test_query_cache_update_from_dict(self):
+        # Arrange
+        data = libyang.DataTree(self.ctx, query_cache=16)
+        xpath = BASE_XPATH + ':types/str1'
+
+        # Act
+        empty = (data.exists(xpath), data.count_xpath(xpath), data.get_values(xpath))
+        data.update_from_dict({'minimal-integrationtest:types': {'str1': 'A'}})
+
+        # Assert
+        self.assertEqual(empty, (False, 0, []))
+        self.assertEqual((data.exists(xpath), data.count_xpath(xpath), data.get_values(xpath)),
+                         (True, 1, ['A']))
+
+    def test_to_dict(self):
+        # Arrange
+        obj = {
+            YANG_MODULE + ':types': {
+                'str1': 'A',
+                'bool': True,
+                'u_int_8': 3,
+                'collection': [{'x': 'k1', 'y': 'Y', 'z': {'zzz': True}}, {'x': 'k2'}],
+                'simplecollection': ['a', 'b'],
+            },
+            YANG_MODULE + ':materials': [{'a': '1', 'b': '2', 'c': 3}],
+        }
+        data = libyang.DataTree.from_dict(self.ctx, obj)
+
+        # Act
+        result = data.to_dict()
+        matches = data.to_dict(BASE_XPATH + ":types/collection[x='k1']/y")
+        node = next(data.get_xpath(BASE_XPATH + ":types/collection[x='k2']")).to_dict()
+
+        # Assert
+        self.assertEqual(result, obj)
+        self.assertEqual(matches, {YANG_MODULE + ':types': {'collection': [{'x': 'k1', 'y': 'Y'}]}})
+        self.assertEqual(node, {YANG_MODULE + ':collection': [{'x': 'k2'}]})
+        self.assertEqual(data.to_dict(BASE_XPATH + ':types/str2'), {})
+        self.assertEqual(libyang.DataTree(self.ctx).to_dict(), {})
+
+    def test_to_dict_validated(self):
+        # Arrange
+        self.data.load(os.path.join(YANG_DIR, 'base.xml'))
+        dumped = self.data.dumps(libyang.lib.LYD_JSON)
+
+        # Act
+        result = self.data.to_dict()
+        copy = libyang.DataTree.from_dict(self.ctx, result)
+
+        # Assert
+        self.assertEqual(result, json.loads(dumped))
+        self.assertEqual(list(result), [YANG_MODULE + ':materials'])
+        self.assertEqual(self.data.to_dict(BASE_XPATH + ':types/str4'), {})
+        self.assertEqual(copy.dumps(libyang.lib.LYD_JSON), dumped)
+
+    def test_transaction_commit(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ':types/str1', 'A')
+
+        # Act
+        with self.data.transaction() as txn:
+            txn.set_xpath(BASE_XPATH + ':types/str2', 'B')
+            txn.delete_xpath(BASE_XPATH + ':types/str1')
+            txn.merges('{"minimal-integrationtest:types":{"str3":"C"}}', libyang.lib.LYD_JSON)
+            # nothing is applied before the commit
+            self.assertEqual(self.data.count_xpath(BASE_XPATH + ':types/str2'), 0)
+
+        # Assert
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ':types/str1'), 0)
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/str2')).value, 'B')
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/str3')).value, 'C')
+
+    def test_transaction_rollback_on_validation_error(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ':types/str1', 'A')
+        before = self.data.dumps()
+
+        # Act
+        with self.assertRaises(libyang.util.LibyangError) as err:
+            with self.data.transaction() as txn:
+                txn.set_xpath(BASE_XPATH + ':types/str2', 'B')
+                txn.delete_xpath(BASE_XPATH + ':types/str1')
+                txn.set_xpath(BASE_XPATH + ':leaf_refs/leaf_ref_consumer', 'missing')
+
+        # Assert
+        self.assertTrue('Validation Error' in str(err.exception))
+        self.assertEqual(self.data.dumps(), before)
+
+    def test_transaction_discarded_on_exception(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ':types/str1', 'A')
+
+        # Act
+        with self.assertRaises(KeyError):
+            with self.data.transaction() as txn:
+                txn.set_xpath(BASE_XPATH + ':types/str2', 'B')
+                raise KeyError('boom')
+
+        # Assert
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ':types/str2'), 0)
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/str1')).value, 'A')
+
+    def test_compile_xpath(self):
+        # Arrange
+        xpath = self.ctx.compile_xpath(BASE_XPATH + ":types/collection[x='mykey']/y")
+        list_xpath = self.ctx.compile_xpath(BASE_XPATH + ':types/collection')
+
+        # Act
+        self.data.set_xpath(xpath, 'Y')
+        result = next(self.data.get_xpath(xpath))
+        count = self.data.count_xpath(list_xpath)
+        self.data.delete_xpath(xpath)
+
+        # Assert
+        self.assertEqual(result.value, 'Y')
+        self.assertEqual(result.xpath, BASE_XPATH + ":types/collection[x='mykey']/y")
+        self.assertEqual(count, 1)
+        self.assertEqual(self.data.count_xpath(xpath), 0)
+        self.assertEqual(repr(xpath.schema()), '<libyang.schema.Leaf: y string>')
+        self.assertIs(self.ctx.compile_xpath(BASE_XPATH + ':types/*').schema(), None)
+
+    def test_compile_xpath_not_schema_nodeid(self):
+        # Arrange
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logging.getLogger('libyang').addHandler(handler)
+        self.addCleanup(logging.getLogger('libyang').removeHandler, handler)
+        paths = [
+            BASE_XPATH + ':types/*',
+            BASE_XPATH + ':types/str1 | ' + BASE_XPATH + ':types/str2',
+            '//' + YANG_MODULE + ':str1',
+            BASE_XPATH + ':types/collection[starts-with(x, "k")]/y',
+        ]
+
+        # Act
+        snodes = [self.ctx.compile_xpath(path).schema_node() for path in paths]
+        quoted = self.ctx.compile_xpath(BASE_XPATH + ":types/collection[x='a*|(b)']/y").schema()
+
+        # Assert
+        self.assertEqual(snodes, [libyang.ffi.NULL] * len(paths))
+        self.assertEqual(records, [])
+        self.assertEqual(libyang.lib.ly_err_first(self.ctx._ctx), libyang.ffi.NULL)
+        self.assertEqual(repr(quoted), '<libyang.schema.Leaf: y string>')
+
+    def test_compile_xpath_cache(self):
+        # Act
+        first = self.ctx.compile_xpath(BASE_XPATH + ':types/str1')
+        second = self.ctx.compile_xpath(BASE_XPATH + ':types/str1')
+        self.ctx.compile_xpath(BASE_XPATH + ':types/str2')
+
+        # Assert
+        self.assertIs(first, second)
+        stats = self.ctx.xpath_cache_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['size'], 2)
+
+    def test_compile_xpath_encoders(self):
+        # Arrange
+        dec_64 = self.ctx.compile_xpath(BASE_XPATH + ':types/dec_64')
+        void = self.ctx.compile_xpath(BASE_XPATH + ':types/void')
+
+        # Act
+        self.data.set_xpath(dec_64, 0.3)
+        self.data.set_xpath(void, True)
+        self.data.set_many([
+            (self.ctx.compile_xpath(BASE_XPATH + ':types/bool'), False),
+            (self.ctx.compile_xpath(BASE_XPATH + ':types/u_int_8'), 200),
+        ])
+
+        # Assert
+        self.assertEqual(dec_64.encoder()(2), b'2.000')
+        self.assertEqual(dec_64.encoder()(decimal.Decimal('-1.5')), b'-1.500')
+        for value in (0.1 + 0.2, 1.23456, decimal.Decimal('9.9999'), decimal.Decimal('NaN'), float('inf')):
+            with self.assertRaises(libyang.util.LibyangError):
+                self.data.set_xpath(dec_64, value)
+        # same as plain strings
+        with self.assertRaises(libyang.util.LibyangError):
+            libyang.DataTree(self.ctx).set_xpath(BASE_XPATH + ':types/dec_64', '1.23456')
+        self.assertIs(dec_64.encoder(), self.ctx.compile_xpath(BASE_XPATH + ':types/dec_64').encoder())
+        self.assertTrue('<dec_64>0.3</dec_64>' in self.data.dumps())
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ':types/void'), 1)
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/bool')).value, False)
+        self.assertEqual(next(self.data.get_xpath(BASE_XPATH + ':types/u_int_8')).value, 200)
+
+    def test_exists(self):
+        # Arrange
+        self.data.set_many([
+            (BASE_XPATH + ":types/collection[x='k1']/y", 'Y'),
+            (BASE_XPATH + ":types/collection[x='k2']/z/zzz", None),
+            (BASE_XPATH + ':types/simplecollection', 'a'),
+            (BASE_XPATH + ":materials[a='1'][b='2'][c='3']/available", None),
+        ])
+
+        # Assert
+        self.assertFalse(libyang.DataTree(self.ctx).exists(BASE_XPATH + ':types'))
+        self.assertTrue(self.data.exists(BASE_XPATH + ":types/collection[x='k1']/y"))
+        self.assertTrue(self.data.exists(self.ctx.compile_xpath(BASE_XPATH + ":types/collection[x='k1']/y")))
+        self.assertFalse(self.data.exists(BASE_XPATH + ":types/collection[x='k2']/y"))
+        self.assertTrue(self.data.exists(BASE_XPATH + ':types/collection/z/zzz'))
+        self.assertTrue(self.data.exists(BASE_XPATH + ":types/simplecollection[.='a']"))
+        self.assertFalse(self.data.exists(BASE_XPATH + ":types/simplecollection[.='b']"))
+        self.assertTrue(self.data.exists(BASE_XPATH + ":materials[c='3'][a='1']/available"))
+        self.assertFalse(self.data.exists(BASE_XPATH + ":materials[c='4']"))
+        self.assertTrue(self.data.exists(BASE_XPATH + ':types/*'))
+        self.assertFalse(self.data.exists(BASE_XPATH + ':types/str1'))
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ':types/collection'), 2)
+
+    def test_exists_matches_count(self):
+        # Arrange
+        self.data.set_many([
+            (BASE_XPATH + ":materials[a='1'][b='2'][c='3']/available", None),
+            (BASE_XPATH + ':types/dec_64', '1.5'),
+            (BASE_XPATH + ':types/int_8', '-5'),
+            (BASE_XPATH + ':types/bool', 'true'),
+            (BASE_XPATH + ':types/enumeratio', 'A'),
+            (BASE_XPATH + ':types/simplecollection', '03'),
+        ])
+        materials = BASE_XPATH + ":materials[a='1'][b='2']"
+        paths = [materials + "[c='%s']" % c for c in ('3', '03', '+3', ' 3', '3 ', '4', '3.0', '-0', '-3')]
+        paths += [BASE_XPATH + ':types[%s]' % p for p in (
+            "dec_64='1.5'", "dec_64='1.50'", "dec_64='1.6'",
+            "int_8='-5'", "int_8='-05'", "int_8='+5'", "int_8='5'",
+            "bool='true'", "bool='1'", "enumeratio='A'", "enumeratio=' A'",
+        )]
+        paths += [BASE_XPATH + ":types/simplecollection[.='%s']" % v for v in ('03', '3')]
+
+        # Act
+        results = [(path, self.data.exists(path), self.data.count_xpath(path)) for path in paths]
+
+        # Assert
+        self.assertEqual([(path, count > 0) for path, _, count in results],
+                         [(path, found) for path, found, _ in results])
+        self.assertTrue(self.data.exists(materials + "[c='03']"))
+        self.assertTrue(self.data.exists(BASE_XPATH + ":types[dec_64='1.50']"))
+
+    def test_iter_xpath(self):
+        # Arrange
+        self.data.insert_list(BASE_XPATH + ':types/collection', {'x': ['k%d' % i for i in range(10)]})
+        xpath = BASE_XPATH + ':types/collection/x'
+
+        # Act
+        page = self.data.iter_xpath(xpath, offset=3, limit=4, chunk_size=3)
+        values = [node.value for node in page]
+        with self.data.iter_paths(xpath, chunk_size=2) as paths:
+            first = next(paths)
+
+        # Assert
+        self.assertEqual(page.total, 10)
+        self.assertEqual(values, ['k3', 'k4', 'k5', 'k6'])
+        self.assertEqual(first, BASE_XPATH + ":types/collection[x='k0']/x")
+        self.assertEqual(list(paths), [])
+        self.assertEqual(list(self.data.iter_xpath(xpath, offset=20)), [])
+        self.assertEqual(list(libyang.DataTree(self.ctx).iter_xpath(xpath)), [])
+
+    def test_iter_xpath_changed(self):
+        # Arrange
+        self.data.insert_list(BASE_XPATH + ':types/collection', {'x': ['k%d' % i for i in range(10)]})
+        xpath = BASE_XPATH + ':types/collection'
+        nodes = self.data.iter_xpath(xpath, chunk_size=3)
+
+        # Act
+        with self.assertRaises(RuntimeError):
+            for node in nodes:
+                self.data.delete_many([node.xpath])
+        untouched = list(self.data.iter_xpath(xpath, chunk_size=3))
+
+        # Assert
+        self.assertEqual(self.data.count_xpath(xpath), 7)
+        self.assertEqual(len(untouched), 7)
+
+    def test_lyb(self):
+        # Arrange
+        self.data.load(os.path.join(YANG_DIR, 'base.xml'))
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, 'base.lyb')
+
+        # Act
+        payload = self.data.dumps(libyang.lib.LYD_LYB)
+        self.data.dump(filename, libyang.lib.LYD_LYB)
+        from_bytes = libyang.DataTree(self.ctx)
+        from_bytes.loads(payload, libyang.lib.LYD_LYB)
+        from_file = libyang.DataTree(self.ctx)
+        from_file.load(filename, libyang.lib.LYD_LYB)
+
+        # Assert
+        self.assertIsInstance(payload, bytes)
+        self.assertIn(b'\0', payload)
+        self.assertEqual(from_bytes.dumps(), self.data.dumps())
+        self.assertEqual(from_file.dumps(), self.data.dumps())
+
+    def test_write(self):
+        # Arrange
+        self.data.load(os.path.join(YANG_DIR, 'base.xml'))
+        self.data.set_xpath(BASE_XPATH + ':types/str1', u'\u00e9t\u00e9')
+        expected = self.data.dumps()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, 'base.xml')
+        chunks = []
+
+        def fail(chunk):
+            raise IOError('connection reset')
+
+        # Act
+        binary = io.BytesIO()
+        self.data.write(binary)
+        text = io.StringIO()
+        self.data.write(text, chunk_size=3)
+        self.data.write(chunks.append, libyang.lib.LYD_LYB, chunk_size=16)
+        with open(filename, 'wb') as f:
+            self.data.write(f.fileno())
+        trickle = Trickle()
+        self.data.write(trickle)
+
+        # Assert
+        self.assertEqual(binary.getvalue().decode('utf-8'), expected)
+        self.assertEqual(trickle.data.decode('utf-8'), expected)
+        self.assertEqual(text.getvalue(), expected)
+        self.assertEqual(b''.join(chunks), self.data.dumps(libyang.lib.LYD_LYB))
+        with io.open(filename, encoding='utf-8') as f:
+            self.assertEqual(f.read(), expected)
+        with self.assertRaises(IOError):
+            self.data.write(fail)
+        with self.assertRaises(TypeError):
+            self.data.write(io.StringIO(), libyang.lib.LYD_LYB)
+        fd = os.open(filename, os.O_RDONLY)
+        self.addCleanup(os.close, fd)
+        with self.assertRaises(OSError):
+            self.data.write(fd)
+
+    def test_get_paths(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='k1']/y", 'Y')
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='k2']/y", None)
+        self.data.set_xpath(BASE_XPATH + ':types/simplecollection[.="it\'s"]', None)
+        self.data.set_xpath(BASE_XPATH + ":materials[a='x'][b='y'][c='3']", None)
+        xpath = '%s:types/collection/* | %s:types/simplecollection | %s:materials/c' % (
+            BASE_XPATH, BASE_XPATH, BASE_XPATH)
+
+        # Act
+        paths = self.data.get_paths(xpath)
+        templates = self.data.get_paths(xpath, templates=True)
+
+        # Assert
+        nodes = list(self.data.get_xpath(xpath))
+        self.assertEqual(paths, [libyang.DataNode._path(n.lyd_node) for n in nodes])
+        self.assertEqual(list(self.data.gets_xpath(xpath)), paths)
+        self.assertEqual(templates[0], (BASE_XPATH + ':types/collection[x=%s]/x', ('k1',)))
+        self.assertEqual(templates[-1], (BASE_XPATH + ':materials[a=%s][b=%s][c=%s]/c', ('x', 'y', '3')))
+        self.assertEqual([t % tuple(libyang.data.xpath_quote(k) for k in keys) for t, keys in templates],
+                         paths)
+        self.assertEqual(self.data.get_paths(BASE_XPATH + ':types/str1'), [])
+
+    def test_get_values(self):
+        # Arrange
+        self.data.set_many([
+            (BASE_XPATH + ':types/u_int_8', 42),
+            (BASE_XPATH + ':types/bool', True),
+            (BASE_XPATH + ':types/void', None),
+            (BASE_XPATH + ':types/simplecollection', 'a'),
+            (BASE_XPATH + ':types/simplecollection', 'b'),
+            (BASE_XPATH + ":types/collection[x='k1']/y", 'same'),
+            (BASE_XPATH + ":types/collection[x='k2']/y", 'same'),
+        ])
+
+        # Act
+        values = self.data.get_values(BASE_XPATH + ':types/collection/y')
+
+        # Assert
+        self.assertEqual(values, ['same', 'same'])
+        self.assertIs(values[0], values[1])
+        self.assertEqual(self.data.get_values(BASE_XPATH + ':types/simplecollection'), ['a', 'b'])
+        self.assertEqual(self.data.get_values(BASE_XPATH + ':types/collection'), [True, True])
+        self.assertEqual(self.data.get_value(BASE_XPATH + ':types/u_int_8'), 42)
+        self.assertEqual(self.data.get_value(BASE_XPATH + ':types/bool'), True)
+        self.assertEqual(self.data.get_value(BASE_XPATH + ':types/void'), True)
+        self.assertEqual(self.data.get_value(BASE_XPATH + ':types/str1', 'default'), 'default')
+
+    def test_datanode_lazy_attributes(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ':types/u_int_8', 42)
+        node = next(self.data.get_xpath(BASE_XPATH + ':types/*'))
+
+        # Act
+        child = node.get_root().get('u_int_8')
+
+        # Assert
+        self.assertFalse(hasattr(node, '__dict__'))
+        self.assertEqual(node.xpath, BASE_XPATH + ':types/*')
+        self.assertEqual(child.xpath, BASE_XPATH + ':types/u_int_8')
+        self.assertEqual(child.value, 42)
+
+    def test_datanode_relative_set_and_get(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='mykey']/y", 'Y')
+        entry = next(self.data.get_xpath(BASE_XPATH + ":types/collection[x='mykey']"))
+
+        # Act
+        entry.set('y', 'other')
+        entry.set('z/zzz', None)
+
+        # Assert
+        self.assertEqual(entry.get('y').value, 'other')
+        self.assertEqual(entry.get('y').xpath, BASE_XPATH + ":types/collection[x='mykey']/y")
+        self.assertEqual(entry.get('z/zzz').value, True)
+        self.assertIs(entry.get('z/missing'), None)
+        with self.assertRaises(libyang.util.LibyangError):
+            entry.set('nope', 'A')
+
+    def test_datanode_child(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ':materials[a="A"][b="B"][c="1"]/available/factory', 'x')
+        available = next(self.data.get_xpath(BASE_XPATH + ':materials[a="A"][b="B"][c="1"]/available'))
+
+        # Act
+        location = available.child('locations', location="it's here")
+        worker = location.child('workers', worker='bob')
+        worker.set('stats/workrate', 10)
+        same = available.child('locations', location="it's here")
+
+        # Assert
+        self.assertEqual(same.lyd_node, location.lyd_node)
+        self.assertEqual(worker.xpath, BASE_XPATH + ":materials[a='A'][b='B'][c='1']/available"
+                         '/locations[location="it\'s here"]/workers[worker=\'bob\']')
+        self.assertEqual(self.data.count_xpath(BASE_XPATH + ':materials/available/locations/workers'), 1)
+        with self.assertRaises(libyang.util.LibyangError):
+            available.child('locations', nope='x')
+        with self.assertRaises(libyang.util.LibyangError):
+            available.child('locations', location='it\'s "here"')
+
     def test_delete(self):
         # Arrange
         self.data.set_xpath(BASE_XPATH + ':types/str1', 'A')
@@ -107,7 +832,8 @@ class test_libyangdata(unittest.TestCase):
         result = next(self.data.get_xpath(xpath)).value
 
         # Assert
-        self.assertEqual(result, value)
+        self.assertEqual(result, decimal.Decimal('4.442'))
+        self.assertEqual(self.data.get_value(xpath), decimal.Decimal('4.442'))
 
     def test_empty(self):
         # Arrange
@@ -121,6 +847,20 @@ class test_libyangdata(unittest.TestCase):
         # Assert
         self.assertEqual(result, True)
 
+    def test_empty_compiled(self):
+        # Arrange
+        xpath = self.ctx.compile_xpath(BASE_XPATH + ':types/void')
+
+        # Act
+        with self.assertRaises(libyang.util.LibyangError):
+            self.data.set_xpath(xpath, False)
+        missing = self.data.exists(xpath)
+        self.data.set_xpath(xpath, True)
+
+        # Assert
+        self.assertFalse(missing)
+        self.assertEqual(self.data.get_value(xpath), True)
+
     def test_boolean_true(self):
         # Act
         xpath = BASE_XPATH + ':types/bool'
@@ -205,6 +945,62 @@ class test_libyangdata(unittest.TestCase):
         expected_result = '{"minimal-integrationtest:types":{"collection":[{"x":"mykey"}]}}'
         self.assertEqual(result, expected_result)
 
+    def test_dumps_as_bytes(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ':types/str1', u'\u00e9t\u00e9')
+
+        # Act
+        result = self.data.dumps(libyang.lib.LYD_JSON, as_bytes=True)
+        lyb = self.data.dumps(libyang.lib.LYD_LYB, as_bytes=True)
+
+        # Assert
+        self.assertEqual(bytes(result).decode('utf-8'), self.data.dumps(libyang.lib.LYD_JSON))
+        self.assertEqual(len(memoryview(result)), len(result))
+        self.assertEqual(result[:], bytes(result))
+        self.assertEqual(lyb[:], self.data.dumps(libyang.lib.LYD_LYB))
+
+    def test_dumps_xpath(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ':types/str1', 'A')
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='k1']/y", 'Y1')
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='k2']/y", 'Y2')
+        self.data.set_xpath(BASE_XPATH + ":materials[a='x'][b='y'][c='3']", None)
+        k2 = BASE_XPATH + ":types/collection[x='k2']"
+
+        # Act
+        entry = self.data.dumps(libyang.lib.LYD_JSON, xpath=k2)
+        keys = self.data.dumps(libyang.lib.LYD_JSON, xpath=BASE_XPATH + ':types/collection/x')
+        several = self.data.dumps(libyang.lib.LYD_JSON, xpath='//y | //c | %s/y' % k2)
+        node = next(self.data.get_xpath(k2))
+
+        # Assert
+        self.assertEqual(entry, '{"minimal-integrationtest:types":{"collection":[{"x":"k2","y":"Y2"}]}}')
+        self.assertEqual(keys, '{"minimal-integrationtest:types":{"collection":[{"x":"k1"},{"x":"k2"}]}}')
+        self.assertEqual(several, '{"minimal-integrationtest:types":{"collection":[{"x":"k1","y":"Y1"},'
+                                  '{"x":"k2","y":"Y2"}]},"minimal-integrationtest:materials":'
+                                  '[{"a":"x","b":"y","c":3}]}')
+        self.assertEqual(node.dumps(libyang.lib.LYD_JSON), entry)
+        self.assertEqual(bytes(node.dumps(libyang.lib.LYD_JSON, as_bytes=True)), entry.encode('utf-8'))
+        self.assertEqual(self.data.dumps(xpath=BASE_XPATH + ':types/str2'), '')
+        self.assertEqual(type(self.data.dumps(xpath=BASE_XPATH + ':types/str2', as_bytes=True)),
+                         type(self.data.dumps(xpath=k2, as_bytes=True)))
+        self.assertEqual(bytes(self.data.dumps(xpath=BASE_XPATH + ':types/str2', as_bytes=True)), b'')
+
+    def test_dumps_xpath_non_canonical_key(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ":materials[a='x'][b='y'][c='3']", None)
+        self.data.set_xpath(BASE_XPATH + ":materials[a='x'][b='y'][c='4']", None)
+        xpath = BASE_XPATH + ":materials[a='x'][b='y'][c='03']"
+
+        # Act
+        dumped = self.data.dumps(libyang.lib.LYD_JSON, xpath=xpath)
+        exported = self.data.to_dict(xpath=xpath)
+
+        # Assert
+        self.assertEqual(len(list(self.data.get_xpath(xpath))), 1)
+        self.assertEqual(dumped, '{"minimal-integrationtest:materials":[{"a":"x","b":"y","c":3}]}')
+        self.assertEqual(exported, {YANG_MODULE + ':materials': [{'a': 'x', 'b': 'y', 'c': 3}]})
+
     def test_loads(self):
         # Arrange
         payload = '{"minimal-integrationtest:types":{"str1":"this-is-a-string"}}'
@@ -215,6 +1011,49 @@ class test_libyangdata(unittest.TestCase):
         # Assert
         self.assertEqual(next(self.data.get_xpath('/minimal-integrationtest:types/str1')).value, 'this-is-a-string')
 
+    def test_loads_buffers(self):
+        # Arrange
+        payload = b'{"minimal-integrationtest:types":{"str1":"this-is-a-string"}}'
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, 'payload.json')
+        with open(filename, 'wb') as f:
+            f.write(payload)
+        f = open(filename, 'rb')
+        self.addCleanup(f.close)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.addCleanup(mapped.close)
+        sources = [
+            payload,
+            bytearray(payload),
+            # not NUL terminated, must not be read past its end
+            memoryview(payload + b'garbage')[:len(payload)],
+            memoryview(bytearray(payload + b'garbage'))[:len(payload)],
+            mapped,
+        ]
+        if hasattr(memoryview, 'cast'):
+            # 2-byte items, len() is not the size in bytes
+            sources.append(memoryview(payload + b' ').cast('H'))
+
+        # Act
+        trees = []
+        for source in sources:
+            tree = libyang.DataTree(self.ctx)
+            tree.loads(source, libyang.lib.LYD_JSON)
+            trees.append(tree)
+        for source in (f, f.fileno()):
+            tree = libyang.DataTree(self.ctx)
+            tree.load(source, libyang.lib.LYD_JSON)
+            trees.append(tree)
+        utf8 = libyang.DataTree(self.ctx)
+        utf8.loads(u'{"minimal-integrationtest:types":{"str1":"\u00e9t\u00e9"}}'.encode('utf-8'),
+                   libyang.lib.LYD_JSON)
+
+        # Assert
+        for tree in trees:
+            self.assertEqual(tree.get_value(BASE_XPATH + ':types/str1'), 'this-is-a-string')
+        self.assertEqual(utf8.get_value(BASE_XPATH + ':types/str1'), u'\u00e9t\u00e9')
+
     def test_loads_merges(self):
         # Arrange
         payload = '{"minimal-integrationtest:types":{"str1":"this-is-a-string"}}'
@@ -391,6 +1230,58 @@ class test_libyangdata(unittest.TestCase):
         for result in results:
             self.assertEqual(expected_results.pop(0), repr(result))
 
+    def test_dump_datanodes_document_order(self):
+        # Arrange
+        self.data.set_xpath(BASE_XPATH + ':types/str1', 'A')
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='k2']/y", 'Y')
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='k10']", None)
+        self.data.set_xpath(BASE_XPATH + ':types/simplecollection[.="it\'s"]', None)
+
+        # Act
+        nodes = list(self.data.dump_datanodes())
+        sorted_nodes = list(self.data.dump_datanodes(sort=True))
+        values = self.data.dump_values()
+
+        # Assert
+        self.assertEqual([n.xpath for n in nodes], [
+            BASE_XPATH + ':types',
+            BASE_XPATH + ':types/str1',
+            BASE_XPATH + ":types/collection[x='k2']/x",
+            BASE_XPATH + ":types/collection[x='k2']/y",
+            BASE_XPATH + ":types/collection[x='k10']/x",
+            BASE_XPATH + ':types/simplecollection[.="it\'s"]',
+        ])
+        self.assertEqual([n.xpath for n in nodes], [libyang.DataNode._path(n.lyd_node) for n in nodes])
+        self.assertEqual([n.xpath for n in sorted_nodes], sorted(n.xpath for n in nodes))
+        self.assertEqual(values, [(n.xpath, n.value) for n in nodes])
+        self.assertEqual(self.data.dump_values(sort=True), sorted(values))
+
+    def test_dump_datanodes_schema_order(self):
+        # Arrange
+        for c in ('10', '2', '1'):
+            self.data.set_xpath(BASE_XPATH + ":materials[a='x'][b='y'][c='%s']" % c, None)
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='k2']", None)
+        self.data.set_xpath(BASE_XPATH + ":types/collection[x='k10']", None)
+        self.data.set_xpath(BASE_XPATH + ':types/str2', 'B')
+        self.data.set_xpath(BASE_XPATH + ':types/str1', 'A')
+
+        # Act
+        nodes = list(self.data.dump_datanodes(schema_order=True))
+        values = self.data.dump_values(schema_order=True)
+
+        # Assert
+        materials = BASE_XPATH + ":materials[a='x'][b='y'][c='%s']/"
+        self.assertEqual([n.xpath for n in nodes], [
+            BASE_XPATH + ':types',
+            BASE_XPATH + ':types/str1',
+            BASE_XPATH + ':types/str2',
+            BASE_XPATH + ":types/collection[x='k10']/x",
+            BASE_XPATH + ":types/collection[x='k2']/x",
+        ] + [materials % c + leaf for c in ('1', '2', '10') for leaf in 'abc'])
+        self.assertEqual(values, [(n.xpath, n.value) for n in nodes])
+        self.assertEqual([n.xpath for n in nodes[0].dump_datanodes(schema_order=True)],
+                         [n.xpath for n in nodes[:5]])
+
     def test_deep_nodes_and_get_schema_different_order(self):
         """
         libyang definetely keeps track of insertion order.
@@ -581,6 +1472,33 @@ class test_libyangdata(unittest.TestCase):
             self.assertEqual(result, expected)
 
 
+    def test_merge_replace_list_with_several_attributes(self):
+        """
+        The replace operation attribute is freed while walking the attributes
+        of its element and the list path buffer is rebuilt for each replaced
+        list, neither must be read after being freed or overflowed.
+        """
+        # Arrange
+        self.data.load('newtests/yang/base.xml')
+        locations = BASE_XPATH + ":materials[a='a'][b='b'][c='500']/available/locations"
+        template = (
+            '<materials xmlns="http://mellon-collie.net/yang/minimal-integrationtest"'
+            ' xmlns:nc="urn:ietf:params:xml:ns:netconf:base:1.0">'
+            '<a>a</a><b>b</b><c>500</c><available><locations><location>suffolk</location>'
+            '<workers nc:operation="replace" nc:type="subtree"><worker>zoe</worker></workers>'
+            '<workers nc:type="subtree" nc:operation="replace"><worker>yan</worker></workers>'
+            '</locations></available></materials>')
+
+        # Act
+        self.data.advancedmerge(template)
+
+        # Assert
+        self.assertEqual(self.data.count_xpath(locations + "[location='suffolk']/workers"), 2)
+        self.assertEqual(self.data.count_xpath(locations + "[location='grimsby']/workers"), 2)
+        self.assertEqual(self.data.count_xpath(locations + "/workers[worker='chris']"), 0)
+        self.assertTrue('nc:type="subtree"' in self.data.dumps())
+        self.assertFalse('nc:operation' in self.data.dumps())
+
     def test_merge_multiple_attributes(self):
         self.data.load('newtests/yang/base.xml')
         with open('newtests/yang/template5.xml') as template: